@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import numpy as np
+from vector_store import load_vectors
+
+ANN_DIR = "cache/ann"
+ANN_VERSION = 1
+# inverted lists scanned per query unless the caller asks for more or fewer
+DEFAULT_NPROBE = 8
+# k-means trains on at most this many vectors per list
+TRAIN_PER_LIST = 64
+# rows scored against the centroids at a time while assigning
+ASSIGN_BATCH_SIZE = 65536
+
+
+def normalize_rows(matrix):
+    """Scale every row to unit L2 norm; all-zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros(matrix.shape, dtype=matrix.dtype), where=norms > 0)
+
+
+def kmeans(data, k: int, n_iter: int, rng, spherical: bool = False):
+    """Lloyd's k-means on the rows of ``data``; ``spherical`` keeps centroids unit-length for cosine."""
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(n_iter):
+        scores = data @ centroids.T
+        if not spherical:
+            # nearest by euclidean distance: |x - c|^2 = |x|^2 - 2 x.c + |c|^2
+            scores -= 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+        assignment = np.argmax(scores, axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(data[np.argsort(assignment, kind="stable")], (np.cumsum(counts) - counts)[filled])
+        # reseed empty clusters with random rows
+        empty = np.flatnonzero(~filled)
+        sums[empty] = data[rng.choice(len(data), size=len(empty), replace=False)]
+        counts[empty] = 1
+        centroids = normalize_rows(sums) if spherical else sums / counts[:, None]
+    return centroids
+
+
+def top_k(rows, scores, k: int):
+    """The ``k`` best ``(rows, scores)``: highest score first, lower row first on ties."""
+    if 0 < k < len(scores):
+        cutoff = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        keep = scores >= cutoff
+        rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
+
+
+class IVFIndex():
+    """Inverted file index for approximate cosine search over embeddings.
+
+    Spherical k-means splits the unit-length vectors into ``n_lists`` cells.
+    The vectors are stored grouped by cell, cell ``c`` holding
+    ``list_vectors[list_offsets[c]:list_offsets[c + 1]]`` whose original rows
+    are the same slice of ``list_rows``. A query only scores the ``nprobe``
+    cells whose centroids are closest, so raising ``nprobe`` trades latency
+    for recall; ``nprobe=n_lists`` is exact.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, list_vectors) -> None:
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.list_vectors = list_vectors
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.list_rows)
+
+    @classmethod
+    def build(cls, vectors, n_lists: int | None = None, n_iter: int = 20, seed: int = 0) -> "IVFIndex":
+        """Cluster ``vectors`` (normalized here) into ``n_lists`` cells, sqrt(n) by default."""
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+
+        sample = np.sort(rng.choice(n, size=min(n, n_lists * TRAIN_PER_LIST), replace=False))
+        centroids = kmeans(normalize_rows(np.asarray(vectors[sample], dtype=np.float32)), n_lists, n_iter, rng, spherical=True)
+
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, ASSIGN_BATCH_SIZE):
+            block = normalize_rows(np.asarray(vectors[start:start + ASSIGN_BATCH_SIZE], dtype=np.float32))
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        list_rows = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+        list_vectors = normalize_rows(np.asarray(vectors[list_rows], dtype=np.float32))
+        return cls(centroids, list_offsets, list_rows, list_vectors)
+
+    def probe(self, query, nprobe: int = DEFAULT_NPROBE):
+        """Rows and cosine scores of every vector in the ``nprobe`` cells closest to ``query``."""
+        norm = np.linalg.norm(query)
+        query = (query / norm if norm else query).astype(np.float32)
+        nprobe = max(1, min(nprobe, self.n_lists))
+        cells = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        starts, ends = self.list_offsets[cells], self.list_offsets[cells + 1]
+        lengths = ends - starts
+        idx = np.arange(int(lengths.sum())) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.asarray(self.list_rows[idx]), self.list_vectors[idx] @ query
+
+    def search(self, query, k: int, nprobe: int = DEFAULT_NPROBE):
+        """Approximate top ``k`` rows by cosine similarity to ``query``, as ``(rows, scores)``."""
+        rows, scores = self.probe(query, nprobe)
+        return top_k(rows, scores, k)
+
+    def save(self, path: str, fingerprint: dict) -> None:
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ("centroids", "list_offsets", "list_rows", "list_vectors"):
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(fingerprint, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        return cls(
+            np.load(os.path.join(path, "centroids.npy")),
+            np.load(os.path.join(path, "list_offsets.npy")),
+            np.load(os.path.join(path, "list_rows.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "list_vectors.npy"), mmap_mode="r"),
+        )
+
+    @classmethod
+    def open(cls, source: str, name: str, n_lists: int | None = None, rebuild: bool = False, cache_dir: str = ANN_DIR) -> "IVFIndex":
+        """The index of the embeddings in ``source`` saved as ``cache_dir/name``, rebuilt when the file changed."""
+        path = os.path.join(cache_dir, name)
+        stat = os.stat(source)
+        fingerprint = {"version": ANN_VERSION, "source": os.path.abspath(source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        meta_path = os.path.join(path, "meta.json")
+        if not rebuild and os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if {key: meta.get(key) for key in fingerprint} == fingerprint and n_lists in (None, meta.get("n_lists")):
+                return cls.load(path)
+        index = cls.build(load_vectors(source), n_lists)
+        index.save(path, {**fingerprint, "n_lists": index.n_lists})
+        return index
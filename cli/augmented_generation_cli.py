@@ -1,11 +1,14 @@
 
 
-import argparse, json
-from hybrid_search import HybridSearch, rag_text, rag_summary_text, rag_citations_text, rag_question_text
+import argparse
+from catalog import MovieCatalog
+from hybrid_search import RAG_MODES, HybridSearch, rag_text, rag_summary_text, rag_citations_text, rag_question_text
+from search_client import SERVER_ENV, default_server, remote
 
 
 def main():
     parser = argparse.ArgumentParser(description="Retrieval Augmented Generation CLI")
+    parser.add_argument("--server", type=str, default=default_server(), help=f"Send queries to a running search_server_cli.py server at this URL (default: ${SERVER_ENV})")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     rag_parser = subparsers.add_parser(
@@ -31,12 +34,16 @@ def main():
 
 
 
-    with open("data/movies.json", "r") as f:
-        data = json.load(f)
-    documents = data["movies"]
+    args = parser.parse_args()
 
+    if args.server and args.command in RAG_MODES:
+        # the server searches and generates; only the answer comes back
+        answer = remote(args.server, "rag", mode=args.command, query=args.query, limit=getattr(args, "limit", 5))["answer"]
+        print(RAG_MODES[args.command][1])
+        print(answer)
+        return
 
-    args = parser.parse_args()
+    documents = MovieCatalog.open()
 
     match args.command:
         case "rag":
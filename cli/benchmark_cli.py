@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import argparse
+from benchmarks import ann_benchmark_command, bm25_batch_benchmark_command, encoding_benchmark_command, fusion_benchmark_command, hybrid_benchmark_command, inference_benchmark_command, postings_benchmark_command, quantization_benchmark_command, semantic_batch_benchmark_command, server_benchmark_command, startup_benchmark_command, SERVER_ENDPOINTS, STARTUP_COMMANDS
+from helpers import load_stop_words
+from search_client import default_server
+from search_server import DEFAULT_HOST, DEFAULT_PORT
+from inference import BACKENDS
+from quantization import CODECS
+from semantic_search import CHUNK_STORE
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    # posting list formats
+    postings_parser = subparsers.add_parser("postings", help="Compare posting list size and decode throughput across formats")
+    postings_parser.add_argument("--terms", type=int, default=2000, help="Number of terms to decode, sampled by document frequency")
+    postings_parser.add_argument("--block-size", type=int, default=128, help="Postings per compressed block")
+
+    # batched bm25 search
+    bm25_batch_parser = subparsers.add_parser("bm25batch", help="Compare one-at-a-time and batched BM25 search")
+    bm25_batch_parser.add_argument("--queries", type=int, default=500, help="Number of queries drawn from the catalog")
+    bm25_batch_parser.add_argument("-l", "--limit", type=int, default=10, help="Number of top results per query")
+
+    # approximate nearest neighbour index
+    ann_parser = subparsers.add_parser("ann", help="Measure recall@k and latency of the IVF index against exact search")
+    ann_parser.add_argument("--documents", action="store_true", help="Use the movie embeddings instead of the chunk embeddings")
+    ann_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Numbers of inverted lists to scan")
+    ann_parser.add_argument("-k", type=int, default=10, help="Number of neighbours compared with exact search")
+    ann_parser.add_argument("--queries", type=int, default=200, help="Number of stored embeddings used as queries")
+    ann_parser.add_argument("--lists", type=int, help="Number of inverted lists (rebuilds the index when it differs)")
+
+    # quantized embeddings
+    quantization_parser = subparsers.add_parser("quantization", help="Measure memory saved and recall lost by each embedding quantization")
+    quantization_parser.add_argument("--documents", action="store_true", help="Use the movie embeddings instead of the chunk embeddings")
+    quantization_parser.add_argument("--codecs", nargs="+", choices=CODECS, default=list(CODECS), help="Encodings to compare")
+    quantization_parser.add_argument("-k", type=int, default=10, help="Number of neighbours compared with exact search")
+    quantization_parser.add_argument("--queries", type=int, default=200, help="Number of queries near stored embeddings")
+    quantization_parser.add_argument("--subspaces", type=int, help="pq only: number of one-byte codes per vector (re-encodes when it differs)")
+
+    # batched semantic search
+    semantic_batch_parser = subparsers.add_parser("semanticbatch", help="Compare one-at-a-time and batched semantic search")
+    semantic_batch_parser.add_argument("--documents", action="store_true", help="Search the movie embeddings instead of the chunk embeddings")
+    semantic_batch_parser.add_argument("--queries", type=int, default=200, help="Number of queries drawn from the catalog")
+    semantic_batch_parser.add_argument("-l", "--limit", type=int, default=10, help="Number of top results per query")
+
+    # multi-process encoding
+    encoding_parser = subparsers.add_parser("encoding", help="Compare embedding throughput with different numbers of encoding processes")
+    encoding_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Numbers of encoding processes (the first is the baseline)")
+    encoding_parser.add_argument("--texts", type=int, default=20000, help="Number of catalog chunks to encode")
+
+    # quantized inference
+    inference_parser = subparsers.add_parser("inference", help="Compare query encoder and cross-encoder latency and agreement across inference backends")
+    inference_parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS), help="Backends to compare with float32 torch")
+    inference_parser.add_argument("--queries", type=int, default=100, help="Number of queries drawn from the catalog")
+    inference_parser.add_argument("-l", "--limit", type=int, default=10, help="Number of top results compared per query")
+    inference_parser.add_argument("--threads", type=int, help="Torch threads used for inference (default: torch's own choice)")
+
+    # concurrent hybrid search legs
+    hybrid_parser = subparsers.add_parser("hybrid", help="Compare per-leg and end-to-end hybrid search latency with the BM25 and semantic legs run serially and concurrently")
+    hybrid_parser.add_argument("--queries", type=int, default=100, help="Number of queries drawn from the catalog")
+    hybrid_parser.add_argument("-l", "--limit", type=int, default=5, help="Number of results per query")
+
+    # score fusion
+    fusion_parser = subparsers.add_parser("fusion", help="Compare adaptive-depth RRF with full-depth fusion: latency, depth used and identical results")
+    fusion_parser.add_argument("--queries", type=int, default=200, help="Number of queries drawn from the catalog")
+    fusion_parser.add_argument("-l", "--limit", type=int, default=5, help="Number of results per query")
+    fusion_parser.add_argument("-k", type=int, default=60, help="RRF parameter k")
+
+    # search server
+    server_parser = subparsers.add_parser("server", help="Measure per-query latency of a running search server as seen by a client")
+    server_parser.add_argument("--server", type=str, default=default_server() or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", help="Server URL")
+    server_parser.add_argument("--endpoints", nargs="+", choices=SERVER_ENDPOINTS, default=list(SERVER_ENDPOINTS), help="Endpoints to time")
+    server_parser.add_argument("--queries", type=int, default=100, help="Number of queries drawn from the catalog")
+    server_parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once")
+
+    # cli startup
+    startup_parser = subparsers.add_parser("startup", help="Time each CLI command in a fresh interpreter and list the heavy modules it imports")
+    startup_parser.add_argument("--command", dest="commands", action="append", help="CLI command to time, e.g. \"keyword_search_cli.py bm25search 'space'\" (repeatable; default: a built-in set)")
+    startup_parser.add_argument("--repeat", type=int, default=3, help="Runs per command; the fastest is reported")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "postings":
+            postings_benchmark_command(n_terms=args.terms, block_size=args.block_size)
+        case "bm25batch":
+            bm25_batch_benchmark_command(n_queries=args.queries, limit=args.limit, stop_words=load_stop_words("data/stopwords.txt"))
+        case "ann":
+            source, name = ("cache/movie_embeddings.npy", "documents") if args.documents else (CHUNK_STORE, "chunks")
+            ann_benchmark_command(source, name, nprobes=args.nprobe, k=args.k, n_queries=args.queries, n_lists=args.lists)
+        case "quantization":
+            source, name = ("cache/movie_embeddings.npy", "documents") if args.documents else (CHUNK_STORE, "chunks")
+            quantization_benchmark_command(source, name, codecs=args.codecs, k=args.k, n_queries=args.queries, n_subspaces=args.subspaces)
+        case "semanticbatch":
+            semantic_batch_benchmark_command(n_queries=args.queries, limit=args.limit, chunked=not args.documents)
+        case "encoding":
+            encoding_benchmark_command(workers=args.workers, n_texts=args.texts)
+        case "inference":
+            inference_benchmark_command(backends=args.backends, n_queries=args.queries, limit=args.limit, threads=args.threads)
+        case "hybrid":
+            hybrid_benchmark_command(n_queries=args.queries, limit=args.limit)
+        case "fusion":
+            fusion_benchmark_command(n_queries=args.queries, limit=args.limit, k=args.k)
+        case "server":
+            server_benchmark_command(args.server, endpoints=args.endpoints, n_queries=args.queries, concurrency=args.concurrency)
+        case "startup":
+            startup_benchmark_command(args.commands or STARTUP_COMMANDS, repeat=args.repeat)
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+import os
+import pickle
+import shlex
+import subprocess
+import sys
+import time
+import numpy as np
+from ann_index import IVFIndex, normalize_rows
+from catalog import MovieCatalog
+from embedding_cache import QueryEmbeddingCache
+from fusion import adaptive_rrf, fuse_rrf, fuse_weighted
+from helpers import BM25_B, BM25_K1, InvertedIndex
+from hybrid_search import CROSS_ENCODER_MODEL, HybridSearch
+from index_store import INDEX_DIR, load_index
+from inference import BACKENDS, load_cross_encoder
+from postings_codec import BLOCK_SIZE, BlockPostings
+from quantization import CODECS, RESCORE_FACTOR, QuantizedVectors
+from search_client import remote
+from semantic_search import CHUNK_STORE, ChunkedSemanticSearch, SemanticSearch, iter_chunks
+from vector_store import load_vectors
+
+
+def _timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _size(n_bytes: int) -> str:
+    return f"{n_bytes / 1e6:.2f} MB"
+
+
+def postings_benchmark_command(path: str = INDEX_DIR, n_terms: int = 2000, block_size: int = BLOCK_SIZE) -> None:
+    """Compare the size and decode speed of the posting list formats on a built index."""
+    engine, _ = load_index(BM25_K1, BM25_B, path)
+    offsets = np.asarray(engine.offsets)
+    doc_rows = np.asarray(engine.doc_rows)
+    tfs = np.asarray(engine.tfs)
+    blocks = engine.block_postings or BlockPostings.encode(offsets, doc_rows, tfs, block_size)
+    n_postings = len(doc_rows)
+    terms = [term.decode() for term in engine.terms.tolist()]
+
+    # the pickled dict-of-sets layout: term -> {doc_id} plus doc_id -> Counter of tfs
+    doc_ids = engine.doc_ids[doc_rows].tolist()
+    sets = {term: set(doc_ids[offsets[i]:offsets[i + 1]]) for i, term in enumerate(terms)}
+    set_bytes = sum(sys.getsizeof(term) + sys.getsizeof(docs) for term, docs in sets.items())
+    set_bytes += sum(sys.getsizeof(doc_id) for doc_id in doc_ids if doc_id > 256)
+    pickled_bytes = len(pickle.dumps(sets, protocol=pickle.HIGHEST_PROTOCOL))
+    csr_bytes = doc_rows.nbytes + tfs.nbytes
+
+    # query-like workload: terms drawn in proportion to their document frequency
+    rng = np.random.default_rng(0)
+    doc_freqs = np.diff(offsets)
+    sample = rng.choice(len(terms), size=min(n_terms, len(terms)), p=doc_freqs / doc_freqs.sum()).tolist()
+    sample_postings = int(doc_freqs[sample].sum())
+    sample_terms = [terms[i] for i in sample]
+
+    set_time = _timed(lambda: [sorted(sets[term]) for term in sample_terms])
+    csr_time = _timed(lambda: [(np.array(doc_rows[offsets[i]:offsets[i + 1]]), np.array(tfs[offsets[i]:offsets[i + 1]])) for i in sample])
+    block_time = _timed(lambda: [blocks.postings(i) for i in sample])
+    bulk_time = _timed(blocks.decode_all)
+
+    # membership probes that only touch the blocks the rows fall in
+    probes = np.sort(rng.choice(len(engine.doc_ids), size=min(64, len(engine.doc_ids)), replace=False))
+    skip_time = _timed(lambda: [blocks.contains(i, probes) for i in sample])
+
+    print(f"Index: {path} ({len(terms)} terms, {n_postings} postings, {len(blocks.block_lengths)} blocks of up to {blocks.block_size})")
+    print(f"{'format':<24}{'size':>12}{'bytes/posting':>16}{'decode (M postings/s)':>24}")
+    for name, n_bytes, elapsed in (
+        ("python sets (in memory)", set_bytes, set_time),
+        ("python sets (pickled)", pickled_bytes, None),
+        ("csr arrays", csr_bytes, csr_time),
+        ("compressed blocks", blocks.nbytes, block_time),
+    ):
+        rate = f"{sample_postings / elapsed / 1e6:.1f}" if elapsed else "-"
+        print(f"{name:<24}{_size(n_bytes):>12}{n_bytes / n_postings:>16.2f}{rate:>24}")
+    print(f"Decoded {len(sample)} terms sampled by document frequency ({sample_postings} postings)")
+    print(f"Bulk block decode: {n_postings / bulk_time / 1e6:.1f} M postings/s")
+    print(f"Skip-based membership of {len(probes)} rows: {len(sample) / skip_time:.0f} terms/s")
+    print(f"Blocks are {csr_bytes / blocks.nbytes:.1f}x smaller than csr and {set_bytes / blocks.nbytes:.1f}x smaller than sets")
+
+
+def bm25_batch_benchmark_command(n_queries: int = 500, limit: int = 10, stop_words=None) -> None:
+    """Compare one-at-a-time BM25 search with batched scoring.
+
+    Queries are drawn two ways: words of random catalog descriptions, which
+    favour frequent terms, and terms picked uniformly from the vocabulary,
+    which are mostly rare.
+    """
+    index = InvertedIndex()
+    index.load()
+    catalog = MovieCatalog.open()
+    rng = np.random.default_rng(0)
+    description_queries = []
+    for row in rng.integers(len(catalog), size=n_queries).tolist():
+        words = catalog[row]["description"].split()
+        description_queries.append(" ".join(rng.choice(words, size=min(len(words), int(rng.integers(1, 7))), replace=False)))
+    vocabulary = [term.decode() for segment in index.get_segments() for term in segment.engine.terms.tolist()]
+    vocabulary_queries = [" ".join(rng.choice(vocabulary, size=int(rng.integers(1, 5)))) for _ in range(n_queries)]
+
+    # the per-posting weights are computed once, on the first batch
+    index.bm25_search_batch(description_queries[:1], limit, stop_words=stop_words)
+
+    print(f"{n_queries} queries per workload, top {limit}")
+    print(f"{'workload':<24}{'one at a time (q/s)':>22}{'batched (q/s)':>16}{'speedup':>10}{'identical':>11}")
+    for name, queries in (("description words", description_queries), ("vocabulary terms", vocabulary_queries)):
+        single, batch = [], []
+        single_time = _timed(lambda: single.append([index.bm25_search(query, limit, stop_words=stop_words) for query in queries]), repeat=1)
+        batch_time = _timed(lambda: batch.append(index.bm25_search_batch(queries, limit, stop_words=stop_words)), repeat=1)
+        print(f"{name:<24}{len(queries) / single_time:>22.0f}{len(queries) / batch_time:>16.0f}{single_time / batch_time:>9.2f}x{str(single[0] == batch[0]):>11}")
+
+
+def ann_benchmark_command(
+    source: str = CHUNK_STORE, name: str = "chunks", nprobes=(1, 2, 4, 8, 16, 32), k: int = 10, n_queries: int = 200, n_lists: int | None = None,
+) -> None:
+    """Recall@k and latency of the IVF index against an exact scan of the same embeddings.
+
+    The queries are stored embeddings picked at random, so every query has
+    neighbours in the index the way a real query would.
+    """
+    build_start = time.perf_counter()
+    index = IVFIndex.open(source, name, n_lists=n_lists)
+    build_time = time.perf_counter() - build_start
+    vectors = normalize_rows(np.asarray(load_vectors(source), dtype=np.float32))
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+
+    exact = []
+    start = time.perf_counter()
+    for query in queries:
+        exact.append(set(np.argsort(-(vectors @ query), kind="stable")[:k].tolist()))
+    exact_time = (time.perf_counter() - start) / len(queries)
+
+    print(f"{len(vectors)} vectors in {index.n_lists} lists (opened in {build_time:.2f}s), {len(queries)} queries, k={k}")
+    print(f"exact scan: {exact_time * 1000:.2f} ms/query")
+    print(f"{'nprobe':>8}{'recall@' + str(k):>12}{'ms/query':>12}{'speedup':>10}{'scanned':>10}")
+    for nprobe in nprobes:
+        hits = scanned = 0
+        start = time.perf_counter()
+        for query, truth in zip(queries, exact):
+            rows, _ = index.search(query, k, nprobe)
+            hits += len(truth & set(rows.tolist()))
+        elapsed = (time.perf_counter() - start) / len(queries)
+        for query in queries:
+            scanned += len(index.probe(query, nprobe)[0])
+        print(f"{nprobe:>8}{hits / (len(queries) * k):>12.3f}{elapsed * 1000:>12.2f}{exact_time / elapsed:>9.1f}x{scanned / (len(queries) * len(vectors)):>9.1%}")
+
+
+def quantization_benchmark_command(
+    source: str = CHUNK_STORE, name: str = "chunks", codecs=CODECS, k: int = 10, n_queries: int = 200, n_subspaces: int | None = None,
+) -> None:
+    """Memory, recall@k and latency of each quantized encoding against exact float32 search.
+
+    Recall is reported for the ranking from the codes alone and after the
+    top ``k * RESCORE_FACTOR`` are rescored at full precision.
+    """
+    vectors = normalize_rows(np.asarray(load_vectors(source), dtype=np.float32))
+    rng = np.random.default_rng(0)
+    # perturbed stored embeddings, so queries have close but not identical neighbours
+    queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    queries = normalize_rows(queries + rng.normal(scale=0.5 / np.sqrt(vectors.shape[1]), size=queries.shape).astype(np.float32))
+
+    exact = []
+    start = time.perf_counter()
+    for query in queries:
+        exact.append(set(np.argsort(-(vectors @ query), kind="stable")[:k].tolist()))
+    exact_time = (time.perf_counter() - start) / len(queries)
+
+    print(f"{len(vectors)} vectors of {vectors.shape[1]} dimensions, {len(queries)} queries, k={k}, rescoring the top {k * RESCORE_FACTOR}")
+    print(f"{'codec':<10}{'size':>12}{'saved':>8}{'recall (codes)':>16}{'recall (rescored)':>19}{'ms/query':>10}")
+    print(f"{'float32':<10}{_size(vectors.nbytes):>12}{'-':>8}{1:>16.3f}{1:>19.3f}{exact_time * 1000:>10.2f}")
+    for codec in codecs:
+        quantized = QuantizedVectors.open(source, name, codec, n_subspaces=n_subspaces)
+        coarse_hits = hits = 0
+        for query, truth in zip(queries, exact):
+            coarse_hits += len(truth & set(np.argsort(-quantized.scores(query), kind="stable")[:k].tolist()))
+        start = time.perf_counter()
+        for query, truth in zip(queries, exact):
+            rows, _ = quantized.search(query, k)
+            hits += len(truth & set(rows.tolist()))
+        elapsed = (time.perf_counter() - start) / len(queries)
+        total = len(queries) * k
+        print(f"{codec:<10}{_size(quantized.nbytes):>12}{1 - quantized.nbytes / vectors.nbytes:>8.0%}{coarse_hits / total:>16.3f}{hits / total:>19.3f}{elapsed * 1000:>10.2f}")
+
+
+# commands timed by startup_benchmark_command: every CLI's --help (its imports alone)
+# plus commands that run without a model or network access
+STARTUP_COMMANDS = (
+    "keyword_search_cli.py --help",
+    "keyword_search_cli.py bm25search 'space adventure'",
+    "keyword_search_cli.py search 'space adventure'",
+    "semantic_search_cli.py --help",
+    "semantic_search_cli.py chunk 'A short text to split into chunks.'",
+    "hybrid_search_cli.py --help",
+    "hybrid_search_cli.py normalize 0.5 2.3 1.2",
+    "augmented_generation_cli.py --help",
+    "multimodal_search_cli.py --help",
+    "evaluation_cli.py --help",
+    "describe_image_cli.py --help",
+)
+# imports worth knowing about when a command pulls them in
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "google.genai", "PIL", "nltk")
+
+
+def startup_benchmark_command(commands=STARTUP_COMMANDS, repeat: int = 3) -> None:
+    """Wall time of each CLI command in a fresh interpreter, and the heavy modules it imports."""
+    cli_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'command':<64}{'seconds':>9}  {'status':<8}heavy imports")
+    for command in commands:
+        script, *args = shlex.split(command)
+        argv = [sys.executable, os.path.join(cli_dir, script), *args]
+        elapsed = _timed(lambda: subprocess.run(argv, capture_output=True), repeat=repeat)
+        # one more run under -X importtime to list what was imported
+        traced = subprocess.run([sys.executable, "-X", "importtime", *argv[1:]], capture_output=True, text=True)
+        imported = {line.rsplit("|", 1)[-1].strip() for line in traced.stderr.splitlines() if line.startswith("import time:")}
+        heavy = [module for module in HEAVY_MODULES if module in imported]
+        status = "ok" if traced.returncode == 0 else f"exit {traced.returncode}"
+        print(f"{command[:63]:<64}{elapsed:>9.2f}  {status:<8}{', '.join(heavy) or '-'}")
+
+
+def _sample_queries(catalog, n_queries: int, seed: int = 0) -> list[str]:
+    # two to six words from the descriptions of random movies
+    rng = np.random.default_rng(seed)
+    queries = []
+    for row in rng.integers(len(catalog), size=n_queries).tolist():
+        words = catalog[row]["description"].split() or [catalog[row]["title"]]
+        queries.append(" ".join(rng.choice(words, size=min(len(words), int(rng.integers(2, 7))), replace=False)))
+    return queries
+
+
+def semantic_batch_benchmark_command(n_queries: int = 200, limit: int = 10, chunked: bool = True) -> None:
+    """Compare one-at-a-time semantic search with search_batch / search_chunks_batch.
+
+    Queries are words drawn from random catalog descriptions. The query
+    embedding cache is disabled for both runs so every query is encoded.
+    """
+    catalog = MovieCatalog.open()
+    search = ChunkedSemanticSearch() if chunked else SemanticSearch()
+    search.load_or_create_embeddings(catalog)
+    queries = _sample_queries(catalog, n_queries)
+    single_search, batch_search = (search.search_chunks, search.search_chunks_batch) if chunked else (search.search, search.search_batch)
+
+    # load the model and warm up before timing
+    single_search(queries[0], limit)
+    search.query_cache = QueryEmbeddingCache(search.model_name, size=0, cache_dir=None)
+    single, batch = [], []
+    single_time = _timed(lambda: single.append([single_search(query, limit) for query in queries]), repeat=1)
+    batch_time = _timed(lambda: batch.append(batch_search(queries, limit)), repeat=1)
+    same = sum([result["title"] for result in a] == [result["title"] for result in b] for a, b in zip(single[0], batch[0]))
+
+    print(f"{n_queries} queries against the {'chunk' if chunked else 'movie'} embeddings, top {limit}")
+    print(f"{'one at a time':<16}{len(queries) / single_time:>10.1f} queries/s")
+    print(f"{'batched':<16}{len(queries) / batch_time:>10.1f} queries/s ({single_time / batch_time:.1f}x)")
+    print(f"Same ranking for {same}/{len(queries)} queries (scores can differ in the last float32 bit, which may swap near-ties)")
+
+
+def encoding_benchmark_command(workers=(1, 2, 4), n_texts: int = 20000) -> None:
+    """Throughput of encode_texts over catalog chunks with 1 and more encoding processes.
+
+    Pool start-up (spawning the workers and loading a model in each) is timed
+    separately from encoding, which is what a long build is dominated by.
+    Every run is checked against the single-process embeddings.
+    """
+    texts = []
+    for _, chunk in iter_chunks(MovieCatalog.open(), max_chunk_size=4, overlap=1):
+        texts.append(chunk)
+        if len(texts) == n_texts:
+            break
+    print(f"{len(texts)} chunks, {os.cpu_count()} cpus")
+    print(f"{'workers':>8}{'start s':>10}{'texts/s':>12}{'speedup':>10}  matches 1 worker")
+    baseline = baseline_rate = None
+    for n_workers in workers:
+        search = SemanticSearch(workers=n_workers)
+        # start the workers (or load the model) before timing
+        startup = _timed(lambda: search.encode_texts(texts[:n_workers]), repeat=1)
+        result = []
+        elapsed = _timed(lambda: result.append(search.encode_texts(texts)), repeat=1)
+        search.close_encoding_pool()
+        if baseline is None:
+            baseline, baseline_rate = result[0], len(texts) / elapsed
+        rate = len(texts) / elapsed
+        same = np.allclose(result[0], baseline, atol=1e-5)
+        print(f"{n_workers:>8}{startup:>10.2f}{rate:>12.0f}{rate / baseline_rate:>9.2f}x  {'yes' if same else 'NO'}")
+
+
+def inference_benchmark_command(backends=BACKENDS, n_queries: int = 100, limit: int = 10, threads: int | None = None) -> None:
+    """Per-query latency of the query encoder and the cross-encoder on each backend, against float32.
+
+    Agreement is the cosine between each query's embedding and its float32
+    embedding (for the cross-encoder, the correlation of the scores of one
+    query's candidates); overlap is the share of the float32 top ``limit``
+    chunk search results, or reranked candidates, that a backend also returns.
+    """
+    catalog = MovieCatalog.open()
+    queries = _sample_queries(catalog, n_queries)
+    runs = {}
+    for backend in ("torch", *[backend for backend in backends if backend != "torch"]):
+        search = ChunkedSemanticSearch(backend=backend, threads=threads)
+        search.load_or_create_embeddings(catalog)
+        search.query_cache = QueryEmbeddingCache(search.model_name, size=0, cache_dir=None)
+        # load the model and warm up before timing
+        search.generate_embedding(queries[0])
+        embeddings = []
+        seconds = _timed(lambda: embeddings.append([search.generate_embedding(query) for query in queries]), repeat=1)
+        ranked = [[result["id"] for result in results] for results in search.search_chunks_batch(queries, limit)]
+        runs[backend] = {"seconds": seconds, "embeddings": np.array(embeddings[0]), "ranked": ranked}
+        if backend == "torch":
+            # the cross-encoders rerank the same float32 candidates, limit * 5 per query as in rrf_search
+            candidates = search.search_chunks_batch(queries, limit * 5)
+
+    pairs = [[(query, result["document"]) for result in results] for query, results in zip(queries, candidates)]
+    reranks = {}
+    for backend in runs:
+        cross_encoder = load_cross_encoder(CROSS_ENCODER_MODEL, backend, threads)
+        cross_encoder.predict(pairs[0])
+        scores = []
+        seconds = _timed(lambda: scores.extend(np.asarray(cross_encoder.predict(query_pairs), dtype=np.float32) for query_pairs in pairs), repeat=1)
+        reranks[backend] = {"seconds": seconds, "scores": scores}
+
+    def overlap(a, b):
+        return np.mean([len(set(x[:limit]) & set(y[:limit])) / max(len(x[:limit]), 1) for x, y in zip(a, b)])
+
+    print(f"{n_queries} queries, top {limit}, {threads or 'default'} torch threads")
+    print(f"{'model':<16}{'backend':<9}{'ms/query':>10}{'speedup':>9}  {'agreement':<24}{'overlap@' + str(limit):>13}")
+    base = runs["torch"]
+    for backend, run in runs.items():
+        cosines = np.sum(normalize_rows(run["embeddings"]) * normalize_rows(base["embeddings"]), axis=1)
+        agreement = f"cos {cosines.mean():.4f} (min {cosines.min():.3f})"
+        print(f"{'query encoder':<16}{backend:<9}{run['seconds'] / n_queries * 1e3:>10.2f}{base['seconds'] / run['seconds']:>8.2f}x  {agreement:<24}{overlap(run['ranked'], base['ranked']):>13.3f}")
+    base = reranks["torch"]
+    base_order = [np.argsort(-scores, kind="stable") for scores in base["scores"]]
+    for backend, run in reranks.items():
+        correlations = [np.corrcoef(a, b)[0, 1] for a, b in zip(run["scores"], base["scores"]) if len(a) > 1]
+        agreement = f"r {np.nanmean(correlations):.4f}"
+        order = [np.argsort(-scores, kind="stable") for scores in run["scores"]]
+        print(f"{'cross-encoder':<16}{backend:<9}{run['seconds'] / n_queries * 1e3:>10.2f}{base['seconds'] / run['seconds']:>8.2f}x  {agreement:<24}{overlap(order, base_order):>13.3f}")
+
+
+SERVER_ENDPOINTS = ("bm25search", "search", "search_chunked", "weighted_search", "rrf_search")
+
+
+def server_benchmark_command(server: str, endpoints=SERVER_ENDPOINTS, n_queries: int = 100, concurrency: int = 1) -> None:
+    """Latency of each endpoint of a running search server as seen by a client, and its throughput.
+
+    Each query is sent once, from ``concurrency`` threads at a time. Compare
+    with the cold CLI timings of the ``startup`` benchmark.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    queries = _sample_queries(MovieCatalog.open(), n_queries)
+
+    def timed_request(endpoint, query):
+        start = time.perf_counter()
+        remote(server, endpoint, query=query)
+        return time.perf_counter() - start
+
+    print(f"{n_queries} queries per endpoint, {concurrency} at a time")
+    print(f"{'endpoint':<18}{'p50 ms':>9}{'p95 ms':>9}{'queries/s':>11}")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for endpoint in endpoints:
+            start = time.perf_counter()
+            latencies = np.array(list(pool.map(lambda query: timed_request(endpoint, query), queries))) * 1000
+            elapsed = time.perf_counter() - start
+            print(f"{endpoint:<18}{np.percentile(latencies, 50):>9.1f}{np.percentile(latencies, 95):>9.1f}{n_queries / elapsed:>11.1f}")
+
+
+def hybrid_benchmark_command(n_queries: int = 100, limit: int = 5, k: int = 60, alpha: float = 0.5) -> None:
+    """Per-leg and end-to-end latency of weighted and RRF hybrid search, legs run serially and concurrently.
+
+    The query embedding cache is disabled so every query is encoded. Both
+    modes must return the same results; the saving is how much of the
+    shorter leg the concurrent run hides behind the longer one.
+    """
+    catalog = MovieCatalog.open()
+    queries = _sample_queries(catalog, n_queries)
+    search = HybridSearch(catalog)
+    search.semantic_search.query_cache = QueryEmbeddingCache(search.semantic_search.model_name, size=0, cache_dir=None)
+    methods = {
+        "weighted": lambda query: search.weighted_search(query, alpha, limit),
+        "rrf": lambda query: [result["id"] for result in search.rrf_search(query, k, limit)],
+    }
+    # load the model and warm up before timing
+    methods["rrf"](queries[0])
+
+    print(f"{n_queries} queries, top {limit}, {os.cpu_count()} cpus; mean ms per query")
+    print(f"{'search':<10}{'legs':<12}{'bm25':>8}{'semantic':>10}{'both':>8}{'fusion':>8}{'total':>8}{'p95':>8}  same results")
+    for method, run in methods.items():
+        baseline = None
+        for concurrent in (False, True):
+            search.concurrent = concurrent
+            results, timings = [], []
+            for query in queries:
+                results.append(run(query))
+                timings.append(search.timings)
+            mean = {stage: np.mean([t[stage] for t in timings]) * 1000 for stage in ("bm25", "semantic", "retrieval", "fusion", "total")}
+            p95 = np.percentile([t["total"] for t in timings], 95) * 1000
+            baseline = baseline or results
+            same = sum(a == b for a, b in zip(results, baseline))
+            print(f"{method:<10}{'concurrent' if concurrent else 'serial':<12}{mean['bm25']:>8.1f}{mean['semantic']:>10.1f}{mean['retrieval']:>8.1f}{mean['fusion']:>8.1f}{mean['total']:>8.1f}{p95:>8.1f}  {same}/{n_queries}")
+
+
+def fusion_benchmark_command(n_queries: int = 200, limit: int = 5, k: int = 60) -> None:
+    """Adaptive-depth RRF against fusing both legs at their full ``limit * 500`` depth.
+
+    The semantic leg is ranked once per query outside the timings (it scores
+    every chunk whatever the depth); the timings cover fetching BM25 and
+    fusing. Every adaptive top ``limit`` must equal the full-depth one: ids,
+    scores and ranks.
+    """
+    catalog = MovieCatalog.open()
+    queries = _sample_queries(catalog, n_queries)
+    search = HybridSearch(catalog)
+    depth = limit * 500
+    full_times, adaptive_times, depths, same = [], [], [], 0
+    weighted_time = 0.0
+    for query in queries:
+        semantic = search._semantic_ranking(query, depth)
+        start = time.perf_counter()
+        bm25 = search._bm25_ranking(query, depth)
+        full = fuse_rrf([bm25[0], semantic[0]], k, limit)[:3]
+        full_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        *adaptive, used = adaptive_rrf(lambda bm25_depth: [search._bm25_ranking(query, bm25_depth)[0], semantic[0]], k, limit, depth)
+        adaptive_times.append(time.perf_counter() - start)
+        depths.append(used)
+        same += all(np.array_equal(a, b) for a, b in zip(full, adaptive))
+        start = time.perf_counter()
+        fuse_weighted([bm25, semantic], [0.5, 0.5], limit)
+        weighted_time += time.perf_counter() - start
+
+    print(f"{n_queries} queries, top {limit}, k={k}, full depth {depth}")
+    print(f"{'rrf':<10}{'ms/query':>10}{'p95 ms':>9}  BM25 depth")
+    print(f"{'full':<10}{np.mean(full_times) * 1e3:>10.2f}{np.percentile(full_times, 95) * 1e3:>9.2f}  {depth}")
+    print(f"{'adaptive':<10}{np.mean(adaptive_times) * 1e3:>10.2f}{np.percentile(adaptive_times, 95) * 1e3:>9.2f}  mean {np.mean(depths):.0f}, median {np.median(depths):.0f}, max {max(depths)}")
+    print(f"Identical top {limit} for {same}/{n_queries} queries")
+    print(f"Weighted fusion of the full-depth legs: {weighted_time / n_queries * 1e3:.2f} ms/query")
@@ -0,0 +1,670 @@
+import math
+import numpy as np
+from postings_codec import BLOCK_SIZE, BlockPostings
+
+# search_batch scores queries in groups of at most this many gathered postings
+BATCH_POSTINGS = 1 << 22
+# with pruning, queries with more postings than this fraction of the documents go to top_k
+BATCH_PRUNE_FRACTION = 0.25
+
+
+def encode_positions(positions, counts):
+    """Delta-encode token positions, restarting at the first position of every posting."""
+    positions = np.asarray(positions, dtype=np.int64)
+    deltas = positions.copy()
+    deltas[1:] -= positions[:-1]
+    starts = np.cumsum(counts) - counts
+    deltas[starts[counts > 0]] = positions[starts[counts > 0]]
+    return deltas
+
+
+def decode_positions(deltas, position_offsets, postings):
+    """Absolute positions of the given postings as ``(owner, positions)``.
+
+    ``owner`` indexes ``postings``; each posting's positions are ascending.
+    """
+    starts = position_offsets[postings]
+    counts = position_offsets[postings + 1] - starts
+    owner = np.repeat(np.arange(len(postings)), counts)
+    run_starts = np.cumsum(counts) - counts
+    idx = np.arange(int(counts.sum())) + np.repeat(starts - run_starts, counts)
+    values = deltas[idx].astype(np.int64)
+    running = np.cumsum(values)
+    # subtract what the running sum carried in from the previous postings
+    carried = running[run_starts[counts > 0]] - values[run_starts[counts > 0]]
+    return owner, running - np.repeat(carried, counts[counts > 0])
+
+
+class BM25Engine():
+    """Precomputed BM25 scorer over a CSR view of the inverted index.
+
+    Terms are UTF-8 encoded and sorted so that a term id is a binary search
+    away, which also lets the arrays be memory-mapped straight from disk (see
+    ``index_store``). The postings of
+    term ``t`` are ``doc_rows[offsets[t]:offsets[t + 1]]`` with the matching
+    counts in ``tfs``; rows index ``doc_ids``/``doc_lengths``, which are sorted
+    by doc id, so every posting slice is in ascending doc id order.
+
+    Indexes built with positions also carry the ``tfs[p]`` token positions of
+    posting ``p``, delta-encoded within the posting, in
+    ``positions[position_offsets[p]:position_offsets[p + 1]]``.
+
+    With ``block_postings`` the rows and tfs are kept compressed (see
+    ``postings_codec``) and only decoded a term at a time as queries need them;
+    ``doc_rows`` and ``tfs`` then decode every block on each access and are
+    only meant for whole-index work such as saving or benchmarking.
+    """
+
+    def __init__(
+        self, terms, offsets, doc_rows, tfs, doc_ids, doc_lengths, n_docs, k1, b,
+        idf=None, max_tf_components=None, positions=None, position_offsets=None, block_postings=None,
+    ) -> None:
+        self.terms = terms
+        self.offsets = offsets
+        self._doc_rows = doc_rows
+        self._tfs = tfs
+        self.block_postings = block_postings
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.n_docs = n_docs
+        self._own_n_docs = n_docs
+        self.k1 = k1
+        self.b = b
+
+        self.doc_freqs = np.diff(offsets)
+        if idf is None:
+            # math.log rather than np.log so the values match the scalar formula bit for bit
+            idf = np.array([self.idf_for_df(df) for df in self.doc_freqs.tolist()], dtype=np.float64)
+        self.idf = idf
+        self._max_tf_components = max_tf_components
+        self._posting_weights = None
+        self.positions = positions
+        self._position_offsets = position_offsets
+
+        self.avg_doc_length = int(doc_lengths.sum()) / len(doc_lengths) if len(doc_lengths) else 0
+        # k1 * length_norm for every document, the only length dependent part of the tf component
+        self.k1_norms = self._k1_norms(self.avg_doc_length)
+        self._own_k1_norms = self.k1_norms
+
+        # set by attach() when this engine is one segment of a larger index
+        self.deleted = None
+        self.stats = None
+        self._bound_scale = 1.0
+
+    def all_postings(self):
+        """``(doc_rows, tfs)`` of every posting; a compressed engine decodes them without keeping them."""
+        if self.block_postings is not None:
+            return self.block_postings.decode_all()
+        return self._doc_rows, self._tfs
+
+    @property
+    def doc_rows(self):
+        return self.all_postings()[0]
+
+    @property
+    def tfs(self):
+        return self.all_postings()[1]
+
+    def compress(self, block_size: int = BLOCK_SIZE) -> "BM25Engine":
+        """The same engine with its postings stored as compressed blocks."""
+        doc_rows, tfs = self.all_postings()
+        return BM25Engine(
+            terms=self.terms,
+            offsets=self.offsets,
+            doc_rows=None,
+            tfs=None,
+            doc_ids=self.doc_ids,
+            doc_lengths=self.doc_lengths,
+            n_docs=self._own_n_docs,
+            k1=self.k1,
+            b=self.b,
+            idf=self.idf,
+            max_tf_components=self.max_tf_components,
+            positions=self.positions,
+            position_offsets=self.position_offsets,
+            block_postings=BlockPostings.encode(self.offsets, doc_rows, tfs, block_size),
+        )
+
+    def _k1_norms(self, avg_doc_length: float):
+        if not avg_doc_length:
+            return np.zeros(len(self.doc_lengths), dtype=np.float64)
+        return self.k1 * (1 - self.b + self.b * (self.doc_lengths / avg_doc_length))
+
+    def attach(self, stats: "CorpusStats | None") -> None:
+        """Score against statistics shared with the other segments of an index.
+
+        ``stats=None`` goes back to this engine's own precomputed statistics.
+        Tombstoned rows are set separately through ``deleted``.
+        """
+        self.stats = stats
+        own_avg_doc_length = int(self.doc_lengths.sum()) / len(self.doc_lengths) if len(self.doc_lengths) else 0
+        if stats is None:
+            self.n_docs = self._own_n_docs
+            self.avg_doc_length = own_avg_doc_length
+            self.k1_norms = self._own_k1_norms
+            self._bound_scale = 1.0
+            return
+        self.n_docs = stats.n_docs
+        self.avg_doc_length = stats.avg_doc_length
+        self.k1_norms = self._k1_norms(stats.avg_doc_length)
+        # the stored per-term maxima were taken at this segment's own average length;
+        # a tf component grows at most by avgdl_new / avgdl_old when the average grows
+        if own_avg_doc_length and stats.avg_doc_length > own_avg_doc_length:
+            self._bound_scale = stats.avg_doc_length / own_avg_doc_length
+        else:
+            self._bound_scale = 1.0
+
+    def term_idf(self, term: str, term_id: int) -> float:
+        if self.stats is not None:
+            return self.stats.idf(term)
+        return self.idf[term_id] if term_id >= 0 else self.idf_for_df(0)
+
+    def live_rows(self, rows):
+        if self.deleted is None:
+            return rows
+        return rows[~self.deleted[rows]]
+
+    def live_doc_freq(self, term: str) -> int:
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return 0
+        return len(self.live_rows(self.postings(term_id)[0]))
+
+    def live_doc_lengths(self):
+        if self.deleted is None:
+            return self.doc_lengths
+        return self.doc_lengths[~self.deleted]
+
+    def live_row(self, doc_id: int) -> int:
+        row = self.row_of(doc_id)
+        if row >= 0 and self.deleted is not None and self.deleted[row]:
+            return -1
+        return row
+
+    @classmethod
+    def from_index(cls, index, term_frequencies, doc_lengths, n_docs, k1, b) -> "BM25Engine":
+        doc_ids = np.array(sorted(doc_lengths), dtype=np.int64)
+        row_of = {doc_id: row for row, doc_id in enumerate(doc_ids.tolist())}
+
+        terms = sorted(index)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_rows = []
+        tfs = []
+        for term_id, term in enumerate(terms):
+            postings = sorted(index[term])
+            offsets[term_id + 1] = offsets[term_id] + len(postings)
+            doc_rows.extend(row_of[doc_id] for doc_id in postings)
+            tfs.extend(term_frequencies[doc_id][term] for doc_id in postings)
+
+        return cls(
+            terms=np.array([term.encode() for term in terms], dtype=bytes),
+            offsets=offsets,
+            doc_rows=np.array(doc_rows, dtype=np.int32),
+            tfs=np.array(tfs, dtype=np.int32),
+            doc_ids=doc_ids,
+            doc_lengths=np.array([doc_lengths[doc_id] for doc_id in doc_ids.tolist()], dtype=np.int64),
+            n_docs=n_docs,
+            k1=k1,
+            b=b,
+        )
+
+    @classmethod
+    def from_shards(cls, shards, n_docs, k1, b) -> "BM25Engine":
+        """Merge flat per-shard postings into one engine.
+
+        Each shard is ``(vocab, term_ids, doc_ids, tfs, shard_doc_ids, lengths,
+        positions)`` where ``term_ids`` index the shard's own ``vocab`` and
+        ``positions`` holds each posting's ``tf`` absolute token positions, or is
+        None for an index without positions. The merge only sorts,
+        so the result depends on the shards' contents, not on how the corpus was
+        split or which worker finished first.
+        """
+        vocabs = [np.array(shard[0], dtype=str) for shard in shards]
+        all_terms, inverse = np.unique(np.concatenate(vocabs) if vocabs else np.empty(0, dtype=str), return_inverse=True)
+        term_ids = []
+        start = 0
+        for vocab, shard in zip(vocabs, shards):
+            term_ids.append(inverse[start:start + len(vocab)][shard[1]])
+            start += len(vocab)
+        term_ids = np.concatenate(term_ids) if term_ids else np.empty(0, dtype=np.int64)
+        posting_docs = np.concatenate([shard[2] for shard in shards]) if shards else np.empty(0, dtype=np.int64)
+        tfs = np.concatenate([shard[3] for shard in shards]) if shards else np.empty(0, dtype=np.int32)
+        shard_doc_ids = np.concatenate([shard[4] for shard in shards]) if shards else np.empty(0, dtype=np.int64)
+        lengths = np.concatenate([shard[5] for shard in shards]) if shards else np.empty(0, dtype=np.int64)
+        with_positions = bool(shards) and all(shard[6] is not None for shard in shards)
+        if with_positions:
+            positions = np.concatenate([np.asarray(shard[6], dtype=np.int64) for shard in shards])
+            position_starts = np.cumsum(tfs, dtype=np.int64) - tfs
+
+        doc_ids = np.unique(shard_doc_ids)
+        doc_lengths = np.zeros(len(doc_ids), dtype=np.int64)
+        # a doc id seen twice keeps its last length, like re-adding a document does
+        doc_lengths[np.searchsorted(doc_ids, shard_doc_ids)] = lengths
+        doc_rows = np.searchsorted(doc_ids, posting_docs)
+
+        order = np.lexsort((doc_rows, term_ids))
+        term_ids, doc_rows, tfs = term_ids[order], doc_rows[order], tfs[order]
+        if with_positions:
+            # move each posting's run of positions along with it
+            run_starts = np.cumsum(tfs, dtype=np.int64) - tfs
+            positions = positions[np.arange(int(tfs.sum())) + np.repeat(position_starts[order] - run_starts, tfs)]
+        if len(order):
+            # the same document indexed twice adds up its term counts
+            starts = np.flatnonzero(np.r_[True, (np.diff(term_ids) != 0) | (np.diff(doc_rows) != 0)])
+            if len(starts) < len(order):
+                tfs = np.add.reduceat(tfs, starts)
+                term_ids, doc_rows = term_ids[starts], doc_rows[starts]
+                if with_positions:
+                    merged = np.repeat(np.arange(len(tfs)), tfs)
+                    positions = positions[np.lexsort((positions, merged))]
+
+        counts = np.bincount(term_ids, minlength=len(all_terms))
+        if not counts.all():
+            # vocabulary that only occurred in dropped documents
+            kept = counts > 0
+            term_ids = (np.cumsum(kept) - 1)[term_ids]
+            all_terms, counts = all_terms[kept], counts[kept]
+        offsets = np.zeros(len(all_terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        position_offsets = None
+        if with_positions:
+            position_offsets = np.zeros(len(tfs) + 1, dtype=np.int64)
+            np.cumsum(tfs, out=position_offsets[1:])
+            positions = encode_positions(positions, tfs)
+        return cls(
+            terms=np.char.encode(all_terms, "utf-8") if len(all_terms) else np.empty(0, dtype=bytes),
+            offsets=offsets,
+            doc_rows=doc_rows.astype(np.int32),
+            tfs=tfs.astype(np.int32),
+            doc_ids=doc_ids.astype(np.int64),
+            doc_lengths=doc_lengths,
+            n_docs=n_docs,
+            k1=k1,
+            b=b,
+            positions=positions if with_positions else None,
+            position_offsets=position_offsets,
+        )
+
+    def live_shard(self):
+        """This engine's live postings in the shard layout ``from_shards`` merges."""
+        term_ids = np.repeat(np.arange(len(self.terms)), np.diff(self.offsets))
+        doc_rows, tfs = self.all_postings()
+        live_docs = np.ones(len(self.doc_ids), dtype=bool) if self.deleted is None else ~self.deleted
+        live_postings = live_docs[doc_rows]
+        return (
+            np.char.decode(self.terms, "utf-8") if len(self.terms) else [],
+            term_ids[live_postings],
+            self.doc_ids[doc_rows[live_postings]],
+            tfs[live_postings],
+            self.doc_ids[live_docs],
+            self.doc_lengths[live_docs],
+            None if self.positions is None else decode_positions(
+                self.positions, self.position_offsets, np.flatnonzero(live_postings)
+            )[1],
+        )
+
+    def idf_for_df(self, df: int) -> float:
+        # IDF = log((N - df + 0.5) / (df + 0.5) + 1)
+        return math.log((self.n_docs - df + 0.5) / (df + 0.5) + 1)
+
+    def term_id(self, term: str) -> int:
+        key = term.encode()
+        pos = int(np.searchsorted(self.terms, key))
+        if pos < len(self.terms) and self.terms[pos] == key:
+            return pos
+        return -1
+
+    def row_of(self, doc_id: int) -> int:
+        pos = int(np.searchsorted(self.doc_ids, doc_id))
+        if pos < len(self.doc_ids) and self.doc_ids[pos] == doc_id:
+            return pos
+        return -1
+
+    def postings(self, term_id: int):
+        if self.block_postings is not None:
+            return self.block_postings.postings(term_id)
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.doc_rows[start:end], self.tfs[start:end]
+
+    @property
+    def position_offsets(self):
+        # saved with the index; only indexes written before that derive them,
+        # as the running tf total (a posting has one position per occurrence)
+        if self._position_offsets is None and self.positions is not None:
+            tfs = self.tfs
+            offsets = np.zeros(len(tfs) + 1, dtype=np.int64)
+            np.cumsum(tfs, out=offsets[1:])
+            self._position_offsets = offsets
+        return self._position_offsets
+
+    def contains(self, term_id: int, rows):
+        """Mask of which sorted ``rows`` have a posting for ``term_id``."""
+        if term_id < 0:
+            return np.zeros(len(rows), dtype=bool)
+        if self.block_postings is not None:
+            return self.block_postings.contains(term_id, rows)
+        postings = self.postings(term_id)[0]
+        pos = np.searchsorted(postings, rows)
+        found = pos < len(postings)
+        found[found] = postings[pos[found]] == rows[found]
+        return found
+
+    def term_positions(self, term_id: int, rows):
+        """Token positions of ``term_id`` in ``rows``, which must all contain it.
+
+        Returns ``(owner, positions)`` with ``owner`` indexing ``rows``.
+        """
+        if self.positions is None:
+            raise ValueError("The keyword index has no token positions; rebuild it with `build --positions`")
+        postings = self.offsets[term_id] + np.searchsorted(self.postings(term_id)[0], rows)
+        return decode_positions(self.positions, self.position_offsets, postings)
+
+    def proximity(self, tokens, rows):
+        """Sum of 1 / distance between the closest occurrences of each pair of consecutive query tokens.
+
+        Adjacent tokens score 1; pairs missing from a row add nothing.
+        """
+        scores = np.zeros(len(rows), dtype=np.float64)
+        for a, b in zip(tokens, tokens[1:]):
+            id_a, id_b = self.term_id(a), self.term_id(b)
+            if a == b or id_a < 0 or id_b < 0:
+                continue
+            both = np.flatnonzero(self.contains(id_a, rows) & self.contains(id_b, rows))
+            if not len(both):
+                continue
+            owner_a, pos_a = self.term_positions(id_a, rows[both])
+            owner_b, pos_b = self.term_positions(id_b, rows[both])
+            # the nearest occurrence of b before and after each occurrence of a, within the same row
+            keys_a = (owner_a << 32) + pos_a
+            keys_b = (owner_b << 32) + pos_b
+            after = np.searchsorted(keys_b, keys_a)
+            distance = np.full(len(keys_a), np.inf)
+            for neighbour in (after - 1, after):
+                valid = (neighbour >= 0) & (neighbour < len(keys_b))
+                valid[valid] = owner_b[neighbour[valid]] == owner_a[valid]
+                distance[valid] = np.minimum(distance[valid], np.abs(pos_b[neighbour[valid]] - pos_a[valid]))
+            closest = np.full(len(both), np.inf)
+            np.minimum.at(closest, owner_a, distance)
+            scores[both] += 1 / closest
+        return scores
+
+    def doc_freq(self, term: str) -> int:
+        term_id = self.term_id(term)
+        return int(self.doc_freqs[term_id]) if term_id >= 0 else 0
+
+    def doc_length(self, doc_id: int) -> int:
+        row = self.row_of(doc_id)
+        return int(self.doc_lengths[row]) if row >= 0 else 0
+
+    def tf(self, doc_id: int, term: str) -> int:
+        term_id = self.term_id(term)
+        row = self.row_of(doc_id)
+        if term_id < 0 or row < 0:
+            return 0
+        rows, tfs = self.postings(term_id)
+        pos = int(np.searchsorted(rows, row))
+        if pos < len(rows) and rows[pos] == row:
+            return int(tfs[pos])
+        return 0
+
+    def term_weights(self, token: str, term: str | None = None, rows=None):
+        """Return the rows containing ``token`` and their BM25 weight for ``term``.
+
+        ``term`` is the key used for tf and idf. It defaults to ``token``; the
+        index passes the re-normalized token here because that is what
+        ``get_tf``/``get_bm25_idf`` look up. Passing sorted ``rows`` restricts
+        the result to those documents.
+        """
+        term = token if term is None else term
+        token_id = self.term_id(token)
+        if token_id < 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        posting_rows, tfs = self.postings(token_id)
+        if rows is not None:
+            pos = np.minimum(np.searchsorted(posting_rows, rows), len(posting_rows) - 1)
+            present = posting_rows[pos] == rows
+            posting_rows, tfs = rows[present], tfs[pos[present]]
+        if self.deleted is not None:
+            live = ~self.deleted[posting_rows]
+            posting_rows, tfs = posting_rows[live], tfs[live]
+
+        if term == token:
+            idf = self.term_idf(token, token_id)
+        else:
+            term_id = self.term_id(term) if term else -1
+            idf = self.term_idf(term, term_id) if term else 0.0
+            if term_id < 0:
+                tfs = np.zeros(len(posting_rows), dtype=np.int32)
+            else:
+                term_rows, term_tfs = self.postings(term_id)
+                pos = np.minimum(np.searchsorted(term_rows, posting_rows), len(term_rows) - 1)
+                tfs = np.where(term_rows[pos] == posting_rows, term_tfs[pos], 0)
+
+        tf_component = (tfs * (self.k1 + 1)) / (tfs + self.k1_norms[posting_rows])
+        return posting_rows, idf * tf_component
+
+    @property
+    def max_tf_components(self):
+        # per-term maximum of the tf component, i.e. the score upper bound divided by idf
+        if self._max_tf_components is None:
+            doc_rows, tfs = self.all_postings()
+            tf_components = (tfs * (self.k1 + 1)) / (tfs + self._own_k1_norms[doc_rows])
+            if len(self.terms):
+                self._max_tf_components = np.maximum.reduceat(tf_components, self.offsets[:-1])
+            else:
+                self._max_tf_components = np.empty(0, dtype=np.float64)
+        return self._max_tf_components
+
+    @property
+    def posting_weights(self):
+        # idf * tf component of every posting: the term x doc BM25 matrix in CSR form (uncompressed engines only)
+        if self._posting_weights is None:
+            idf = np.repeat(self.idf, self.doc_freqs)
+            self._posting_weights = idf * ((self.tfs * (self.k1 + 1)) / (self.tfs + self._own_k1_norms[self.doc_rows]))
+        return self._posting_weights
+
+    def _batch_weights(self, token: str, term: str | None):
+        token_id = self.term_id(token)
+        # shared statistics and re-normalized terms change the weights, score those directly;
+        # compressed postings are decoded for the term rather than kept as a full weights array
+        if token_id < 0 or self.stats is not None or (term is not None and term != token) or self.block_postings is not None:
+            return self.term_weights(token, term)
+        rows = self.postings(token_id)[0]
+        weights = self.posting_weights[self.offsets[token_id]:self.offsets[token_id + 1]]
+        if self.deleted is not None:
+            live = ~self.deleted[rows]
+            rows, weights = rows[live], weights[live]
+        return rows, weights
+
+    def search_batch(self, queries, limit: int, prune: bool = True) -> list[list[tuple[int, float]]]:
+        """``search`` for every query in ``queries``, with the same scores and ties.
+
+        Queries are scored a group at a time: each query's postings are
+        gathered from the precomputed weights in query order and summed per
+        (query, document) with one bincount, so every score adds up in the
+        same order as it does in ``search``. With ``prune``, queries with long
+        posting lists go through ``top_k`` instead, where MaxScore skips most
+        of those postings.
+        """
+        queries = [list(query_terms) for query_terms in queries]
+        pairs = {}
+        for query_terms in queries:
+            for pair in query_terms:
+                if pair not in pairs:
+                    pairs[pair] = self._batch_weights(*pair)
+        results = [None] * len(queries)
+        groups, group, group_postings = [], [], 0
+        for i, query_terms in enumerate(queries):
+            n_postings = sum(len(pairs[pair][0]) for pair in query_terms)
+            if prune and n_postings > BATCH_PRUNE_FRACTION * len(self.doc_ids):
+                results[i] = self.top_k(query_terms, limit)
+                continue
+            if group and group_postings + n_postings > BATCH_POSTINGS:
+                groups.append(group)
+                group, group_postings = [], 0
+            group.append(i)
+            group_postings += n_postings
+        for group in groups + [group]:
+            ranked = self._rank_batch([[pairs[pair] for pair in queries[i]] for i in group], limit)
+            for i, query_results in zip(group, ranked):
+                results[i] = query_results
+        return results
+
+    def _rank_batch(self, weighted_queries, limit: int) -> list[list[tuple[int, float]]]:
+        n_rows = len(self.doc_ids)
+        results = [[] for _ in weighted_queries]
+        gathered = [(q, rows, weights) for q, weighted_terms in enumerate(weighted_queries) for rows, weights in weighted_terms]
+        if not gathered or limit <= 0:
+            return results
+        keys = np.concatenate([q * n_rows + rows.astype(np.int64) for q, rows, _ in gathered])
+        weights = np.concatenate([weights for _, _, weights in gathered])
+
+        # bincount adds up each (query, row) in gather order; a key's first
+        # position in the gather is when search() first matched the doc
+        keys, first_seen, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights, minlength=len(keys))
+        bounds = np.searchsorted(keys, np.arange(len(weighted_queries) + 1) * n_rows)
+        for q in range(len(weighted_queries)):
+            matched = np.arange(bounds[q], bounds[q + 1])
+            if limit < len(matched):
+                cutoff = np.partition(scores[matched], len(matched) - limit)[len(matched) - limit]
+                matched = matched[scores[matched] >= cutoff]
+            ranked = matched[np.lexsort((first_seen[matched], -scores[matched]))][:limit]
+            results[q] = list(zip(self.doc_ids[keys[ranked] - q * n_rows].tolist(), scores[ranked].tolist()))
+        return results
+
+    def search(self, query_terms, limit: int) -> list[tuple[int, float]]:
+        """Score ``(token, term)`` pairs in query order and return the top ``limit`` docs.
+
+        Ties keep the order in which documents were first matched, which is
+        the order the dict based implementation produced.
+        """
+        return self._rank_all([self.term_weights(token, term) for token, term in query_terms], limit)
+
+    def _rank_all(self, weighted_terms, limit: int) -> list[tuple[int, float]]:
+        scores = np.zeros(len(self.doc_ids), dtype=np.float64)
+        first_seen = np.full(len(self.doc_ids), -1, dtype=np.int64)
+        n_seen = 0
+        for rows, weights in weighted_terms:
+            scores[rows] += weights
+            new_rows = rows[first_seen[rows] < 0]
+            first_seen[new_rows] = np.arange(n_seen, n_seen + len(new_rows))
+            n_seen += len(new_rows)
+
+        matched = np.flatnonzero(first_seen >= 0)
+        if 0 < limit < len(matched):
+            # only sort the docs that can make the cut
+            cutoff = np.partition(scores[matched], len(matched) - limit)[len(matched) - limit]
+            matched = matched[scores[matched] >= cutoff]
+        ranked = matched[np.lexsort((first_seen[matched], -scores[matched]))][:limit]
+        return [(int(self.doc_ids[row]), float(scores[row])) for row in ranked.tolist()]
+
+    def top_k(self, query_terms, limit: int) -> list[tuple[int, float]]:
+        """Same results as ``search``, with MaxScore pruning.
+
+        Terms are scanned in decreasing order of their score upper bound. Once
+        the bounds of the terms not yet scanned add up to less than the current
+        k-th best partial score, no unseen document can reach the top ``limit``:
+        the remaining terms are only probed for the surviving candidates, which
+        are dropped as soon as their own bound falls below the threshold. The
+        candidates are then scored exactly, in query order.
+        """
+        query_terms = list(query_terms)
+        if limit <= 0 or not query_terms:
+            return self.search(query_terms, limit)
+
+        # duplicate tokens score twice; group them and scale the bound
+        counts = {}
+        for pair in query_terms:
+            counts[pair] = counts.get(pair, 0) + 1
+        bounds = {}
+        scanned = {}
+        for (token, term), count in counts.items():
+            token_id = self.term_id(token)
+            if token_id < 0:
+                continue
+            if term is None or term == token:
+                bound = self.term_idf(token, token_id) * self.max_tf_components[token_id] * self._bound_scale
+            else:
+                scanned[(token, term)] = self.term_weights(token, term)
+                weights = scanned[(token, term)][1]
+                bound = weights.max() if len(weights) else 0.0
+            bounds[(token, term)] = count * float(bound)
+
+        order = sorted(bounds, key=lambda pair: bounds[pair], reverse=True)
+        remaining = sum(bounds.values())
+        partial = np.zeros(len(self.doc_ids), dtype=np.float64)
+        seen = np.zeros(len(self.doc_ids), dtype=bool)
+        candidates = None
+        for pair in order:
+            remaining -= bounds[pair]
+            if candidates is None:
+                if pair is order[-1]:
+                    # every term got scanned, prune nothing
+                    break
+                if pair not in scanned:
+                    scanned[pair] = self.term_weights(*pair)
+                rows, weights = scanned[pair]
+                partial[rows] += counts[pair] * weights
+                seen[rows] = True
+                seen_rows = np.flatnonzero(seen)
+                if len(seen_rows) < limit:
+                    continue
+                threshold = self._threshold(partial[seen_rows], limit)
+                if remaining < threshold:
+                    candidates = seen_rows[partial[seen_rows] + remaining >= threshold]
+            else:
+                rows, weights = self.term_weights(*pair, rows=candidates)
+                partial[rows] += counts[pair] * weights
+                threshold = self._threshold(partial[candidates], limit)
+                candidates = candidates[partial[candidates] + remaining >= threshold]
+
+        if candidates is None:
+            # nothing could be pruned, reuse the scanned postings
+            return self._rank_all([scanned[pair] if pair in scanned else self.term_weights(*pair) for pair in query_terms], limit)
+        return self._rank_candidates(query_terms, candidates, limit)
+
+    @staticmethod
+    def _threshold(scores, limit: int) -> float:
+        # k-th best lower bound, loosened slightly so float rounding never prunes a tie
+        kth = float(np.partition(scores, len(scores) - limit)[len(scores) - limit])
+        return kth - 1e-9 * max(1.0, abs(kth))
+
+    def _rank_candidates(self, query_terms, candidates, limit: int) -> list[tuple[int, float]]:
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        first_term = np.full(len(candidates), len(query_terms), dtype=np.int64)
+        for i, (token, term) in enumerate(query_terms):
+            rows, weights = self.term_weights(token, term, rows=candidates)
+            positions = np.searchsorted(candidates, rows)
+            scores[positions] += weights
+            first_term[positions] = np.minimum(first_term[positions], i)
+        # first matching term, then doc id: the order search() breaks ties in
+        ranked = np.lexsort((candidates, first_term, -scores))[:limit]
+        return [(int(self.doc_ids[candidates[i]]), float(scores[i])) for i in ranked.tolist()]
+
+
+class CorpusStats():
+    """Collection statistics for an index split into several engines.
+
+    N, the average document length and document frequencies only count rows
+    that are not tombstoned, so scores match a single index built from the
+    live documents.
+    """
+
+    def __init__(self, engines) -> None:
+        self.engines = engines
+        live_lengths = [engine.live_doc_lengths() for engine in engines]
+        self.n_docs = sum(len(lengths) for lengths in live_lengths)
+        total_length = sum(int(lengths.sum()) for lengths in live_lengths)
+        self.avg_doc_length = total_length / self.n_docs if self.n_docs else 0
+        self._idf = {}
+
+    def doc_freq(self, term: str) -> int:
+        return sum(engine.live_doc_freq(term) for engine in self.engines)
+
+    def idf(self, term: str) -> float:
+        if term not in self._idf:
+            df = self.doc_freq(term)
+            # IDF = log((N - df + 0.5) / (df + 0.5) + 1)
+            self._idf[term] = math.log((self.n_docs - df + 0.5) / (df + 0.5) + 1)
+        return self._idf[term]
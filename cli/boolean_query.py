@@ -0,0 +1,268 @@
+import re
+import numpy as np
+
+# AND binds tighter than OR, NOT tighter than AND; adjacent terms are ANDed
+OPERATORS = ("AND", "OR", "NOT")
+_QUERY_TOKENS = re.compile(r'"[^"]*"(?:~\d+)?|\(|\)|[^\s()]+')
+_PHRASE = re.compile(r'"([^"]*)"(?:~(\d+))?')
+
+
+class Term():
+    def __init__(self, token: str) -> None:
+        self.token = token
+
+    def postings(self, engine):
+        term_id = engine.term_id(self.token)
+        if term_id < 0:
+            return np.empty(0, dtype=np.int32)
+        return engine.postings(term_id)[0]
+
+    def cost(self, engine) -> int:
+        return len(self.postings(engine))
+
+    def first(self, engine, n: int):
+        rows = self.postings(engine)
+        if engine.deleted is None:
+            return rows[:n]
+        # skip tombstoned rows, looking further down the list only as needed
+        k = n
+        while True:
+            live = engine.live_rows(rows[:k])
+            if len(live) >= n or k >= len(rows):
+                return live[:n]
+            k *= 2
+
+    def matches(self, engine, rows):
+        return engine.contains(engine.term_id(self.token), rows)
+
+    def __repr__(self) -> str:
+        return self.token
+
+
+class All():
+    """Every live document; drives queries that only exclude."""
+
+    def cost(self, engine) -> int:
+        return len(engine.doc_ids)
+
+    def first(self, engine, n: int):
+        if engine.deleted is None:
+            return np.arange(min(n, len(engine.doc_ids)), dtype=np.int32)
+        return np.flatnonzero(~engine.deleted)[:n].astype(np.int32)
+
+    def matches(self, engine, rows):
+        return np.ones(len(rows), dtype=bool)
+
+
+class Not():
+    def __init__(self, child) -> None:
+        self.child = child
+
+    def cost(self, engine) -> int:
+        return len(engine.doc_ids) - self.child.cost(engine)
+
+    def first(self, engine, n: int):
+        return And([self]).first(engine, n)
+
+    def matches(self, engine, rows):
+        return ~self.child.matches(engine, rows)
+
+    def __repr__(self) -> str:
+        return f"NOT {self.child!r}"
+
+
+class And():
+    def __init__(self, children) -> None:
+        self.children = children
+
+    def cost(self, engine) -> int:
+        positives = [child for child in self.children if not isinstance(child, Not)]
+        return min((child.cost(engine) for child in positives), default=len(engine.doc_ids))
+
+    def first(self, engine, n: int):
+        # drive from the rarest positive operand, cheapest filter first
+        children = sorted(self.children, key=lambda child: child.cost(engine))
+        positives = [child for child in children if not isinstance(child, Not)]
+        driver = positives[0] if positives else All()
+        return _drive(engine, n, driver, [child.matches for child in children if child is not driver])
+
+    def matches(self, engine, rows):
+        mask = np.ones(len(rows), dtype=bool)
+        for child in self.children:
+            mask &= child.matches(engine, rows)
+        return mask
+
+    def __repr__(self) -> str:
+        return "(" + " AND ".join(map(repr, self.children)) + ")"
+
+
+class Phrase():
+    """Terms at consecutive positions or, with ``slop``, each within that many words of the first term."""
+
+    def __init__(self, tokens: list[str], slop: int = 0) -> None:
+        self.terms = [Term(token) for token in tokens]
+        self.slop = slop
+
+    def cost(self, engine) -> int:
+        return min(term.cost(engine) for term in self.terms)
+
+    def first(self, engine, n: int):
+        terms = sorted(self.terms, key=lambda term: term.cost(engine))
+        return _drive(engine, n, terms[0], [term.matches for term in terms[1:]] + [self._positions_match])
+
+    def matches(self, engine, rows):
+        mask = And(self.terms).matches(engine, rows)
+        mask[mask] = self._positions_match(engine, rows[mask])
+        return mask
+
+    def _positions_match(self, engine, rows):
+        # rows already contain every term. Key each occurrence by (row, position)
+        # so one sorted array covers the whole block; the offset keeps
+        # position - slop from reaching into the previous row.
+        offset = self.slop + len(self.terms)
+        keys = []
+        for term in self.terms:
+            owner, positions = engine.term_positions(engine.term_id(term.token), rows)
+            keys.append((owner << 32) + positions + offset)
+        anchors = keys[0]
+        hit = np.ones(len(anchors), dtype=bool)
+        for i, other in enumerate(keys[1:], 1):
+            if self.slop:
+                hit &= np.searchsorted(other, anchors + self.slop, "right") > np.searchsorted(other, anchors - self.slop)
+            else:
+                pos = np.searchsorted(other, anchors + i)
+                hit &= (pos < len(other)) & (other[np.minimum(pos, len(other) - 1)] == anchors + i)
+        mask = np.zeros(len(rows), dtype=bool)
+        mask[anchors[hit] >> 32] = True
+        return mask
+
+    def __repr__(self) -> str:
+        phrase = '"' + " ".join(term.token for term in self.terms) + '"'
+        return f"{phrase}~{self.slop}" if self.slop else phrase
+
+
+class Or():
+    def __init__(self, children) -> None:
+        self.children = children
+
+    def cost(self, engine) -> int:
+        return sum(child.cost(engine) for child in self.children)
+
+    def first(self, engine, n: int):
+        # the first n of the union are among the first n of each operand
+        if not self.children:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate([child.first(engine, n) for child in self.children]))[:n]
+
+    def matches(self, engine, rows):
+        mask = np.zeros(len(rows), dtype=bool)
+        for child in self.children:
+            mask |= child.matches(engine, rows)
+        return mask
+
+    def __repr__(self) -> str:
+        return "(" + " OR ".join(map(repr, self.children)) + ")"
+
+
+def _drive(engine, n: int, driver, filters):
+    # Test the driver's rows against each filter, fetching twice as many
+    # candidates each round until n rows survive, so the work is bounded by
+    # the driver's list rather than the filters'.
+    found = []
+    n_found = 0
+    seen = 0
+    k = max(n, 1)
+    while True:
+        candidates = driver.first(engine, k)
+        block = candidates[seen:]
+        for matches in filters:
+            if not len(block):
+                break
+            block = block[matches(engine, block)]
+        found.append(block)
+        n_found += len(block)
+        if n_found >= n or len(candidates) < k:
+            break
+        seen = len(candidates)
+        k *= 2
+    return np.concatenate(found)[:n]
+
+
+class _Parser():
+    def __init__(self, query: str, tokenizer) -> None:
+        self.tokens = _QUERY_TOKENS.findall(query)
+        self.pos = 0
+        self.tokenizer = tokenizer
+
+    def peek(self) -> str | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of boolean query")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.or_expr()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.peek()!r} in boolean query")
+        return node
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.peek() == "OR":
+            self.take()
+            children.append(self.and_expr())
+        return _combine(Or, children)
+
+    def and_expr(self):
+        children = [self.not_expr()]
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.take()
+            children.append(self.not_expr())
+        return _combine(And, children)
+
+    def not_expr(self):
+        if self.peek() == "NOT":
+            self.take()
+            child = self.not_expr()
+            return Not(child) if child is not None else None
+        return self.atom()
+
+    def atom(self):
+        token = self.take()
+        if token == "(":
+            node = self.or_expr()
+            if self.take() != ")":
+                raise ValueError("Missing ')' in boolean query")
+            return node
+        if token in OPERATORS or token == ")":
+            raise ValueError(f"Unexpected {token!r} in boolean query")
+        phrase = _PHRASE.fullmatch(token)
+        if phrase:
+            tokens = self.tokenizer.tokenize(phrase.group(1))
+            if len(tokens) < 2:
+                return _combine(And, [Term(term) for term in tokens])
+            return Phrase(tokens, int(phrase.group(2) or 0))
+        # stop words and bare punctuation normalize away and drop out of the query
+        return _combine(And, [Term(term) for term in self.tokenizer.tokenize(token)])
+
+
+def _combine(cls, children):
+    children = [child for child in children if child is not None]
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else cls(children)
+
+
+def parse_boolean_query(query: str, tokenizer):
+    """Parse ``star AND (war OR trek) NOT sequel`` into a tree of Term/And/Or/Not.
+
+    ``"star wars"`` matches a phrase and ``"star wars"~3`` both words within 3
+    words of each other; those need an index built with positions. Words go
+    through the index tokenizer; returns None if nothing is left.
+    """
+    return _Parser(query, tokenizer).parse()
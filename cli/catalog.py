@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import islice
+import numpy as np
+from index_store import DocumentMap, map_file
+
+MOVIES_PATH = "data/movies.json"
+CATALOG_DIR = "cache/catalog"
+CATALOG_VERSION = 1
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _JSONStream():
+    """Pull JSON values one at a time out of a file read in fixed-size chunks."""
+
+    def __init__(self, f, chunk_size: int) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in movie catalog, found {found or 'end of file'!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number or literal at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' in movie list, found {separator or 'end of file'!r}")
+
+
+def iter_movies(file_path: str = MOVIES_PATH, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """Yield movies one by one from a ``{"movies": [...]}`` file, a bare JSON array or JSON lines.
+
+    JSON files are parsed incrementally, so memory use does not grow with the
+    size of the catalog.
+    """
+    with open(file_path, "r") as f:
+        if file_path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        stream = _JSONStream(f, chunk_size)
+        if stream.peek() == "[":
+            yield from stream.array()
+            return
+        stream.expect("{")
+        while stream.peek() != "}":
+            key = stream.value()
+            stream.expect(":")
+            if key == "movies":
+                yield from stream.array()
+                return
+            stream.value()
+            if stream.peek() == ",":
+                stream.pos += 1
+        raise ValueError(f"No 'movies' list in {file_path}")
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+class MovieCatalog(Sequence):
+    """The movie catalog spooled once to JSON lines under ``cache/`` and memory-mapped.
+
+    Behaves like the list ``load_movies`` returns (positional access, ``len``,
+    iteration in file order) but only parses the movies that are touched, and
+    every process maps the same pages. ``document_map`` looks movies up by id.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        data_path = os.path.join(path, "movies.jsonl")
+        self._data = map_file(data_path)
+        rows = np.load(os.path.join(path, "map_rows.npy"))
+        self.document_map = DocumentMap(
+            data_path, np.load(os.path.join(path, "map_doc_ids.npy")), self.offsets[rows], self.offsets[rows + 1]
+        )
+
+    @classmethod
+    def open(cls, source: str = MOVIES_PATH, cache_dir: str = CATALOG_DIR) -> "MovieCatalog":
+        source = os.path.abspath(source)
+        path = os.path.join(cache_dir, hashlib.sha1(source.encode()).hexdigest()[:12])
+        stat = os.stat(source)
+        fingerprint = {"version": CATALOG_VERSION, "source": source, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                if json.load(f) == fingerprint:
+                    return cls(path)
+        cls.spool(source, path, fingerprint)
+        return cls(path)
+
+    @staticmethod
+    def spool(source: str, path: str, fingerprint: dict) -> None:
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        offsets = [0]
+        doc_ids = []
+        with open(os.path.join(tmp_path, "movies.jsonl"), "wb") as f:
+            for movie in iter_movies(source):
+                line = (json.dumps(movie) + "\n").encode()
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+                doc_ids.append(movie["id"])
+        np.save(os.path.join(tmp_path, "offsets.npy"), np.array(offsets, dtype=np.int64))
+
+        # by-id lookup: sorted ids, and for a repeated id its last row, as a dict would keep
+        doc_ids = np.array(doc_ids, dtype=np.int64)
+        reversed_ids = doc_ids[::-1]
+        map_doc_ids, first_in_reversed = np.unique(reversed_ids, return_index=True)
+        np.save(os.path.join(tmp_path, "map_doc_ids.npy"), map_doc_ids)
+        np.save(os.path.join(tmp_path, "map_rows.npy"), len(doc_ids) - 1 - first_in_reversed)
+
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(fingerprint, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(self._data[self.offsets[i]:self.offsets[i + 1]])
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield json.loads(self._data[self.offsets[i]:self.offsets[i + 1]])
+
+
+def document_map(documents) -> dict:
+    """doc_id -> movie for a list of movies or a MovieCatalog."""
+    if isinstance(documents, MovieCatalog):
+        return documents.document_map
+    return {doc["id"]: doc for doc in documents}
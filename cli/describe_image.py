@@ -2,13 +2,13 @@
 import os
 import json
 import re
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 
 
 
 def gemini_client():
+    # imported here so the CLI starts (and prints --help) without loading google-genai
+    from dotenv import load_dotenv
+    from google import genai
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -19,6 +19,7 @@ def gemini_client():
 
 def describe_image(image_content, query, client, mime_type):
 
+    from google.genai import types
     model = "gemini-2.5-flash"
 
     system_prompt = """
@@ -0,0 +1,270 @@
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the disk tier is not locked across processes
+    fcntl = None
+
+# sha1 digest of the model name and the encoded text
+KEY_DTYPE = np.dtype("S20")
+
+
+def text_keys(model_name: str, texts) -> np.ndarray:
+    """One key per text, so an embedding is reused only for the same text under the same model."""
+    return np.array([hashlib.sha1(f"{model_name}\0{text}".encode()).digest() for text in texts], dtype=KEY_DTYPE)
+
+
+def keys_path(path: str, kind: str = "keys") -> str:
+    """Where the keys of the embeddings file ``path`` are saved, e.g. cache/movie_embeddings.keys.npy."""
+    return f"{os.path.splitext(path)[0]}.{kind}.npy"
+
+
+def load_keys(path: str, kind: str = "keys"):
+    """The saved keys of ``path``, or None when there are none."""
+    key_file = keys_path(path, kind)
+    return np.load(key_file) if os.path.exists(key_file) else None
+
+
+def save_keys(path: str, keys, kind: str = "keys") -> None:
+    np.save(keys_path(path, kind), np.asarray(keys, dtype=KEY_DTYPE))
+
+
+class EmbeddingCache():
+    """The rows of a previous build of ``path`` (or the given ``vectors`` and ``keys``), looked up by text key.
+
+    ``embed`` only sends the texts it has no row for to the model, so
+    rebuilding after a catalog edit encodes just the new or changed texts.
+    The previous file is memory-mapped and must stay in place until the new
+    one has been written (NpyAppender and VectorStoreWriter write to a
+    temporary file first).
+    """
+
+    def __init__(self, path: str | None, model_name: str, vectors=None, keys=None) -> None:
+        self.model_name = model_name
+        self.vectors = None
+        self.encoded = 0
+        self.reused = 0
+        if path is not None:
+            keys = load_keys(path)
+            vectors = np.load(path, mmap_mode="r") if keys is not None and os.path.exists(path) else None
+        if keys is not None and vectors is not None and len(vectors) == len(keys):
+            self.vectors = vectors
+            self._order = np.argsort(keys, kind="stable")
+            self._sorted_keys = np.asarray(keys)[self._order]
+
+    def lookup(self, keys):
+        """Row of each key in the previous build, -1 where it has none."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if self.vectors is None or not len(self._sorted_keys):
+            return rows
+        pos = np.minimum(np.searchsorted(self._sorted_keys, keys), len(self._sorted_keys) - 1)
+        found = self._sorted_keys[pos] == keys
+        rows[found] = self._order[pos[found]]
+        return rows
+
+    def embed(self, encode, texts):
+        """Embeddings and keys of ``texts``, passing only those not seen before to ``encode(list)``."""
+        keys = text_keys(self.model_name, texts)
+        rows = self.lookup(keys)
+        missing = np.flatnonzero(rows < 0)
+        # each new text is encoded once, however often it repeats
+        new_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+        encoded = encode([texts[i] for i in missing[first].tolist()]) if len(new_keys) else None
+
+        dim = encoded.shape[1] if encoded is not None else (self.vectors.shape[1] if self.vectors is not None else 0)
+        vectors = np.empty((len(texts), dim), dtype=np.float32)
+        found = np.flatnonzero(rows >= 0)
+        if len(found):
+            vectors[found] = self.vectors[rows[found]]
+        if encoded is not None:
+            vectors[missing] = np.asarray(encoded, dtype=np.float32)[inverse]
+        self.encoded += len(new_keys)
+        self.reused += len(found)
+        return vectors, keys
+
+
+QUERY_CACHE_DIR = "cache/query_embeddings"
+# query embeddings kept in process, and slots in the on-disk tier
+QUERY_CACHE_SIZE = 1024
+QUERY_DISK_SIZE = 65536
+
+
+def normalize_query(text: str) -> str:
+    # the tokenizers split on whitespace, so runs of it do not change the embedding
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache():
+    """Query embeddings by model and normalized text, kept in an LRU dict and optionally on disk.
+
+    The disk tier, under ``cache_dir/<model>``, is a fixed number of slots:
+    ``vectors.npy`` and ``keys.npy`` memory-mapped read-write, plus
+    ``used.npy`` holding the tick each slot was last read or written (0 when
+    empty). When it is full the least recently used slot is overwritten, so
+    repeated queries skip the model across runs without the cache growing.
+
+    Several processes (the search server and the CLIs) may share a disk
+    tier. Every read and write of it holds an exclusive lock on
+    ``<model>.lock``, ticks continue from the largest in ``used.npy`` so the
+    LRU order is global, and a key missing from the slots this process knows
+    of is looked up in ``keys.npy``, which holds every process's writes. A
+    remembered slot is only trusted while it still holds its key: another
+    process may have reused it since.
+    """
+
+    def __init__(
+        self, model_name: str, size: int = QUERY_CACHE_SIZE, cache_dir: str | None = QUERY_CACHE_DIR, disk_size: int = QUERY_DISK_SIZE,
+    ) -> None:
+        self.model_name = model_name
+        self.size = size
+        self.entries = OrderedDict()
+        self.path = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name)) if cache_dir and disk_size > 0 else None
+        self.disk_size = disk_size
+        self.keys = self.vectors = self.used = None
+        self._slots = {}
+        self._tick = 0
+        self.hits = self.disk_hits = self.misses = 0
+        # lookups and stores are serialized so one cache can serve concurrent requests; encoding is not
+        self._lock = threading.Lock()
+
+    def get(self, text: str, encode):
+        """The embedding of ``text``, calling ``encode(text)`` only when no tier has it."""
+        return self.get_many([text], lambda texts: [encode(texts[0])])[0]
+
+    def get_many(self, texts, encode):
+        """Embeddings of ``texts`` as rows, with one ``encode(list)`` call for the texts no tier has."""
+        texts = [normalize_query(text) for text in texts]
+        vectors = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(text_keys(self.model_name, texts).tolist()):
+                vectors[i] = self._lookup(key)
+                if vectors[i] is None:
+                    missing.setdefault(key, []).append(i)
+        if missing:
+            encoded = np.asarray(encode([texts[positions[0]] for positions in missing.values()]), dtype=np.float32)
+            with self._lock:
+                for (key, positions), vector in zip(missing.items(), encoded):
+                    self.misses += 1
+                    vector = np.array(vector)
+                    self._disk_put(key, vector)
+                    self._remember(key, vector)
+                    for i in positions:
+                        vectors[i] = vector
+        return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def _lookup(self, key):
+        vector = self.entries.get(key)
+        if vector is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return vector
+        vector = self._disk_get(key)
+        if vector is not None:
+            self.disk_hits += 1
+            self._remember(key, vector)
+        return vector
+
+    def _remember(self, key, vector) -> None:
+        # shared by every caller asking for the same query
+        vector.flags.writeable = False
+        self.entries[key] = vector
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def _open_disk(self, dim: int | None = None) -> bool:
+        # map the disk tier, creating it (or replacing one of another width) once the width is known
+        if self.path is None:
+            return False
+        if self.used is None and os.path.exists(os.path.join(self.path, "used.npy")):
+            self.keys = np.load(os.path.join(self.path, "keys.npy"), mmap_mode="r+")
+            self.vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r+")
+            self.used = np.load(os.path.join(self.path, "used.npy"), mmap_mode="r+")
+            filled = np.flatnonzero(self.used)
+            self._slots = dict(zip(self.keys[filled].tolist(), filled.tolist()))
+            self._tick = int(self.used.max(initial=0))
+        if dim is not None and (self.used is None or self.vectors.shape[1] != dim):
+            with self._disk_lock():
+                # another process may have created it while this one waited
+                self.keys = self.vectors = self.used = None
+                self._open_disk()
+                if self.used is None or self.vectors.shape[1] != dim:
+                    tmp_path = f"{self.path}.tmp{os.getpid()}"
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    os.makedirs(tmp_path)
+                    np.lib.format.open_memmap(os.path.join(tmp_path, "keys.npy"), mode="w+", dtype=KEY_DTYPE, shape=(self.disk_size,)).flush()
+                    np.lib.format.open_memmap(os.path.join(tmp_path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(self.disk_size, dim)).flush()
+                    np.lib.format.open_memmap(os.path.join(tmp_path, "used.npy"), mode="w+", dtype=np.int64, shape=(self.disk_size,)).flush()
+                    self.keys = self.vectors = self.used = None
+                    shutil.rmtree(self.path, ignore_errors=True)
+                    os.rename(tmp_path, self.path)
+                    self._open_disk()
+        return self.used is not None
+
+    @contextlib.contextmanager
+    def _disk_lock(self):
+        # held across processes, on a file beside the directory so replacing the directory keeps it
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _next_tick(self) -> int:
+        # the largest tick any process has written, so recency is comparable across processes
+        self._tick = max(self._tick, int(self.used.max(initial=0))) + 1
+        return self._tick
+
+    def _find_slot(self, key):
+        # the remembered slot while it still holds the key, else a scan of the keys
+        # another process may have stored since the tier was opened (call under the lock)
+        slot = self._slots.get(key)
+        if slot is not None and self.keys[slot] == key:
+            return slot
+        self._slots.pop(key, None)
+        found = np.flatnonzero(self.keys == key)
+        if not len(found):
+            return None
+        self._slots[key] = slot = int(found[0])
+        return slot
+
+    def _disk_get(self, key):
+        if not self._open_disk():
+            return None
+        with self._disk_lock():
+            slot = self._find_slot(key)
+            if slot is None:
+                return None
+            self.used[slot] = self._next_tick()
+            return np.array(self.vectors[slot])
+
+    def _disk_put(self, key, vector) -> None:
+        if not self._open_disk(len(vector)):
+            return
+        with self._disk_lock():
+            slot = self._find_slot(key)
+            if slot is None:
+                # empty slots have used == 0, so they fill up before anything is evicted
+                slot = int(np.argmin(self.used))
+                if self.used[slot] and self._slots.get(self.keys[slot]) == slot:
+                    del self._slots[self.keys[slot]]
+            # empty the slot first and write the key last, so an interrupted write
+            # leaves an empty slot rather than a key next to another query's vector
+            self.keys[slot] = b""
+            self.used[slot] = 0
+            self.vectors[slot] = vector
+            self.keys[slot] = key
+            self.used[slot] = self._next_tick()
+            self._slots[key] = slot
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# the model loaded by each worker process
+_model = None
+
+
+def _load_model(model_name: str, threads: int) -> None:
+    # pin torch to its share of the cores before the model is built, so the workers do not oversubscribe them
+    global _model
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(model_name)
+
+
+def _encode(texts):
+    return np.asarray(_model.encode(texts), dtype=np.float32)
+
+
+class EncodingPool():
+    """Worker processes that each hold a copy of a SentenceTransformer model.
+
+    Workers are spawned rather than forked, so a parent that has already
+    started torch threads cannot deadlock them, and each one is limited to
+    ``threads`` torch threads (by default an even share of the cores).
+    """
+
+    def __init__(self, model_name: str, workers: int, threads: int | None = None) -> None:
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_model,
+            initargs=(model_name, self.threads),
+        )
+
+    def map(self, batches):
+        """Embeddings of each batch of texts, encoded concurrently and returned in order."""
+        return self._pool.map(_encode, batches)
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def __enter__(self) -> "EncodingPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,5 +1,6 @@
 import argparse
 import json
+from catalog import MovieCatalog
 from hybrid_search import HybridSearch
 
 
@@ -18,18 +19,15 @@ def main():
     with open("data/golden_dataset.json", "r") as f:
         golden_data = json.load(f)
 
-    with open("data/movies.json", "r") as f:
-        data = json.load(f)
-    documents = data["movies"]
+    documents = MovieCatalog.open()
 
 
 
-    # run evaluation logic here
-    for case in golden_data["test_cases"]:
-        search = HybridSearch(documents=documents)
-        results = search.rrf_search(query = case["query"], k=60, limit=args.limit)
-        # breakpoint()
-
+    # run evaluation logic here: every golden query is searched in one batch
+    search = HybridSearch(documents=documents)
+    cases = golden_data["test_cases"]
+    all_results = search.rrf_search_batch([case["query"] for case in cases], k=60, limit=args.limit)
+    for case, results in zip(cases, all_results):
         results = results[:args.limit]
 
         retrieved_movies = [result["title"] for result in results]
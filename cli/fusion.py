@@ -0,0 +1,132 @@
+import numpy as np
+
+NORMALIZATIONS = ("minmax", "zscore")
+# first candidate depth of an adaptive fusion (at least twice the results wanted), and its growth per round
+MIN_DEPTH = 64
+DEPTH_GROWTH = 4
+
+
+def minmax(scores):
+    """Scale ``scores`` to [0, 1]; all equal scores become 1.0."""
+    scores = np.asarray(scores)
+    if not len(scores):
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones(len(scores))
+    return (scores - low) / (high - low)
+
+
+def zscore(scores):
+    """Standardize ``scores`` to mean 0 and standard deviation 1; all equal scores become 0.0."""
+    scores = np.asarray(scores)
+    if not len(scores):
+        return scores
+    std = scores.std()
+    if std == 0:
+        return np.zeros(len(scores))
+    return (scores - scores.mean()) / std
+
+
+def normalize(scores, method: str = "minmax"):
+    if method not in NORMALIZATIONS:
+        raise ValueError(f"Unknown normalization {method!r}; expected one of {', '.join(NORMALIZATIONS)}")
+    return minmax(scores) if method == "minmax" else zscore(scores)
+
+
+def _top(ids, scores, top_k: int):
+    # highest score first, lower id first on ties
+    order = np.lexsort((ids, -scores))[:top_k]
+    return ids[order], scores[order], order
+
+
+def _candidates(legs):
+    """Every id the legs returned, ascending, and its rank in each leg (-1 where a leg did not return it)."""
+    legs = [np.asarray(leg_ids, dtype=np.int64) for leg_ids in legs]
+    size = max((int(leg_ids.max()) + 1 for leg_ids in legs if len(leg_ids)), default=0)
+    if size <= 16 * sum(len(leg_ids) for leg_ids in legs):
+        # small ids (catalog ids): one slot per possible id
+        table = np.full((len(legs), size), -1, dtype=np.int64)
+        for leg, leg_ids in enumerate(legs):
+            table[leg, leg_ids] = np.arange(len(leg_ids))
+        ids = np.flatnonzero((table >= 0).any(axis=0))
+        return ids, table[:, ids]
+    ids = np.unique(np.concatenate(legs))
+    ranks = np.full((len(legs), len(ids)), -1, dtype=np.int64)
+    for leg, leg_ids in enumerate(legs):
+        ranks[leg, np.searchsorted(ids, leg_ids)] = np.arange(len(leg_ids))
+    return ids, ranks
+
+
+def fuse_weighted(legs, weights, top_k: int, method: str = "minmax"):
+    """Weighted sum of each leg's normalized scores over the union of their candidates.
+
+    ``legs`` is a list of ``(ids, scores)`` arrays and ``weights`` one weight
+    per leg. A candidate a leg did not return gets 0 from it under min-max
+    (its lowest possible score) and the leg's lowest z-score under
+    ``zscore``. Returns the ``top_k`` ids, their fused scores and a
+    ``(len(legs), top_k)`` array of their normalized score per leg.
+    """
+    ids, ranks = _candidates([leg_ids for leg_ids, _ in legs])
+    per_leg = np.zeros((len(legs), len(ids)))
+    for leg, (_, scores) in enumerate(legs):
+        normalized = normalize(scores, method)
+        missing = 0.0 if method == "minmax" or not len(normalized) else normalized.min()
+        found = ranks[leg] >= 0
+        per_leg[leg] = missing
+        per_leg[leg, found] = normalized[ranks[leg, found]]
+    fused = np.asarray(weights, dtype=np.float64) @ per_leg
+    top_ids, top_scores, order = _top(ids, fused, top_k)
+    return top_ids, top_scores, per_leg[:, order]
+
+
+def fuse_rrf(legs, k: int, top_k: int, complete=None):
+    """Reciprocal rank fusion of ranked id arrays: score ``sum(1 / (k + rank))`` over the legs, rank from 0.
+
+    Returns the ``top_k`` ids, their scores, their ``(len(legs), top_k)``
+    ranks (-1 where a leg did not return the id), and whether that top
+    ``top_k`` is certain. Every leg is taken to be complete unless
+    ``complete`` says otherwise: an incomplete leg is only the start of a
+    longer ranking, so a candidate it lacks may still rank just below its
+    last id there. The result is certain when every id kept is ranked by all
+    incomplete legs and no id, seen or not, could still reach its score.
+    """
+    complete = [True] * len(legs) if complete is None else complete
+    ids, ranks = _candidates(legs)
+    contributions = np.divide(1.0, k + ranks, out=np.zeros(ranks.shape), where=ranks >= 0)
+    scores = contributions[0].copy()
+    for leg in range(1, len(legs)):
+        scores += contributions[leg]
+
+    # the most an id could gain from each incomplete leg that has not ranked it
+    unseen_bound = np.array([0.0 if leg_complete else 1.0 / (k + len(leg_ids)) for leg_ids, leg_complete in zip(legs, complete)])
+    gain = (unseen_bound[:, None] * (ranks < 0)).sum(axis=0)
+    exact = gain == 0
+    top_ids, top_scores, order = _top(ids[exact], scores[exact], top_k)
+    if len(top_ids) < top_k:
+        certain = bool(exact.all()) and unseen_bound.sum() == 0
+    else:
+        cutoff = top_scores[-1]
+        certain = bool(np.all(scores[~exact] + gain[~exact] < cutoff)) and unseen_bound.sum() < cutoff
+    return top_ids, top_scores, ranks[:, exact][:, order], certain
+
+
+def adaptive_rrf(fetch, k: int, top_k: int, max_depth: int, start_depth: int | None = None):
+    """``fuse_rrf`` of the legs ranked to ``max_depth``, fetching only as deep as the top ``top_k`` needs.
+
+    ``fetch(depth)`` returns every leg's ranking to at least ``depth`` ids
+    (fewer only where the ranking ends, more is fine), each a prefix of the
+    ranking it would give at any greater depth. Depth starts at
+    ``start_depth`` and grows ``DEPTH_GROWTH``-fold until ``fuse_rrf`` is
+    certain or reaches ``max_depth``, so the result is the one the
+    full-depth fusion gives.
+    Returns the ``fuse_rrf`` arrays and the depth used.
+    """
+    depth = min(max_depth, start_depth or max(2 * top_k, MIN_DEPTH))
+    while True:
+        legs = [np.asarray(leg_ids)[:max_depth] for leg_ids in fetch(depth)]
+        complete = [len(leg_ids) < depth or len(leg_ids) >= max_depth for leg_ids in legs]
+        top_ids, top_scores, ranks, certain = fuse_rrf(legs, k, top_k, complete)
+        if certain or depth >= max_depth:
+            return top_ids, top_scores, ranks, depth
+        depth = min(DEPTH_GROWTH * depth, max_depth)
@@ -1,56 +1,164 @@
 
-import json
 import string
+import time
 from nltk.stem import PorterStemmer
 import os
 import pickle
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable
+from functools import lru_cache
 import math
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from bm25_engine import BM25Engine
+from bm25_engine import CorpusStats
+from boolean_query import Or, Term, parse_boolean_query
+from catalog import MOVIES_PATH, MovieCatalog, iter_batches, iter_movies
+from index_store import (
+    BASE_SEGMENT,
+    INDEX_DIR,
+    LiveDocumentMap,
+    Segment,
+    index_exists,
+    load_segments,
+    save_index,
+    save_segment_names,
+    save_tombstones,
+    segment_path,
+)
 
 BM25_K1 = 1.5
 BM25_B = 0.75
+# add_documents compacts the index once it has more delta segments than this
+MAX_SEGMENTS = 8
+# movies tokenized per build shard; also bounds how much of the catalog is in flight
+BUILD_BATCH_SIZE = 5000
+# bm25_search with a proximity boost reranks this many times `limit` BM25 candidates
+PROXIMITY_DEPTH = 10
 
-def search(index, args, movies, stop_words):
+def search(index, args, stop_words):
     
     # Normalize query to get tokens
-    query_tokens = normalize_text(args.query, stop_words=stop_words)
+    query_tokens = get_tokenizer(stop_words).tokenize(args.query)
     
-    # Collect matching document IDs
-    matching_docs = set()
-    for token in query_tokens:
-        doc_ids = index.get_documents(token)
-        matching_docs.update(doc_ids)
-    
-    # Print results (up to 5)
-    for doc_id in sorted(matching_docs)[:5]:
+    # Lowest 5 doc ids matching any query token
+    for doc_id in index.match(Or([Term(token) for token in query_tokens]), limit=5):
         movie = index.docmap[doc_id]
         print(f"{movie['id']}. {movie['title']}")
 
 
-def load_movies(file_path: str) -> dict:
-    with open(file_path, "r") as f:
-        data = json.load(f)
-    return data["movies"]
+def boolean_search_command(index, query: str, limit: int, stop_words: Iterable[str] | None = None) -> None:
+    try:
+        doc_ids = index.boolean_search(query, limit, stop_words=stop_words)
+    except ValueError as e:
+        print(f"Invalid query: {e}")
+        return
+    for doc_id in doc_ids:
+        movie = index.docmap[doc_id]
+        print(f"{movie['id']}. {movie['title']}")
+
+
+def load_movies(file_path: str) -> list[dict]:
+    return list(iter_movies(file_path))
+
+
+class Tokenizer():
+    """Lowercase, strip punctuation, drop stop words and Porter-stem text.
 
+    Built once and reused: the punctuation table is compiled at import, stop
+    words are a frozenset and stems are memoized in a bounded LRU cache, since
+    movie descriptions repeat the same few thousand words over and over.
+    """
 
-def normalize_text(text: str, stop_words: list[str] | None = None) -> list[str]:
-    stemmer = PorterStemmer()
+    _punctuation_table = str.maketrans("", "", string.punctuation)
 
-    text = text.lower()
-    text = text.translate(str.maketrans("","",string.punctuation))
-    text = text.split()
-    if stop_words is not None:
-        text = [word for word in text if word not in stop_words]
-    text = [stemmer.stem(word) for word in text]
-    return text
+    def __init__(self, stop_words: Iterable[str] | None = None, stem_cache_size: int = 65536) -> None:
+        self.stop_words = frozenset(stop_words) if stop_words is not None else frozenset()
+        self._stemmer = PorterStemmer()
+        self.stem = lru_cache(maxsize=stem_cache_size)(self._stemmer.stem)
 
+    def tokenize(self, text: str) -> list[str]:
+        stem = self.stem
+        stop_words = self.stop_words
+        words = text.lower().translate(self._punctuation_table).split()
+        return [stem(word) for word in words if word not in stop_words]
 
-def load_stop_words(file_path: str) -> list[str]:
+    def tokenize_many(self, texts: Iterable[str]) -> list[list[str]]:
+        return [self.tokenize(text) for text in texts]
+
+
+_tokenizers = {}
+
+def get_tokenizer(stop_words: Iterable[str] | None = None) -> Tokenizer:
+    # one shared tokenizer (and stem cache) per stop word set
+    key = frozenset(stop_words) if stop_words is not None else frozenset()
+    tokenizer = _tokenizers.get(key)
+    if tokenizer is None:
+        tokenizer = _tokenizers[key] = Tokenizer(key)
+    return tokenizer
+
+
+def normalize_text(text: str, stop_words: Iterable[str] | None = None) -> list[str]:
+    return get_tokenizer(stop_words).tokenize(text)
+
+
+def load_stop_words(file_path: str) -> frozenset[str]:
     with open(file_path, "r") as f:
-        stop_words = [f.strip() for f in f.readlines()]
+        stop_words = frozenset(line.strip() for line in f)
     return stop_words
 
 
+def _bounded_map(pool, fn, batches, *args, window: int):
+    # like pool.map, but only keeps `window` batches in flight instead of submitting them all up front
+    pending = deque()
+    for batch in batches:
+        pending.append(pool.submit(fn, *batch, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def index_shard(doc_ids: list[int], texts: list[str], stop_words: Iterable[str] | None = None, with_positions: bool = False):
+    """Tokenize one shard of the catalog into flat posting arrays.
+
+    Runs in the build worker processes; the term ids index the returned shard
+    vocabulary and are remapped when BM25Engine.from_shards merges the shards.
+    With ``with_positions`` the token positions of every posting are kept too.
+    """
+    vocab = {}
+    term_ids = []
+    posting_docs = []
+    tfs = []
+    lengths = []
+    positions = [] if with_positions else None
+    for doc_id, tokens in zip(doc_ids, get_tokenizer(stop_words).tokenize_many(texts)):
+        if with_positions:
+            # keyed in first-occurrence order, like Counter
+            token_positions = {}
+            for position, token in enumerate(tokens):
+                token_positions.setdefault(token, []).append(position)
+            counts = {token: len(found) for token, found in token_positions.items()}
+            for found in token_positions.values():
+                positions.extend(found)
+        else:
+            counts = Counter(tokens)
+        term_ids.extend(vocab.setdefault(token, len(vocab)) for token in counts)
+        posting_docs.extend(repeat(doc_id, len(counts)))
+        tfs.extend(counts.values())
+        lengths.append(len(tokens))
+    return (
+        list(vocab),
+        np.array(term_ids, dtype=np.int64),
+        np.array(posting_docs, dtype=np.int64),
+        np.array(tfs, dtype=np.int32),
+        np.array(doc_ids, dtype=np.int64),
+        np.array(lengths, dtype=np.int64),
+        np.array(positions, dtype=np.int64) if with_positions else None,
+    )
+
+
 class InvertedIndex():
     def __init__(self) -> None:
         self.index = {}
@@ -58,38 +166,69 @@ class InvertedIndex():
         self.term_frequencies = defaultdict(Counter)
         self.doc_lengths = {}
         self.doc_lengths_path =  "cache/doc_lengths.pkl"
-
-    def __add_document(self, doc_id, text, stop_words=None):
-        tokens = normalize_text(text, stop_words=stop_words)
-        for token in tokens:
-            if token not in self.index:
-                self.index[token] = set()
-            self.index[token].add(doc_id)
-            self.term_frequencies[doc_id][token] += 1
-        self.doc_lengths[doc_id] = len(tokens)
+        # base engine first, then delta segments from add_documents, oldest first
+        self._segments = None
+        # where updates are written through to, set by load() and save()
+        self.path = None
+        # loaded from the legacy pickle cache, which updates cannot be written to
+        self.legacy = False
 
     def get_documents(self, token: str):
-        value = self.index.get(token, set())
-        return sorted(value)
+        doc_ids = []
+        for segment in self.get_segments():
+            engine = segment.engine
+            term_id = engine.term_id(token)
+            if term_id >= 0:
+                doc_ids.append(engine.doc_ids[engine.live_rows(engine.postings(term_id)[0])])
+        if not doc_ids:
+            return []
+        if len(doc_ids) == 1:
+            return doc_ids[0].tolist()
+        return np.sort(np.concatenate(doc_ids)).tolist()
     
+    def match(self, node, limit: int) -> list[int]:
+        """Lowest `limit` live doc ids matching a boolean_query node."""
+        doc_ids = [segment.engine.doc_ids[node.first(segment.engine, limit)] for segment in self.get_segments()]
+        if len(doc_ids) == 1:
+            return doc_ids[0].tolist()
+        # live doc ids are unique across segments
+        return np.sort(np.concatenate(doc_ids))[:limit].tolist()
+
+    def boolean_search(self, query: str, limit: int = 5, stop_words: Iterable[str] | None = None) -> list[int]:
+        node = parse_boolean_query(query, get_tokenizer(stop_words))
+        if node is None:
+            return []
+        return self.match(node, limit)
+
+    def __normalize_terms(self, terms):
+        # first token of each term, or None when nothing survives normalization
+        return [tokens[0] if tokens else None for tokens in get_tokenizer().tokenize_many(terms)]
+
+    def __live_segment(self, doc_id: int) -> Segment | None:
+        for segment in reversed(self.get_segments()):
+            if segment.engine.live_row(doc_id) >= 0:
+                return segment
+        return None
+
     def get_tf(self, doc_id: int, term: str):
         # Normalize the term first
-        normalized_term = normalize_text(term)
-        if not normalized_term:
+        normalized_term = self.__normalize_terms([term])[0]
+        if normalized_term is None:
             return 0
-        normalized_term = normalized_term[0]
-        
-        if doc_id not in self.term_frequencies:
+        segment = self.__live_segment(doc_id)
+        if segment is None:
             return 0
-        return self.term_frequencies[doc_id].get(normalized_term, 0)
+        return segment.engine.tf(doc_id, normalized_term)
+
+    def get_doc_freq(self, term: str) -> int:
+        return sum(segment.engine.live_doc_freq(term) for segment in self.get_segments())
     
     def get_idf(self, term: str) -> float:
-        normalized_term = normalize_text(term)
-        if not normalized_term:
+        normalized_term = self.__normalize_terms([term])[0]
+        if normalized_term is None:
             return 0.0
-        normalized_term = normalized_term[0]
         total_docs = len(self.docmap)
-        docs_with_term = len(self.index.get(normalized_term, []))
+        docs_with_term = self.get_doc_freq(normalized_term)
 
         return math.log((total_docs + 1) / (docs_with_term + 1))
     
@@ -99,20 +238,21 @@ class InvertedIndex():
         return tf * idf
     
     def get_bm25_idf(self, term: str) -> float:
-        normalized_term = normalize_text(term)
-        if not normalized_term:
+        normalized_term = self.__normalize_terms([term])[0]
+        if normalized_term is None:
             return 0.0
-        normalized_term = normalized_term[0]
         total_docs = len(self.docmap)
-        docs_with_term = len(self.index.get(normalized_term, []))
+        docs_with_term = self.get_doc_freq(normalized_term)
         # IDF = log((N - df + 0.5) / (df + 0.5) + 1)
         bm25 = math.log((total_docs - docs_with_term + 0.5) / (docs_with_term + 0.5) + 1)
         return bm25
     
     def get_bm25_tf(self, doc_id, term, k1=BM25_K1, b=BM25_B):
         tf = self.get_tf(doc_id, term)
-        doc_length = self.doc_lengths.get(doc_id, 0)
-        avg_doc_length = self.__get_avg_doc_length()
+        segment = self.__live_segment(doc_id)
+        doc_length = segment.engine.doc_length(doc_id) if segment is not None else 0
+        # every segment shares the corpus average
+        avg_doc_length = self.get_segments()[0].engine.avg_doc_length
         length_norm = 1 - b + b * (doc_length / avg_doc_length)
         tf_component = (tf * (k1 + 1)) / (tf + k1*length_norm)
         return tf_component
@@ -122,49 +262,245 @@ class InvertedIndex():
         tf_component = self.get_bm25_tf(doc_id, term)
         return idf * tf_component
     
-    def bm25_search(self, query, limit, stop_words=None):
-        query_tokens = normalize_text(query, stop_words=stop_words)
-        scores = {}
-        for token in query_tokens:
-            for doc_id in self.get_documents(token):
-                if doc_id not in scores:
-                    scores[doc_id] = 0
-                scores[doc_id] += self.bm25(doc_id, token)
-        ranked_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        # return the top limit documents along with their scores
-        return ranked_docs[:limit]
-    
-    def __get_avg_doc_length(self) -> float:
-        if not self.doc_lengths:
-            return 0
-        return sum(self.doc_lengths.values()) / len(self.doc_lengths)
-        
+    def bm25_search(self, query, limit, stop_words=None, prune=True, proximity=0.0):
+        if proximity:
+            return self.__proximity_search(query, limit, stop_words, prune, proximity)
+        query_tokens = get_tokenizer(stop_words).tokenize(query)
+        # bm25() re-normalizes each token before looking up tf and idf, so score with that term
+        normalized_terms = self.__normalize_terms(query_tokens)
+        query_terms = [(token, term or "") for token, term in zip(query_tokens, normalized_terms)]
+        per_segment = []
+        for segment in self.get_segments():
+            engine = segment.engine
+            # MaxScore pruning returns the same ranking as scoring every matching document
+            if prune:
+                per_segment.append(engine.top_k(query_terms, limit))
+            else:
+                per_segment.append(engine.search(query_terms, limit))
+        if len(per_segment) == 1:
+            return per_segment[0]
+        return self.__merge_results(query_terms, per_segment, limit)
 
-    def build(self, file_path: str = "data/movies.json", stop_words: list[str] | None = None):
-        movies = load_movies(file_path)
-        for movie in movies:
-            doc_id = movie["id"]
-            self.docmap[doc_id] = movie
-            text = f"{movie['title']} {movie['description']}"
-            self.__add_document(doc_id, text, stop_words=stop_words)
+    def bm25_search_batch(self, queries, limit, stop_words=None, prune=True):
+        """``bm25_search`` for many queries, scored together; returns one result list per query."""
+        tokenizer = get_tokenizer(stop_words)
+        batch = []
+        for query in queries:
+            query_tokens = tokenizer.tokenize(query)
+            normalized_terms = self.__normalize_terms(query_tokens)
+            batch.append([(token, term or "") for token, term in zip(query_tokens, normalized_terms)])
+        segments = self.get_segments()
+        per_segment = [segment.engine.search_batch(batch, limit, prune=prune) for segment in segments]
+        if len(segments) == 1:
+            return per_segment[0]
+        return [self.__merge_results(query_terms, query_results, limit) for query_terms, query_results in zip(batch, zip(*per_segment))]
 
+    def __merge_results(self, query_terms, per_segment, limit):
+        """The top ``limit`` of every segment's own top ``limit``, ranked as one rebuilt index would.
 
-    def save(self):
-        os.makedirs("cache", exist_ok=True)
-        
-        with open("cache/index.pkl", "wb") as f:
-            pickle.dump(self.index, f)
+        A single engine breaks score ties by the first query term a document
+        contains, then by doc id (see ``BM25Engine._rank_candidates``); each
+        segment already ranks its results that way, so the merge only needs
+        the first term of the documents it got.
+        """
+        first_term = {}
+        for segment, results in zip(self.get_segments(), per_segment):
+            engine = segment.engine
+            rows = np.sort(np.array([engine.row_of(doc_id) for doc_id, _ in results], dtype=np.int64))
+            terms = np.full(len(rows), len(query_terms), dtype=np.int64)
+            for i, (token, _) in reversed(list(enumerate(query_terms))):
+                terms[engine.contains(engine.term_id(token), rows)] = i
+            first_term.update(zip(engine.doc_ids[rows].tolist(), terms.tolist()))
+        results = [result for results in per_segment for result in results]
+        return sorted(results, key=lambda x: (-x[1], first_term[x[0]], x[0]))[:limit]
+
+    def __proximity_search(self, query, limit, stop_words, prune, weight):
+        # rerank a deeper BM25 candidate list by how close together the query terms occur
+        candidates = self.bm25_search(query, limit * PROXIMITY_DEPTH, stop_words=stop_words, prune=prune)
+        query_tokens = get_tokenizer(stop_words).tokenize(query)
+        boosts = {}
+        for segment in self.get_segments():
+            engine = segment.engine
+            rows = np.array([engine.live_row(doc_id) for doc_id, _ in candidates], dtype=np.int64)
+            found = np.flatnonzero(rows >= 0)
+            order = found[np.argsort(rows[found])]
+            for i, boost in zip(order.tolist(), engine.proximity(query_tokens, rows[order]).tolist()):
+                boosts[candidates[i][0]] = boost
+        rescored = [(doc_id, score + weight * boosts.get(doc_id, 0.0)) for doc_id, score in candidates]
+        return sorted(rescored, key=lambda x: x[1], reverse=True)[:limit]
+
+    def get_segments(self) -> list[Segment]:
+        if self._segments is None:
+            engine = BM25Engine.from_index(
+                self.index,
+                self.term_frequencies,
+                self.doc_lengths,
+                n_docs=len(self.docmap),
+                k1=BM25_K1,
+                b=BM25_B,
+            )
+            self._segments = [Segment(BASE_SEGMENT, engine, self.docmap)]
+        return self._segments
+
+    def __refresh(self) -> None:
+        # Recompute N, avgdl and df over the live documents of every segment. A
+        # lone segment without deletes keeps its own precomputed statistics.
+        segments = self.get_segments()
+        for segment in segments:
+            segment.engine.deleted = segment.deleted if segment.deleted.any() else None
+        if len(segments) == 1 and segments[0].engine.deleted is None:
+            segments[0].engine.attach(None)
+            self.docmap = segments[0].docmap
+            return
+        stats = CorpusStats([segment.engine for segment in segments])
+        for segment in segments:
+            segment.engine.attach(stats)
+        self.docmap = LiveDocumentMap(segments)
+
+    def __check_writable(self) -> None:
+        if self.legacy:
+            raise ValueError("The keyword index is the legacy pickle cache, which cannot be updated; run `convert` first")
+
+    def __tombstone(self, doc_ids) -> list[Segment]:
+        touched = []
+        for segment in self.get_segments():
+            engine = segment.engine
+            rows = np.searchsorted(engine.doc_ids, doc_ids)
+            found = rows < len(engine.doc_ids)
+            found[found] = engine.doc_ids[rows[found]] == doc_ids[found]
+            rows = rows[found]
+            rows = rows[~segment.deleted[rows]]
+            if len(rows):
+                segment.deleted[rows] = True
+                touched.append(segment)
+        return touched
+
+    def add_documents(self, movies, stop_words: Iterable[str] | None = None) -> Segment | None:
+        """Index new or changed movies into a fresh delta segment.
+
+        Older copies of the same doc ids are tombstoned, so this is an upsert.
+        """
+        self.__check_writable()
+        docmap = {movie["id"]: movie for movie in movies}
+        if not docmap:
+            return None
+        segments = self.get_segments()
+        touched = self.__tombstone(np.array(list(docmap), dtype=np.int64))
 
-        with open("cache/docmap.pkl", "wb") as f:
-            pickle.dump(self.docmap, f)
+        movies = list(docmap.values())
+        shard = index_shard(
+            [movie["id"] for movie in movies],
+            [f"{movie['title']} {movie['description']}" for movie in movies],
+            stop_words,
+            # delta segments follow the base segment's choice
+            segments[0].engine.positions is not None,
+        )
+        engine = BM25Engine.from_shards([shard], n_docs=len(docmap), k1=BM25_K1, b=BM25_B)
+        if segments[0].engine.block_postings is not None:
+            engine = engine.compress(segments[0].engine.block_postings.block_size)
+        numbers = [int(segment.name.split("-")[1]) for segment in segments[1:]]
+        segment = Segment(f"seg-{max(numbers, default=0) + 1:06d}", engine, docmap)
+        segments.append(segment)
+        self.__refresh()
 
-        with open("cache/term_frequencies.pkl", "wb") as f:
-            pickle.dump(self.term_frequencies, f)
+        if self.path is not None:
+            # list the new segment before tombstoning the copies it replaces: a crash
+            # in between leaves a document twice rather than not at all
+            save_index(engine, docmap, segment_path(self.path, segment.name))
+            save_segment_names([s.name for s in segments[1:]], self.path)
+            for old_segment in touched:
+                save_tombstones(segment_path(self.path, old_segment.name), old_segment.deleted)
+
+        if len(segments) - 1 > MAX_SEGMENTS:
+            self.merge()
+        return segment
+
+    def delete_documents(self, doc_ids) -> int:
+        self.__check_writable()
+        doc_ids = np.array(list(doc_ids), dtype=np.int64)
+        before = len(self.docmap)
+        touched = self.__tombstone(doc_ids)
+        self.__refresh()
+        if self.path is not None:
+            for segment in touched:
+                save_tombstones(segment_path(self.path, segment.name), segment.deleted)
+        return before - len(self.docmap)
+
+    def merge(self) -> None:
+        """Compact all segments into a single base segment without tombstones."""
+        self.__check_writable()
+        segments = self.get_segments()
+        shards = [segment.engine.live_shard() for segment in segments]
+        docmap = {}
+        for segment in segments:
+            for doc_id in segment.engine.doc_ids[~segment.deleted].tolist():
+                docmap[doc_id] = segment.docmap[doc_id]
+        engine = BM25Engine.from_shards(shards, n_docs=len(docmap), k1=BM25_K1, b=BM25_B)
+        if segments[0].engine.block_postings is not None:
+            engine = engine.compress(segments[0].engine.block_postings.block_size)
+        self._segments = [Segment(BASE_SEGMENT, engine, docmap)]
+        self.__refresh()
+        if self.path is not None:
+            # rewrites the whole directory, dropping the delta segments and tombstones
+            save_index(engine, docmap, self.path)
+
+    def build(
+        self,
+        file_path: str = MOVIES_PATH,
+        stop_words: Iterable[str] | None = None,
+        workers: int = 1,
+        positions: bool = False,
+        compress: bool = False,
+    ):
+        # Postings go straight into the engine's CSR arrays; the index,
+        # term_frequencies and doc_lengths dicts are only filled by load_pickles.
+        # Movies stream from the on-disk catalog in batches and the docmap is
+        # memory-mapped, so only the postings grow with the size of the catalog.
+        catalog = MovieCatalog.open(file_path)
+        self.docmap = catalog.document_map
+        batches = (
+            ([movie["id"] for movie in batch], [f"{movie['title']} {movie['description']}" for movie in batch])
+            for batch in iter_batches(catalog, BUILD_BATCH_SIZE)
+        )
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                shards = list(_bounded_map(pool, index_shard, batches, stop_words, positions, window=workers * 2))
+        else:
+            shards = [index_shard(doc_ids, texts, stop_words, positions) for doc_ids, texts in batches]
+
+        engine = BM25Engine.from_shards(shards, n_docs=len(self.docmap), k1=BM25_K1, b=BM25_B)
+        if compress:
+            engine = engine.compress()
+        self._segments = [Segment(BASE_SEGMENT, engine, self.docmap)]
+
+    def save(self, path: str = INDEX_DIR):
+        os.makedirs("cache", exist_ok=True)
+        segments = self.get_segments()
+        if len(segments) > 1 or segments[0].deleted.any():
+            self.merge()
+        save_index(self.get_segments()[0].engine, self.docmap, path)
+        self.path = path
+        self.legacy = False
 
-        with open(self.doc_lengths_path, "wb") as f:
-            pickle.dump(self.doc_lengths, f)
+    def load(self, path: str = INDEX_DIR):
+        # The binary index is memory-mapped; the build-time dicts (index,
+        # term_frequencies, doc_lengths) stay empty and lookups use the engine.
+        if not index_exists(path) and os.path.exists("cache/index.pkl"):
+            print("Loading legacy pickle cache; run `convert` to switch to the binary index")
+            self.load_pickles()
+            return
+        self._segments = load_segments(BM25_K1, BM25_B, path)
+        self.path = path
+        self.legacy = False
+        self.index = {}
+        self.term_frequencies = defaultdict(Counter)
+        self.doc_lengths = {}
+        self.__refresh()
 
-    def load(self):
+    def load_pickles(self):
+        self._segments = None
+        self.path = None
+        self.legacy = True
         with open("cache/index.pkl", "rb") as f:
             self.index = pickle.load(f)
         
@@ -177,9 +513,68 @@ class InvertedIndex():
         with open(self.doc_lengths_path, "rb") as f:
             self.doc_lengths = pickle.load(f)
 
+    @staticmethod
+    def exists(path: str = INDEX_DIR) -> bool:
+        return index_exists(path) or os.path.exists("cache/index.pkl")
+
 
-def build_command(stop_words: list[str] | None = None) -> None:
+def build_command(
+    stop_words: Iterable[str] | None = None, workers: int = 1, positions: bool = False, compress: bool = False
+) -> None:
     index = InvertedIndex()
-    index.build(stop_words=stop_words)
+    start = time.perf_counter()
+    index.build(stop_words=stop_words, workers=workers, positions=positions, compress=compress)
+    elapsed = time.perf_counter() - start
     index.save()
+    n_docs = len(index.docmap)
+    print(f"Indexed {n_docs} documents in {elapsed:.2f}s ({n_docs / elapsed:.0f} docs/s, {workers} worker{'s' if workers != 1 else ''})")
+
+
+def convert_command(path: str = INDEX_DIR) -> None:
+    index = InvertedIndex()
+    index.load_pickles()
+    index.save(path)
+    print(f"Converted pickle cache to {path} ({len(index.docmap)} documents, {len(index.index)} terms)")
+
 
+def add_command(file_path: str, stop_words: Iterable[str] | None = None) -> None:
+    index = InvertedIndex()
+    index.load()
+    start = time.perf_counter()
+    try:
+        segment = index.add_documents(iter_movies(file_path), stop_words=stop_words)
+    except ValueError as e:
+        print(f"Cannot add documents: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    if segment is None:
+        print(f"No documents found in {file_path}")
+        return
+    print(f"Indexed {len(segment.docmap)} documents into segment {segment.name} in {elapsed * 1000:.1f}ms")
+
+
+def delete_command(doc_ids: list[int]) -> None:
+    index = InvertedIndex()
+    index.load()
+    start = time.perf_counter()
+    try:
+        deleted = index.delete_documents(doc_ids)
+    except ValueError as e:
+        print(f"Cannot delete documents: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    print(f"Deleted {deleted} of {len(doc_ids)} documents in {elapsed * 1000:.1f}ms")
+
+
+def merge_command() -> None:
+    index = InvertedIndex()
+    index.load()
+    n_segments = len(index.get_segments())
+    start = time.perf_counter()
+    try:
+        index.merge()
+    except ValueError as e:
+        print(f"Cannot merge segments: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    print(f"Merged {n_segments} segments into one ({len(index.docmap)} documents) in {elapsed:.2f}s")
@@ -1,101 +1,155 @@
 import os
 import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from catalog import MovieCatalog
+from fusion import DEPTH_GROWTH, MIN_DEPTH, adaptive_rrf, fuse_rrf, fuse_weighted, minmax
 from helpers import InvertedIndex
+from inference import load_cross_encoder
 from semantic_search import ChunkedSemanticSearch
-from dotenv import load_dotenv
-from google import genai
 from time import sleep
-from sentence_transformers import CrossEncoder
+
+
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-TinyBERT-L2-v2"
+
+# runs the semantic leg of concurrent hybrid searches while the calling thread runs BM25;
+# shared by every HybridSearch, so the search server does not start threads per request
+_LEG_POOL = ThreadPoolExecutor(thread_name_prefix="hybrid-leg")
 
 
 class HybridSearch:
-    def __init__(self, documents):
+    def __init__(self, documents, nprobe=None, backend="torch", threads=None, index=None, semantic_search=None, concurrent=True):
         self.documents = documents
-        self.semantic_search = ChunkedSemanticSearch()
-        self.semantic_search.load_or_create_embeddings(documents)
-
-        self.idx = InvertedIndex()
-        if not os.path.exists("cache/index.pkl"):
-            self.idx.build()
-            self.idx.save()
+        # run the BM25 and semantic legs of a query at the same time; encoding and
+        # numpy scoring release the GIL, so the two overlap
+        self.concurrent = concurrent
+        # seconds spent in each stage of the last search, see print_timings
+        self.timings = {}
+        # BM25 candidates fetched by the last RRF search, and the full depth it stands in for
+        self.depth = None
+        # search the chunk embeddings through the IVF index when set
+        self.nprobe = nprobe
+        # inference backend and torch threads for the query encoder and the cross-encoder
+        self.backend = backend
+        self.threads = threads
+        # an already loaded keyword index and chunk search can be shared, as the search server does
+        self._semantic_search = semantic_search
+        self._cross_encoder = None
+
+        self.idx = index
+        if self.idx is None:
+            self.idx = InvertedIndex()
+            if InvertedIndex.exists():
+                self.idx.load()
+            else:
+                self.idx.build()
+                self.idx.save()
+
+    @property
+    def semantic_search(self) -> ChunkedSemanticSearch:
+        # the chunk embeddings are loaded on first semantic query, the model on first encode
+        if self._semantic_search is None:
+            self._semantic_search = ChunkedSemanticSearch(backend=self.backend, threads=self.threads)
+            self._semantic_search.load_or_create_embeddings(self.documents)
+        return self._semantic_search
+
+    @property
+    def cross_encoder(self):
+        if self._cross_encoder is None:
+            self._cross_encoder = load_cross_encoder(CROSS_ENCODER_MODEL, self.backend, self.threads)
+        return self._cross_encoder
 
     def _bm25_search(self, query, limit):
-        self.idx.load()
         return self.idx.bm25_search(query, limit)
 
-    def weighted_search(self, query, alpha, limit=5):
-        bm25 = self._bm25_search(query, limit*500)
-        semantic_results = self.semantic_search.search_chunks(query, limit*500)
-
-        # Combine results using weighted approach
-        #  normalize the keyword and semantic scores using normalize_scores function
-        bm25_scores = [score for _, score in bm25]
-        semantic_scores = [result["score"] for result in semantic_results]
-        normalized_bm25 = normalize_scores(*bm25_scores)
-        normalized_semantic = normalize_scores(*semantic_scores)
-
-        # Create a mapping of doc_id to normalized scores
-        bm25_map = {doc_id: normalized_bm25[i] for i, (doc_id, bm25_score) in enumerate(bm25)}
-        semantic_map = {result["id"]: normalized_semantic[i] for i, result in enumerate(semantic_results)}
-
-        # Get all unique doc_ids from both searches
-        all_doc_ids = set(bm25_map.keys()) | set(semantic_map.keys())
-        
-        combined_scores = {}
-        for doc_id in all_doc_ids:
-            bm25_norm = bm25_map.get(doc_id, 0)
-            semantic_norm = semantic_map.get(doc_id, 0)
-            combined_scores[doc_id] = {
-                "combined": alpha * bm25_norm + (1 - alpha) * semantic_norm,
-                "bm25": bm25_norm,
-                "semantic": semantic_norm
-            }
-
-        # Return top `limit` documents based on combined scores
-        sorted_docs = sorted(combined_scores.items(), key=lambda x: x[1]["combined"], reverse=True)
-        return [(doc_id, scores["combined"], scores["bm25"], scores["semantic"]) for doc_id, scores in sorted_docs[:limit]]
+    def _bm25_ranking(self, query, limit):
+        results = self._bm25_search(query, limit)
+        return np.array([doc_id for doc_id, _ in results], dtype=np.int64), np.array([score for _, score in results], dtype=np.float64)
+
+    def _semantic_ranking(self, query, limit):
+        movie_ids, scores = self.semantic_search.rank_chunks_batch([query], limit, nprobe=self.nprobe)[0]
+        # the rounded scores search_chunks reports
+        return movie_ids, np.round(scores, 4)
+
+    def _timed(self, stage, fn, *args, **kwargs):
+        # adds up over the rounds of an adaptive search
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+    def _retrieve(self, bm25_leg, semantic_leg):
+        """Results of both legs, overlapped when ``concurrent``; each leg and their wall time are timed."""
+        # load the chunk embeddings first, so that is not counted as semantic search time
+        self.semantic_search
+        start = time.perf_counter()
+        if self.concurrent:
+            semantic = _LEG_POOL.submit(self._timed, "semantic", semantic_leg)
+            bm25_results = self._timed("bm25", bm25_leg)
+            semantic_results = semantic.result()
+        else:
+            bm25_results = self._timed("bm25", bm25_leg)
+            semantic_results = self._timed("semantic", semantic_leg)
+        self.timings["retrieval"] = self.timings.get("retrieval", 0.0) + time.perf_counter() - start
+        return bm25_results, semantic_results
+
+    def weighted_search(self, query, alpha, limit=5, normalization="minmax"):
+        start = time.perf_counter()
+        self.timings = {}
+        # normalizing needs the lowest (or the mean and spread of) each leg's full-depth scores,
+        # so unlike rrf_search both legs are always fetched in full
+        bm25, semantic = self._retrieve(
+            lambda: self._bm25_ranking(query, limit*500),
+            lambda: self._semantic_ranking(query, limit*500),
+        )
+        doc_ids, combined, normalized = self._timed("fusion", fuse_weighted, [bm25, semantic], [alpha, 1 - alpha], limit, normalization)
+        self.timings["total"] = time.perf_counter() - start
+        return list(zip(doc_ids.tolist(), combined.tolist(), normalized[0].tolist(), normalized[1].tolist()))
 
     def rrf_search(self, query, k, limit=10, enhance=None, rerank_method=None):
+        start = time.perf_counter()
+        self.timings = {}
         if enhance:
+            # the legs search the enhanced query, so enhancement cannot overlap them
             query_original = query
-            query = self.enhance_query(query, method=enhance)
+            query = self._timed("enhance", self.enhance_query, query, method=enhance)
             print(f"Enhanced query ({enhance}): '{query_original}' -> '{query}'\n")
 
+        # rerankers rescore the fused top limit * 5; without reranking only the top limit of
+        # limit * 500 candidates per leg is kept, which adaptive_rrf finds from far fewer BM25 ones
         if rerank_method in ["individual", "batch", "cross_encoder"]:
             limit *= 5
+            depth = limit
         else:
-            limit *= 500
-
-        bm25_results = self._bm25_search(query, limit)
-        semantic_results = self.semantic_search.search_chunks(query, limit)
-        bm25_map = {doc_id: rank for rank, (doc_id, score) in enumerate(bm25_results)}
-        semantic_map = {result["id"]: rank for rank, result in enumerate(semantic_results)}
-        all_doc_ids = set(bm25_map.keys()) | set(semantic_map.keys())
-
-        rrf_scores = {}
-        for doc_id in all_doc_ids:
-            bm25_rank = bm25_map.get(doc_id, float('inf'))
-            semantic_rank = semantic_map.get(doc_id, float('inf'))
-            rrf_scores[doc_id] = {
-                "score": (1 / (k + bm25_rank)) + (1 / (k + semantic_rank)),
-                "bm25_rank": bm25_rank,
-                "semantic_rank": semantic_rank
-            }
-        sorted_docs = sorted(rrf_scores.items(), key=lambda x: x[1]["score"], reverse=True)
-
-        final_output = []
-        for doc_id, score_data in sorted_docs[:limit]:
-            final_output.append({
-                "id": doc_id,
-                "title": self.semantic_search.document_map[doc_id]["title"],
-                "document": self.semantic_search.document_map[doc_id]["description"][:100],
-                "score": round(score_data["score"], 4),
-                "metadata": {
-                    "bm25_rank": score_data["bm25_rank"] if score_data["bm25_rank"] != float('inf') else "N/A",
-                    "semantic_rank": score_data["semantic_rank"] if score_data["semantic_rank"] != float('inf') else "N/A"
-                }
-            })
+            depth = limit * 500
+
+        semantic = None
+
+        def fetch(bm25_depth):
+            nonlocal semantic
+            if semantic is None:
+                # scoring every chunk costs the same at any depth, so rank the semantic leg in full once
+                bm25, semantic = self._retrieve(
+                    lambda: self._bm25_ranking(query, bm25_depth)[0],
+                    lambda: self._semantic_ranking(query, depth)[0],
+                )
+            else:
+                retrieval_start = time.perf_counter()
+                bm25 = self._timed("bm25", lambda: self._bm25_ranking(query, bm25_depth)[0])
+                self.timings["retrieval"] += time.perf_counter() - retrieval_start
+            return [bm25, semantic]
+
+        # load the chunk embeddings outside the timings
+        self.semantic_search
+        fusion_start = time.perf_counter()
+        doc_ids, scores, ranks, used_depth = adaptive_rrf(fetch, k, limit, depth)
+        self.depth = (used_depth, depth)
+        # the rounds of fetching are timed as retrieval
+        self.timings["fusion"] = time.perf_counter() - fusion_start - self.timings["retrieval"]
+        final_output = self._rrf_results(doc_ids, scores, ranks)
+        rerank_start = time.perf_counter()
 
         if rerank_method == "individual":
             for i, result in enumerate(final_output):
@@ -133,23 +187,67 @@ class HybridSearch:
 
         if rerank_method == "cross_encoder":
             print(f"Reranking top {len(final_output)} documents using cross-encoder...")
-            cross_encoder = CrossEncoder('cross-encoder/ms-marco-TinyBERT-L2-v2')
             pairs = [(query, result["document"]) for result in final_output]
-            ce_scores = cross_encoder.predict(pairs)
+            ce_scores = self.cross_encoder.predict(pairs)
             for i, result in enumerate(final_output):
                 result["llm_score"] = round(ce_scores[i], 4)
             final_output = sorted(final_output, key=lambda x: x["llm_score"], reverse=True)[:limit]
 
+        if rerank_method:
+            self.timings["rerank"] = time.perf_counter() - rerank_start
+        self.timings["total"] = time.perf_counter() - start
         return final_output
     
 
-    def enhance_query(self, query, method):
-        load_dotenv()
-        api_key = os.environ.get("GEMINI_API_KEY")
-        print(f"Using key {api_key[:6]}...")
+    def rrf_search_batch(self, queries, k, limit=10):
+        """``rrf_search`` without enhancement or reranking for many queries, each leg searched as one batch.
+
+        Like ``adaptive_rrf``, BM25 goes deeper only for the queries whose top ``limit`` is not yet certain.
+        """
+        depth = limit * 500
+        self.timings = {}
+        bm25_depth = min(depth, max(2 * limit, MIN_DEPTH))
+        bm25_results, semantic_results = self._retrieve(
+            lambda: self.idx.bm25_search_batch(queries, bm25_depth),
+            lambda: self.semantic_search.rank_chunks_batch(queries, depth, nprobe=self.nprobe),
+        )
+        results = [None] * len(queries)
+        pending = list(range(len(queries)))
+        while True:
+            unsure = []
+            for i, bm25 in zip(pending, bm25_results):
+                bm25 = np.array([doc_id for doc_id, _ in bm25], dtype=np.int64)
+                semantic = semantic_results[i][0]
+                complete = [len(bm25) < bm25_depth or bm25_depth >= depth, True]
+                doc_ids, scores, ranks, certain = fuse_rrf([bm25, semantic], k, limit, complete)
+                if certain or bm25_depth >= depth:
+                    results[i] = self._rrf_results(doc_ids, scores, ranks)
+                else:
+                    unsure.append(i)
+            if not unsure:
+                return results
+            pending = unsure
+            bm25_depth = min(DEPTH_GROWTH * bm25_depth, depth)
+            bm25_results = self._timed("bm25", self.idx.bm25_search_batch, [queries[i] for i in pending], bm25_depth)
+
+    def _rrf_results(self, doc_ids, scores, ranks):
+        final_output = []
+        for doc_id, score, bm25_rank, semantic_rank in zip(doc_ids.tolist(), scores.tolist(), ranks[0].tolist(), ranks[1].tolist()):
+            final_output.append({
+                "id": doc_id,
+                "title": self.semantic_search.document_map[doc_id]["title"],
+                "document": self.semantic_search.document_map[doc_id]["description"][:100],
+                "score": round(score, 4),
+                "metadata": {
+                    "bm25_rank": bm25_rank if bm25_rank >= 0 else "N/A",
+                    "semantic_rank": semantic_rank if semantic_rank >= 0 else "N/A"
+                }
+            })
+        return final_output
 
+    def enhance_query(self, query, method):
         model = "gemini-2.5-flash"
-        client = genai.Client(api_key=api_key)
+        client = gemini_client()
 
         if method == "spell":
             contents = f"""Fix any spelling errors in this movie search query.
@@ -209,43 +307,68 @@ class HybridSearch:
     
 
 
+def gemini_client():
+    # google-genai is only imported by the commands that call Gemini
+    from dotenv import load_dotenv
+    from google import genai
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    print(f"Using key {api_key[:6]}...")
+    return genai.Client(api_key=api_key)
+
+
 def normalize_scores(*scores):
-    if not scores:
-        return []
-    min_score = min(scores)
-    max_score = max(scores)
-    if max_score == min_score:
-        return [1.0] * len(scores)
-    
-    normalized_score = []
-    for score in scores:
-        normalized_score.append((score - min_score) / (max_score - min_score))
-    
-    return normalized_score
+    return minmax(np.array(scores, dtype=np.float64)).tolist()
     
 def normalize_scores_text(*scores):
     normalized = normalize_scores(*scores)
     for score in normalized:
         print(f"{score:.4f}")
 
-def weighted_search_text(query, alpha, limit=5):
-    with open("data/movies.json", "r") as f:
-        data = json.load(f)
-    documents = data["movies"]
-    
-    search = HybridSearch(documents=documents)
-    results = search.weighted_search(query, alpha, limit)
+def weighted_search_results(search, query, alpha, limit=5, normalization="minmax"):
+    """``weighted_search`` results as dicts with the title and description of each movie."""
+    results = []
+    for doc_id, combined, bm25, semantic in search.weighted_search(query, alpha, limit, normalization):
+        movie = search.semantic_search.document_map[doc_id]
+        results.append({"id": doc_id, "title": movie["title"], "description": movie["description"], "score": combined, "bm25": bm25, "semantic": semantic})
+    return results
+
+def print_weighted_results(results):
     for i, result in enumerate(results):
-        title = search.semantic_search.document_map[result[0]]['title']
-        print(f"{i+1}. {title}\nHybrid score: {result[1]:.4f}\nBM25: {result[2]:.4f}, Semantic: {result[3]:.4f}\n{search.semantic_search.document_map[result[0]]['description'][:200]}...\n")
+        print(f"{i+1}. {result['title']}\nHybrid score: {result['score']:.4f}\nBM25: {result['bm25']:.4f}, Semantic: {result['semantic']:.4f}\n{result['description'][:200]}...\n")
+
+def print_timings(timings, depth=None):
+    """One line with the milliseconds spent per stage and what overlapping the two legs saved."""
+    stages = [f"{stage} {timings[stage] * 1000:.1f}ms" for stage in ("enhance", "bm25", "semantic") if stage in timings]
+    saved = max(timings["bm25"] + timings["semantic"] - timings["retrieval"], 0.0)
+    stages.append(f"both legs {timings['retrieval'] * 1000:.1f}ms (saved {saved * 1000:.1f}ms)")
+    stages += [f"{stage} {timings[stage] * 1000:.1f}ms" for stage in ("fusion", "rerank", "total") if stage in timings]
+    if depth:
+        stages.append(f"BM25 depth {depth[0]} of {depth[1]}")
+    print("Timings: " + ", ".join(stages))
+
+def weighted_search_text(query, alpha, limit=5, nprobe=None, concurrent=True, timings=False, normalization="minmax"):
+    documents = MovieCatalog.open()
+    
+    search = HybridSearch(documents=documents, nprobe=nprobe, concurrent=concurrent)
+    print_weighted_results(weighted_search_results(search, query, alpha, limit, normalization))
+    if timings:
+        print_timings(search.timings)
 
-def rrf_search_text(query, k, limit=5, enhance=None, rerank_method=None, evaluate=False):
-    with open("data/movies.json", "r") as f:
-        data = json.load(f)
-    documents = data["movies"]
+def rrf_search_text(query, k, limit=5, enhance=None, rerank_method=None, evaluate=False, nprobe=None, backend="torch", threads=None, concurrent=True, timings=False):
+    documents = MovieCatalog.open()
     
-    search = HybridSearch(documents=documents)
+    search = HybridSearch(documents=documents, nprobe=nprobe, backend=backend, threads=threads, concurrent=concurrent)
     results = search.rrf_search(query, k, limit, enhance, rerank_method=rerank_method)
+    print_rrf_results(query, k, limit, rerank_method, results)
+    if timings:
+        print_timings(search.timings, search.depth)
+
+    if evaluate:
+        llm_evaluator(query, results[:limit])
+
+
+def print_rrf_results(query, k, limit, rerank_method, results):
     if rerank_method in ["individual", "batch", "cross_encoder"]:
         print(f"Reranking top {limit} results using {rerank_method} method...")
     print(f"Reciprocal Rank Fusion Results for '{query}' (k={k}):")
@@ -256,17 +379,10 @@ def rrf_search_text(query, k, limit=5, enhance=None, rerank_method=None, evaluat
         print(f"BM25 Rank: {result['metadata'].get('bm25_rank', 'N/A')}, Semantic Rank: {result['metadata'].get('semantic_rank', 'N/A')}")
         print(f"{result['document']}...\n")
 
-    if evaluate:
-        llm_evaluator(query, results[:limit])
-
 
 def llm_rerank(query, results, rerank_method):
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    print(f"Using key {api_key[:6]}...")
-
     model = "gemini-2.5-flash"
-    client = genai.Client(api_key=api_key)
+    client = gemini_client()
 
     if rerank_method == "individual":
         contents  = f"""Rate how well this movie matches the search query.
@@ -320,12 +436,8 @@ def llm_rerank(query, results, rerank_method):
 
 
 def llm_evaluator(query, results):
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    print(f"Using key {api_key[:6]}...")
-
     model = "gemini-2.5-flash"
-    client = genai.Client(api_key=api_key)
+    client = gemini_client()
 
     content = f"""Rate how relevant each result is to this query on a 0-3 scale:
 
@@ -362,13 +474,9 @@ def llm_evaluator(query, results):
     
 
 def rag(query, docs, results):
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    print(f"Using key {api_key[:6]}...")
-
     model = "gemini-2.5-flash-lite"
 
-    client = genai.Client(api_key=api_key)
+    client = gemini_client()
 
     # get titles from results
     result_titles = [r["title"] for r in results]
@@ -400,13 +508,9 @@ def rag_text(query, docs, results):
 
 
 def rag_summary(query, docs, results):
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    print(f"Using key {api_key[:6]}...")
-
     model = "gemini-2.5-flash-lite"
 
-    client = genai.Client(api_key=api_key)
+    client = gemini_client()
 
     # get titles from results
     result_titles = [r["title"] for r in results]
@@ -441,13 +545,9 @@ def rag_summary_text(query, docs, results):
 
 
 def rag_citations(query, docs, results):
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    print(f"Using key {api_key[:6]}...")
-
     model = "gemini-2.5-flash-lite"
 
-    client = genai.Client(api_key=api_key)
+    client = gemini_client()
 
     # get titles from results
     result_titles = [r["title"] for r in results] 
@@ -494,13 +594,9 @@ def rag_citations_text(query, docs, results):
 
 
 def rag_question(query, docs, results):
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    print(f"Using key {api_key[:6]}...")
-
     model = "gemini-2.5-flash-lite"
 
-    client = genai.Client(api_key=api_key)
+    client = gemini_client()
 
     # get titles from results
     result_titles = [r["title"] for r in results] 
@@ -536,4 +632,12 @@ def rag_question_text(query, docs, results):
     response = rag_question(query, docs, results)
     
     print("Search Results with Question Answer:")
-    print(response.text.strip())
\ No newline at end of file
+    print(response.text.strip())
+
+# what each augmented_generation_cli command generates from the search results, and the heading it prints
+RAG_MODES = {
+    "rag": (rag, "Search Results:"),
+    "summarize": (rag_summary, "Search Results:"),
+    "citations": (rag_citations, "Search Results with Citations:"),
+    "question": (rag_question, "Search Results with Question Answer:"),
+}
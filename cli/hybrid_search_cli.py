@@ -1,9 +1,13 @@
 import argparse
-from hybrid_search import normalize_scores_text, weighted_search_text, rrf_search_text
+from hybrid_search import llm_evaluator, normalize_scores_text, print_rrf_results, print_weighted_results, weighted_search_text, rrf_search_text
+from search_client import SERVER_ENV, default_server, remote
+from fusion import NORMALIZATIONS
+from inference import BACKENDS
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Hybrid Search CLI")
+    parser.add_argument("--server", type=str, default=default_server(), help=f"Send queries to a running search_server_cli.py server at this URL (default: ${SERVER_ENV})")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # normalize subparser
@@ -15,6 +19,10 @@ def main() -> None:
     weighted_parser.add_argument("query", type=str, help="Search query")
     weighted_parser.add_argument("--alpha", type=float, default=0.5, help="Weighting factor for BM25 vs semantic search (0.0 to 1.0)")
     weighted_parser.add_argument("--limit", type=int, default=5, help="Number of results to return")
+    weighted_parser.add_argument("--nprobe", type=int, help="Use the approximate IVF index for the semantic side, scanning this many inverted lists")
+    weighted_parser.add_argument("--normalization", choices=NORMALIZATIONS, default="minmax", help="How each leg's scores are scaled before weighting: min-max to [0, 1] or z-scores")
+    weighted_parser.add_argument("--serial", action="store_true", help="Run the BM25 and semantic searches one after the other instead of at the same time")
+    weighted_parser.add_argument("--timings", action="store_true", help="Print the time spent in each search stage")
 
     ## rrf-search parser
     rrf_parser = subparsers.add_parser("rrf-search", help="Perform a Reciprocal Rank Fusion (RRF) hybrid search")
@@ -24,6 +32,11 @@ def main() -> None:
     rrf_parser.add_argument("--enhance", type=str, choices=["spell", "rewrite", "expand"], help="Query enhancement method")
     rrf_parser.add_argument("--rerank-method", type=str, choices=["individual", "batch", "cross_encoder"], help="Method for reranking results after fusion")
     rrf_parser.add_argument("--evaluate", action="store_true", help="Whether to evaluate the results against a golden dataset")
+    rrf_parser.add_argument("--nprobe", type=int, help="Use the approximate IVF index for the semantic side, scanning this many inverted lists")
+    rrf_parser.add_argument("--backend", choices=BACKENDS, default="torch", help="Query encoder and cross-encoder inference: float32 torch or dynamically quantized int8")
+    rrf_parser.add_argument("--threads", type=int, help="Torch threads used for inference (default: torch's own choice)")
+    rrf_parser.add_argument("--serial", action="store_true", help="Run the BM25 and semantic searches one after the other instead of at the same time")
+    rrf_parser.add_argument("--timings", action="store_true", help="Print the time spent in each search stage")
 
 
 
@@ -35,9 +48,18 @@ def main() -> None:
         case "normalize":
             normalize_scores_text(*args.scores)
         case "weighted-search":
-            weighted_search_text(args.query, args.alpha, args.limit)
+            if args.server:
+                print_weighted_results(remote(args.server, "weighted_search", query=args.query, alpha=args.alpha, limit=args.limit, nprobe=args.nprobe, normalization=args.normalization))
+            else:
+                weighted_search_text(args.query, args.alpha, args.limit, nprobe=args.nprobe, concurrent=not args.serial, timings=args.timings, normalization=args.normalization)
+        case "rrf-search" if args.server:
+            # the server encodes and reranks with the backend it was started with
+            results = remote(args.server, "rrf_search", query=args.query, k=args.k, limit=args.limit, enhance=args.enhance, rerank_method=args.rerank_method, nprobe=args.nprobe)
+            print_rrf_results(args.query, args.k, args.limit, args.rerank_method, results)
+            if args.evaluate:
+                llm_evaluator(args.query, results[:args.limit])
         case "rrf-search":
-            rrf_search_text(args.query, args.k, args.limit, args.enhance, args.rerank_method, args.evaluate)
+            rrf_search_text(args.query, args.k, args.limit, args.enhance, args.rerank_method, args.evaluate, nprobe=args.nprobe, backend=args.backend, threads=args.threads, concurrent=not args.serial, timings=args.timings)
         case _:
             parser.print_help()
 
@@ -0,0 +1,291 @@
+import json
+import mmap
+import os
+import shutil
+from collections.abc import Mapping
+import numpy as np
+from bm25_engine import BM25Engine
+from postings_codec import BlockPostings
+
+INDEX_DIR = "cache/keyword_index"
+BASE_SEGMENT = "base"
+# delta segments live in <index>/segments/<name>/ and are listed, oldest first, in the manifest
+SEGMENTS_DIR = "segments"
+MANIFEST_FILE = "segments.json"
+TOMBSTONES_FILE = "deleted.npy"
+FORMAT_NAME = "rag-keyword-index"
+FORMAT_VERSION = 1
+
+# every array is its own .npy file so np.load(mmap_mode="r") can map it directly
+ARRAY_NAMES = ("terms", "offsets", "doc_ids", "doc_lengths", "idf", "doc_offsets")
+# postings are either plain CSR arrays or compressed blocks (meta "postings": "blocks")
+POSTINGS_ARRAY_NAMES = {
+    "csr": ("doc_rows", "tfs"),
+    "blocks": ("block_data", "block_first", "row_bits", "tf_bits"),
+}
+# optional so indexes written before these existed still load; max_tf_components and
+# position_offsets are recomputed lazily, positions are only written by `build --positions`
+OPTIONAL_ARRAY_NAMES = ("max_tf_components", "positions", "position_offsets")
+
+
+def map_file(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return b""
+
+
+class DocumentMap(Mapping):
+    """Read-only doc_id -> movie mapping over a memory-mapped JSON lines file.
+
+    ``doc_ids`` is sorted and ``starts``/``ends`` give each movie's byte range.
+    Movies are only parsed when they are looked up, so opening the index does
+    not pay for the whole catalog.
+    """
+
+    def __init__(self, path: str, doc_ids, starts, ends) -> None:
+        self.doc_ids = doc_ids
+        self.starts = starts
+        self.ends = ends
+        self._data = map_file(path)
+
+    def _row(self, doc_id) -> int:
+        pos = int(np.searchsorted(self.doc_ids, doc_id))
+        if pos < len(self.doc_ids) and self.doc_ids[pos] == doc_id:
+            return pos
+        return -1
+
+    def __getitem__(self, doc_id):
+        return json.loads(self.raw(doc_id))
+
+    def raw(self, doc_id) -> bytes:
+        row = self._row(doc_id)
+        if row < 0:
+            raise KeyError(doc_id)
+        return self._data[self.starts[row]:self.ends[row]]
+
+    def __contains__(self, doc_id) -> bool:
+        return self._row(doc_id) >= 0
+
+    def __iter__(self):
+        return iter(self.doc_ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+
+class LiveDocumentMap(Mapping):
+    """doc_id -> movie across segments, hiding tombstoned documents."""
+
+    def __init__(self, segments) -> None:
+        self.segments = segments
+
+    def _segment(self, doc_id):
+        for segment in reversed(self.segments):
+            row = segment.engine.row_of(doc_id)
+            if row >= 0 and not segment.deleted[row]:
+                return segment
+        return None
+
+    def __getitem__(self, doc_id):
+        segment = self._segment(doc_id)
+        if segment is None:
+            raise KeyError(doc_id)
+        return segment.docmap[doc_id]
+
+    def __contains__(self, doc_id) -> bool:
+        return self._segment(doc_id) is not None
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from segment.engine.doc_ids[~segment.deleted].tolist()
+
+    def __len__(self) -> int:
+        return sum(int(np.count_nonzero(~segment.deleted)) for segment in self.segments)
+
+
+class Segment():
+    """One immutable engine plus its movies and a tombstone per row."""
+
+    def __init__(self, name: str, engine: BM25Engine, docmap, deleted=None) -> None:
+        self.name = name
+        self.engine = engine
+        self.docmap = docmap
+        self.deleted = deleted if deleted is not None else np.zeros(len(engine.doc_ids), dtype=bool)
+
+
+def segment_path(path: str, name: str) -> str:
+    if name == BASE_SEGMENT:
+        return path
+    return os.path.join(path, SEGMENTS_DIR, name)
+
+
+def load_segment_names(path: str = INDEX_DIR) -> list[str]:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return []
+    with open(manifest_path, "r") as f:
+        return json.load(f)["segments"]
+
+
+def save_segment_names(names: list[str], path: str = INDEX_DIR) -> None:
+    tmp_path = os.path.join(path, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"segments": names}, f, indent=2)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+
+
+def load_tombstones(path: str, n_rows: int):
+    tombstones_path = os.path.join(path, TOMBSTONES_FILE)
+    if not os.path.exists(tombstones_path):
+        return np.zeros(n_rows, dtype=bool)
+    return np.unpackbits(np.load(tombstones_path), count=n_rows).astype(bool)
+
+
+def save_tombstones(path: str, deleted) -> None:
+    # stored as a bitmap, one bit per row of the segment
+    tmp_path = os.path.join(path, f"{TOMBSTONES_FILE}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.packbits(deleted))
+    os.replace(tmp_path, os.path.join(path, TOMBSTONES_FILE))
+
+
+def load_segments(k1: float, b: float, path: str = INDEX_DIR) -> list[Segment]:
+    segments = []
+    for name in [BASE_SEGMENT] + load_segment_names(path):
+        engine, docmap = load_index(k1, b, segment_path(path, name))
+        deleted = load_tombstones(segment_path(path, name), len(engine.doc_ids))
+        segments.append(Segment(name, engine, docmap, deleted))
+    return segments
+
+
+def index_exists(path: str = INDEX_DIR) -> bool:
+    return os.path.exists(os.path.join(path, "meta.json"))
+
+
+def _smallest_uint(max_value: int):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def save_index(engine: BM25Engine, docmap, path: str = INDEX_DIR) -> None:
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    doc_offsets = np.zeros(len(engine.doc_ids) + 1, dtype=np.int64)
+    with open(os.path.join(tmp_path, "docs.jsonl"), "wb") as f:
+        for row, doc_id in enumerate(engine.doc_ids.tolist()):
+            if isinstance(docmap, DocumentMap):
+                line = docmap.raw(doc_id)
+            else:
+                line = (json.dumps(docmap[doc_id]) + "\n").encode()
+            f.write(line)
+            doc_offsets[row + 1] = doc_offsets[row] + len(line)
+
+    arrays = {
+        "terms": engine.terms,
+        "offsets": engine.offsets.astype(np.int64),
+        "doc_ids": engine.doc_ids.astype(np.int64),
+        "doc_lengths": engine.doc_lengths.astype(np.uint32),
+        "idf": engine.idf.astype(np.float64),
+        "doc_offsets": doc_offsets,
+        "max_tf_components": engine.max_tf_components.astype(np.float64),
+        "positions": None,
+        "position_offsets": None,
+    }
+    if engine.positions is not None:
+        max_delta = int(engine.positions.max()) if len(engine.positions) else 0
+        arrays["positions"] = engine.positions.astype(_smallest_uint(max_delta))
+        arrays["position_offsets"] = engine.position_offsets.astype(np.int64)
+    blocks = engine.block_postings
+    if blocks is not None:
+        postings_format = "blocks"
+        arrays["block_data"] = blocks.data
+        arrays["block_first"] = blocks.block_first.astype(np.int32)
+        arrays["row_bits"] = blocks.row_bits.astype(np.uint8)
+        arrays["tf_bits"] = blocks.tf_bits.astype(np.uint8)
+    else:
+        postings_format = "csr"
+        arrays["doc_rows"] = engine.doc_rows.astype(np.int32)
+        arrays["tfs"] = engine.tfs.astype(_smallest_uint(int(engine.tfs.max()) if len(engine.tfs) else 0))
+    for name in ARRAY_NAMES + POSTINGS_ARRAY_NAMES[postings_format] + OPTIONAL_ARRAY_NAMES:
+        if arrays[name] is not None:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), arrays[name])
+
+    # meta.json is written last; its presence marks a complete index
+    meta = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "n_docs": engine.n_docs,
+        "n_terms": len(engine.terms),
+        "n_postings": int(engine.offsets[-1]),
+    }
+    if blocks is not None:
+        meta["postings"] = postings_format
+        meta["block_size"] = blocks.block_size
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def _load_array(path: str, name: str):
+    file_path = os.path.join(path, f"{name}.npy")
+    try:
+        return np.load(file_path, mmap_mode="r")
+    except ValueError:
+        # zero-length arrays cannot be memory-mapped
+        return np.load(file_path)
+
+
+def load_index(k1: float, b: float, path: str = INDEX_DIR) -> tuple[BM25Engine, DocumentMap]:
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_NAME or meta.get("version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported keyword index at {path} (format {meta.get('format')!r}, "
+            f"version {meta.get('version')!r}). Rebuild it with the `build` command."
+        )
+
+    postings_format = meta.get("postings", "csr")
+    arrays = {name: _load_array(path, name) for name in ARRAY_NAMES + POSTINGS_ARRAY_NAMES[postings_format]}
+    for name in OPTIONAL_ARRAY_NAMES:
+        arrays[name] = _load_array(path, name) if os.path.exists(os.path.join(path, f"{name}.npy")) else None
+    block_postings = None
+    if postings_format == "blocks":
+        block_postings = BlockPostings(
+            arrays["offsets"],
+            arrays["block_data"],
+            arrays["block_first"],
+            arrays["row_bits"],
+            arrays["tf_bits"],
+            block_size=meta["block_size"],
+        )
+    engine = BM25Engine(
+        terms=arrays["terms"],
+        offsets=arrays["offsets"],
+        doc_rows=arrays.get("doc_rows"),
+        tfs=arrays.get("tfs"),
+        doc_ids=arrays["doc_ids"],
+        doc_lengths=arrays["doc_lengths"],
+        n_docs=meta["n_docs"],
+        k1=k1,
+        b=b,
+        idf=arrays["idf"],
+        max_tf_components=arrays["max_tf_components"],
+        positions=arrays["positions"],
+        position_offsets=arrays["position_offsets"],
+        block_postings=block_postings,
+    )
+    docmap = DocumentMap(
+        os.path.join(path, "docs.jsonl"), arrays["doc_ids"], arrays["doc_offsets"][:-1], arrays["doc_offsets"][1:]
+    )
+    return engine, docmap
@@ -0,0 +1,41 @@
+BACKENDS = ("torch", "int8")
+
+
+def cache_name(model_name: str, backend: str = "torch") -> str:
+    """Name query embeddings are cached under, so vectors from different backends never mix."""
+    return model_name if backend == "torch" else f"{model_name}-{backend}"
+
+
+def set_threads(threads: int | None) -> None:
+    """Limit torch's intra-op thread pool (shared by every model in the process); None keeps its default."""
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def quantize(module, backend: str):
+    """``module`` ready for ``backend``: unchanged for ``torch``, Linear layers converted in place for ``int8``."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == "int8":
+        # dynamic quantization: int8 weights, activations quantized on the fly per batch
+        import torch
+        module.eval()
+        torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return module
+
+
+def load_sentence_transformer(model_name: str, backend: str = "torch", threads: int | None = None):
+    """A SentenceTransformer on CPU: float32 for ``torch``, int8 Linear layers for ``int8``."""
+    from sentence_transformers import SentenceTransformer
+    set_threads(threads)
+    return quantize(SentenceTransformer(model_name, device="cpu"), backend)
+
+
+def load_cross_encoder(model_name: str, backend: str = "torch", threads: int | None = None):
+    """A CrossEncoder on CPU, its transformer quantized like ``load_sentence_transformer``."""
+    from sentence_transformers import CrossEncoder
+    set_threads(threads)
+    cross_encoder = CrossEncoder(model_name, device="cpu")
+    quantize(cross_encoder.model, backend)
+    return cross_encoder
@@ -1,18 +1,38 @@
 #!/usr/bin/env python3
 
 import argparse
-from helpers import load_movies, load_stop_words, build_command, search, InvertedIndex, BM25_K1, BM25_B
+from search_client import SERVER_ENV, default_server, remote
+from helpers import load_stop_words, build_command, convert_command, add_command, delete_command, merge_command, search, boolean_search_command, InvertedIndex, BM25_K1, BM25_B
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Keyword Search CLI")
+    parser.add_argument("--server", type=str, default=default_server(), help=f"Send queries to a running search_server_cli.py server at this URL (default: ${SERVER_ENV})")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # search command
     search_parser = subparsers.add_parser("search", help="Search movies using BM25")
     search_parser.add_argument("query", type=str, help="Search query")
 
+    # boolean search command
+    boolean_parser = subparsers.add_parser("boolean", help="Match movies against a boolean query, e.g. 'space AND (alien OR robot) NOT comedy'")
+    boolean_parser.add_argument("query", type=str, help='Terms combined with AND, OR, NOT and parentheses; adjacent terms are ANDed. "quoted words" match a phrase and "quoted words"~N words within N of each other (needs `build --positions`)')
+    boolean_parser.add_argument("-l", "--limit", type=int, default=5, help="Number of matching documents to return")
+
     # build command
-    subparsers.add_parser("build", help="Build the inverted index")
+    build_parser = subparsers.add_parser("build", help="Build the inverted index")
+    build_parser.add_argument("-w", "--workers", type=int, default=1, help="Number of worker processes used to tokenize the catalog")
+    build_parser.add_argument("--positions", action="store_true", help="Also index token positions for phrase and proximity queries")
+    build_parser.add_argument("--compress", action="store_true", help="Store postings as delta-encoded, bit-packed blocks (smaller, decoded per query)")
+
+    # convert command
+    subparsers.add_parser("convert", help="Convert the legacy pickle cache to the binary index format")
+
+    # incremental update commands
+    add_parser = subparsers.add_parser("add", help="Add or update documents from a movies JSON file without a full rebuild")
+    add_parser.add_argument("file", type=str, help="JSON file with a 'movies' list, or a JSON lines file with one movie per line")
+    delete_parser = subparsers.add_parser("delete", help="Delete documents from the index")
+    delete_parser.add_argument("doc_ids", type=int, nargs="+", help="Document IDs to delete")
+    subparsers.add_parser("merge", help="Compact index segments and drop deleted documents")
 
     # tf parser
     tf_parser = subparsers.add_parser("tf", help="Get term frequency for a")
@@ -43,18 +63,32 @@ def main() -> None:
     bm25_search_parser = subparsers.add_parser("bm25search", help="Search for movies using BM25")
     bm25_search_parser.add_argument("query", type=str, help="Search query")
     bm25_search_parser.add_argument("-l", "--limit", type=int, default=5, help="Number of top results to return")
+    bm25_search_parser.add_argument("--exhaustive", action="store_true", help="Score every matching document instead of using top-k pruning")
+    bm25_search_parser.add_argument("--proximity", type=float, default=0.0, help="Weight of a boost for query terms that occur close together (needs `build --positions`)")
+
+    # batch bm25 search parser
+    bm25_batch_parser = subparsers.add_parser("bm25batch", help="Run BM25 search for every query in a file, scored as one batch")
+    bm25_batch_parser.add_argument("file", type=str, help="Text file with one query per line")
+    bm25_batch_parser.add_argument("-l", "--limit", type=int, default=5, help="Number of top results to return per query")
 
 
     args = parser.parse_args()
 
-    movies = load_movies("data/movies.json")
     stop_words = load_stop_words("data/stopwords.txt")
 
 
 
     match args.command:
         case "build":
-            build_command(stop_words=stop_words)
+            build_command(stop_words=stop_words, workers=args.workers, positions=args.positions, compress=args.compress)
+        case "convert":
+            convert_command()
+        case "add":
+            add_command(args.file, stop_words=stop_words)
+        case "delete":
+            delete_command(args.doc_ids)
+        case "merge":
+            merge_command()
         case "search":
             print(f"Searching for: {args.query}")
     
@@ -62,7 +96,11 @@ def main() -> None:
             index = InvertedIndex()
             index.load()
             # print the search query here
-            search(index, args, movies, stop_words)
+            search(index, args, stop_words)
+        case "boolean":
+            index = InvertedIndex()
+            index.load()
+            boolean_search_command(index, args.query, args.limit, stop_words=stop_words)
         case "tf":
             index = InvertedIndex()
             index.load()
@@ -92,14 +130,28 @@ def main() -> None:
             bm25tf_value = index.get_bm25_tf(args.doc_id, args.term, k1=args.k1)
             print(f"BM25 TF score of '{args.term}' in document '{args.doc_id}': {bm25tf_value:.2f}")
         case "bm25search":
+            if args.server:
+                results = remote(args.server, "bm25search", query=args.query, limit=args.limit, exhaustive=args.exhaustive, proximity=args.proximity)
+            else:
+                index = InvertedIndex()
+                index.load()
+                results = [
+                    {"id": doc_id, "title": index.docmap.get(doc_id, {}).get("title", "Unknown Title"), "score": score}
+                    for doc_id, score in index.bm25_search(args.query, args.limit, stop_words=stop_words, prune=not args.exhaustive, proximity=args.proximity)
+                ]
+            print(f"Top {args.limit} results for query '{args.query}':")
+            for i, result in enumerate(results, 1):
+                print(f"{i}. ({result['id']}) {result['title']} - Score: {result['score']:.2f}")
+        case "bm25batch":
+            with open(args.file, "r") as f:
+                queries = [line.strip() for line in f if line.strip()]
             index = InvertedIndex()
             index.load()
-            results = index.bm25_search(args.query, args.limit, stop_words=stop_words)
-            print(f"Top {args.limit} results for query '{args.query}':")
-            for i, (doc_id, score) in enumerate(results, 1):
-                movie = index.docmap.get(doc_id, {})
-                title = movie.get("title", "Unknown Title")
-                print(f"{i}. ({doc_id}) {title} - Score: {score:.2f}")
+            for query, results in zip(queries, index.bm25_search_batch(queries, args.limit, stop_words=stop_words)):
+                print(f"Top {args.limit} results for query '{query}':")
+                for i, (doc_id, score) in enumerate(results, 1):
+                    title = index.docmap.get(doc_id, {}).get("title", "Unknown Title")
+                    print(f"{i}. ({doc_id}) {title} - Score: {score:.2f}")
 
         case _:
             parser.print_help()
@@ -1,35 +1,71 @@
 
 
-import os, json
-from PIL import Image
-from sentence_transformers import SentenceTransformer
-from semantic_search import cosine_similarity
+import os
+import numpy as np
+from catalog import MovieCatalog, iter_batches
+from embedding_cache import QueryEmbeddingCache
+from encoding_pool import EncodingPool
+from semantic_search import EMBED_BATCH_SIZE, cosine_similarity
 
 
 
 class MultimodalSearch():
-    def __init__(self, documents=[], model_name: str = "clip-ViT-B-32") -> None:
+    def __init__(self, documents=[], model_name: str = "clip-ViT-B-32", workers: int = 1) -> None:
         self.documents = documents
-        self.texts = []
-        for doc in self.documents:
-            self.texts.append(f"{doc['title']}: {doc['description']}")
+        self.model_name = model_name
+        # processes that encode the document texts
+        self.workers = workers
+        self.query_cache = QueryEmbeddingCache(model_name)
+        self._model = None
+        self._text_embeddings = None
 
-        self.model = SentenceTransformer(model_name)
-        self.text_embeddings = self.model.encode(self.texts, show_progress_bar=True)
+    @property
+    def model(self):
+        # CLIP is loaded on first encode
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def text_embeddings(self):
+        # the documents are encoded on first search, in batches straight off the (possibly streamed) catalog
+        if self._text_embeddings is None:
+            batches = ([f"{doc['title']}: {doc['description']}" for doc in batch] for batch in iter_batches(self.documents, EMBED_BATCH_SIZE))
+            if self.workers > 1:
+                with EncodingPool(self.model_name, self.workers) as pool:
+                    blocks = list(pool.map(batches))
+            else:
+                blocks = [self.model.encode(batch) for batch in batches]
+            if blocks:
+                self._text_embeddings = np.vstack(blocks)
+            else:
+                self._text_embeddings = np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return self._text_embeddings
 
     def embed_image(self, image_path):
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image file not found: {image_path}")
+        from PIL import Image
         image = Image.open(image_path)
         embedding = self.model.encode([image])
         return embedding[0]
     
+    def embed_text(self, text):
+        if len(text.strip()) == 0:
+            raise ValueError("Input text cannot be empty or whitespace.")
+        return self.query_cache.get(text, lambda text: self.model.encode([text])[0])
+
     def search_with_image(self, image_path, limit=5):
-        image_embedding = self.embed_image(image_path)
+        return self.search_with_embedding(self.embed_image(image_path), limit)
 
+    def search_with_text(self, query, limit=5):
+        return self.search_with_embedding(self.embed_text(query), limit)
+
+    def search_with_embedding(self, query_embedding, limit=5):
         similarities = []
         for i, text_embedding in enumerate(self.text_embeddings):
-            sim = cosine_similarity(image_embedding, text_embedding)
+            sim = cosine_similarity(query_embedding, text_embedding)
             similarities.append((i, sim))
         similarities.sort(key=lambda x: x[1], reverse=True)
 
@@ -54,14 +90,20 @@ def verify_image_embedding(image_path):
     embedding = search.embed_image(image_path)
     print(f"Embedding shape: {embedding.shape[0]} dimensions")
 
-def image_search_command(image_path, limit=5):
-    with open("data/movies.json", "r") as f:
-        data = json.load(f)
-    searcher = MultimodalSearch(documents=data["movies"])
+def image_search_command(image_path, limit=5, workers=1):
+    searcher = MultimodalSearch(documents=MovieCatalog.open(), workers=workers)
     results = searcher.search_with_image(image_path, limit=limit)
 
     return {
         "image_path": image_path,
         "results": results,
     }
-    
\ No newline at end of file
+
+def text_search_command(query, limit=5, workers=1):
+    searcher = MultimodalSearch(documents=MovieCatalog.open(), workers=workers)
+    results = searcher.search_with_text(query, limit=limit)
+
+    return {
+        "query": query,
+        "results": results,
+    }
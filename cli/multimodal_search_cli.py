@@ -1,11 +1,14 @@
 
 
 import argparse
-from multimodal_search import verify_image_embedding, image_search_command
+import os
+from search_client import SERVER_ENV, default_server, remote
+from multimodal_search import verify_image_embedding, image_search_command, text_search_command
 
 
 def main():
     parser = argparse.ArgumentParser(description="Multimodal Search CLI")
+    parser.add_argument("--server", type=str, default=default_server(), help=f"Send queries to a running search_server_cli.py server at this URL (default: ${SERVER_ENV})")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # verify_image_embedding subparser
@@ -17,6 +20,12 @@ def main():
         "image_search", help="Search documents using an image"
     )
     search_parser.add_argument("image", type=str, help="Path to image file")
+    search_parser.add_argument("-w", "--workers", type=int, default=1, help="Processes encoding the document texts")
+
+    # text_search subparser
+    text_search_parser = subparsers.add_parser("text_search", help="Search documents with a text query embedded by the image model")
+    text_search_parser.add_argument("query", type=str, help="Search query")
+    text_search_parser.add_argument("-w", "--workers", type=int, default=1, help="Processes encoding the document texts")
 
 
     args = parser.parse_args()
@@ -26,7 +35,11 @@ def main():
             verify_image_embedding(args.image)
 
         case "image_search":
-            result = image_search_command(args.image)
+            if args.server:
+                # the server opens the image itself
+                result = remote(args.server, "image_search", image=os.path.abspath(args.image))
+            else:
+                result = image_search_command(args.image, workers=args.workers)
 
             print(f"Image search results for: {result['image_path']}")
             print("=" * 60)
@@ -36,6 +49,20 @@ def main():
                 print(f"   {res['document'][:100]}...")
                 print()
 
+        case "text_search":
+            if args.server:
+                result = remote(args.server, "text_search", query=args.query)
+            else:
+                result = text_search_command(args.query, workers=args.workers)
+
+            print(f"Text search results for: {result['query']}")
+            print("=" * 60)
+
+            for i, res in enumerate(result["results"], 1):
+                print(f"{i}. {res['title']} (similarity: {res['score']:.3f})")
+                print(f"   {res['document'][:100]}...")
+                print()
+
         case _:
             parser.print_help()
 
@@ -0,0 +1,164 @@
+import numpy as np
+
+BLOCK_SIZE = 128
+
+
+def _bit_widths(values):
+    # bits needed for the largest value of each block (0 when all are zero)
+    return np.where(values > 0, np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) + 1, 0)
+
+
+def _ranges(starts, lengths):
+    # concatenated [start, start + length) index ranges
+    run_starts = np.cumsum(lengths) - lengths
+    return np.arange(int(lengths.sum())) + np.repeat(starts - run_starts, lengths)
+
+
+class BlockPostings():
+    """Posting lists as delta-encoded, bit-packed blocks with skip data.
+
+    Each term's postings are cut into blocks of ``block_size``. A block stores
+    its first row in ``block_first`` (the skip data) and then, bit-packed at
+    the smallest width that fits the block, the gaps between consecutive rows
+    minus one followed by the tfs minus one. Blocks are padded to a multiple
+    of 8 values so every block starts on a byte boundary. Everything but
+    ``data``, ``block_first`` and the two width arrays is derived from the
+    term offsets.
+    """
+
+    def __init__(self, offsets, data, block_first, row_bits, tf_bits, block_size: int = BLOCK_SIZE) -> None:
+        self.offsets = offsets
+        self.data = data
+        self.block_first = block_first
+        self.row_bits = row_bits
+        self.tf_bits = tf_bits
+        self.block_size = block_size
+
+        doc_freqs = np.diff(np.asarray(offsets, dtype=np.int64))
+        n_blocks = -(-doc_freqs // block_size)
+        self.term_blocks = np.zeros(len(doc_freqs) + 1, dtype=np.int64)
+        np.cumsum(n_blocks, out=self.term_blocks[1:])
+        # every block is full except the last one of each term
+        self.block_lengths = np.full(int(self.term_blocks[-1]), block_size, dtype=np.int64)
+        last = self.term_blocks[1:][n_blocks > 0] - 1
+        self.block_lengths[last] = doc_freqs[n_blocks > 0] - (n_blocks[n_blocks > 0] - 1) * block_size
+        padded_groups = (self.block_lengths + 7) // 8
+        self.row_bytes = padded_groups * self.row_bits
+        block_bytes = self.row_bytes + padded_groups * self.tf_bits
+        self.block_starts = np.zeros(len(block_bytes) + 1, dtype=np.int64)
+        np.cumsum(block_bytes, out=self.block_starts[1:])
+
+    @classmethod
+    def encode(cls, offsets, doc_rows, tfs, block_size: int = BLOCK_SIZE) -> "BlockPostings":
+        offsets = np.asarray(offsets, dtype=np.int64)
+        doc_rows = np.asarray(doc_rows, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.int64)
+        doc_freqs = np.diff(offsets)
+        n_blocks = -(-doc_freqs // block_size)
+
+        # block b of term t starts at posting offsets[t] + k * block_size
+        block_term = np.repeat(np.arange(len(doc_freqs)), n_blocks)
+        block_index = np.arange(int(n_blocks.sum())) - np.repeat(np.cumsum(n_blocks) - n_blocks, n_blocks)
+        block_posting = offsets[block_term] + block_index * block_size
+        block_lengths = np.minimum(block_size, offsets[block_term + 1] - block_posting)
+
+        gaps = np.zeros(len(doc_rows), dtype=np.int64)
+        gaps[1:] = doc_rows[1:] - doc_rows[:-1] - 1
+        gaps[block_posting] = 0
+        tf_values = tfs - 1
+
+        row_bits = np.zeros(len(block_posting), dtype=np.uint8)
+        tf_bits = np.zeros(len(block_posting), dtype=np.uint8)
+        if len(doc_rows):
+            row_bits[:] = _bit_widths(np.maximum.reduceat(gaps, block_posting))
+            tf_bits[:] = _bit_widths(np.maximum.reduceat(tf_values, block_posting))
+
+        # lay each block out as [row gaps][tfs], each padded to whole bytes
+        padded_lengths = (block_lengths + 7) // 8 * 8
+        slot_starts = np.cumsum(padded_lengths) - padded_lengths
+        slot = np.arange(len(doc_rows)) - np.repeat(block_posting - slot_starts, block_lengths)
+        row_bytes = padded_lengths // 8 * row_bits
+        tf_bytes = padded_lengths // 8 * tf_bits
+        block_starts = np.cumsum(row_bytes + tf_bytes) - row_bytes - tf_bytes
+        data = np.zeros(int(row_bytes.sum() + tf_bytes.sum()), dtype=np.uint8)
+        for field, widths, byte_starts in ((gaps, row_bits, block_starts), (tf_values, tf_bits, block_starts + row_bytes)):
+            padded = np.zeros(int(padded_lengths.sum()), dtype=np.int64)
+            padded[slot] = field
+            for width in np.unique(widths).tolist():
+                if width == 0:
+                    continue
+                selected = widths == width
+                values = padded[_ranges(slot_starts[selected], padded_lengths[selected])]
+                bits = ((values[:, None] >> np.arange(width)) & 1).astype(np.uint8)
+                data[_ranges(byte_starts[selected], padded_lengths[selected] // 8 * width)] = np.packbits(bits.ravel(), bitorder="little")
+
+        block_first = doc_rows[block_posting].astype(np.int32)
+        return cls(offsets, data, block_first, row_bits, tf_bits, block_size)
+
+    def _unpack(self, blocks, byte_starts, widths):
+        # values of the given blocks, padded to a multiple of 8 per block
+        padded_lengths = (self.block_lengths[blocks] + 7) // 8 * 8
+        out = np.zeros(int(padded_lengths.sum()), dtype=np.int64)
+        out_starts = np.cumsum(padded_lengths) - padded_lengths
+        for width in np.unique(widths).tolist():
+            if width == 0:
+                continue
+            selected = widths == width
+            lengths = padded_lengths[selected]
+            index_in_block = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            bit_offsets = np.repeat(byte_starts[selected] * 8, lengths) + index_in_block * width
+            out[_ranges(out_starts[selected], lengths)] = self._read_bits(bit_offsets, width)
+        return out, out_starts
+
+    def _read_bits(self, bit_offsets, width: int):
+        # assemble the bytes spanning each value into one word, then shift and mask
+        first_byte = bit_offsets >> 3
+        last = len(self.data) - 1
+        words = np.zeros(len(bit_offsets), dtype=np.uint64)
+        for k in range((width + 14) // 8):
+            words |= self.data[np.minimum(first_byte + k, last)].astype(np.uint64) << np.uint64(8 * k)
+        return ((words >> (bit_offsets & 7).astype(np.uint64)) & np.uint64((1 << width) - 1)).astype(np.int64)
+
+    def decode_blocks(self, blocks):
+        """Rows and tfs of the given blocks, in block order."""
+        blocks = np.asarray(blocks, dtype=np.int64)
+        lengths = self.block_lengths[blocks]
+        starts = self.block_starts[blocks]
+        gaps, out_starts = self._unpack(blocks, starts, self.row_bits[blocks].astype(np.int64))
+        tf_values, _ = self._unpack(blocks, starts + self.row_bytes[blocks], self.tf_bits[blocks].astype(np.int64))
+        keep = _ranges(out_starts, lengths)
+        gaps, tfs = gaps[keep], tf_values[keep] + 1
+
+        # rows[i] = first + sum of (gap + 1) since the start of the block
+        steps = gaps + 1
+        steps[np.cumsum(lengths) - lengths] = 0
+        running = np.cumsum(steps)
+        carried = running[np.cumsum(lengths) - lengths]
+        rows = np.repeat(self.block_first[blocks].astype(np.int64) - carried, lengths) + running
+        return rows.astype(np.int32), tfs.astype(np.int32)
+
+    def postings(self, term_id: int):
+        return self.decode_blocks(np.arange(self.term_blocks[term_id], self.term_blocks[term_id + 1]))
+
+    def contains(self, term_id: int, rows):
+        """Mask of which sorted ``rows`` have a posting for ``term_id``, decoding only the blocks they fall in."""
+        first_block, end_block = self.term_blocks[term_id], self.term_blocks[term_id + 1]
+        found = np.zeros(len(rows), dtype=bool)
+        if first_block == end_block or not len(rows):
+            return found
+        block = first_block + np.searchsorted(self.block_first[first_block:end_block], rows, "right") - 1
+        candidate = block >= first_block
+        blocks = np.unique(block[candidate])
+        decoded, _ = self.decode_blocks(blocks)
+        pos = np.searchsorted(decoded, rows[candidate])
+        hit = pos < len(decoded)
+        hit[hit] = decoded[pos[hit]] == rows[candidate][hit]
+        found[candidate] = hit
+        return found
+
+    def decode_all(self):
+        return self.decode_blocks(np.arange(len(self.block_lengths)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.block_first.nbytes + self.row_bits.nbytes + self.tf_bits.nbytes
@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import numpy as np
+from ann_index import kmeans, normalize_rows, top_k
+from vector_store import load_vectors
+
+QUANTIZED_DIR = "cache/quantized"
+QUANTIZED_VERSION = 1
+CODECS = ("float16", "int8", "pq")
+# the first pass keeps this many times k candidates for exact rescoring
+RESCORE_FACTOR = 10
+# product quantization: centroids per subspace (so one byte per code) and training rows
+PQ_CENTROIDS = 256
+PQ_TRAIN_SIZE = 25000
+# rows encoded at a time, and rows decoded and scored at a time (small enough to stay in cache)
+ENCODE_BATCH_SIZE = 65536
+SCORE_BATCH_SIZE = 4096
+
+
+class QuantizedVectors():
+    """Unit-length embeddings stored as compressed codes, searched in two passes.
+
+    ``float16`` halves every value; ``int8`` stores each dimension as a byte
+    scaled by that dimension's largest magnitude; ``pq`` (product
+    quantization) splits the vector into ``n_subspaces`` slices and keeps,
+    per slice, the byte id of the nearest of 256 k-means centroids. A search
+    scores every row from the codes, then rescores the best ``k *
+    RESCORE_FACTOR`` with full precision, read from ``full`` (normally the
+    memory-mapped float32 .npy), so only the codes have to stay resident.
+    """
+
+    def __init__(self, codec: str, codes, params, full=None) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}; expected one of {', '.join(CODECS)}")
+        self.codec = codec
+        self.codes = codes
+        # int8: per-dimension scales; pq: (n_subspaces, 256, subspace width) codebooks
+        self.params = params
+        self.full = full
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.params.nbytes if self.params is not None else 0)
+
+    @classmethod
+    def encode(cls, vectors, codec: str, n_subspaces: int | None = None, seed: int = 0) -> "QuantizedVectors":
+        dim = vectors.shape[1]
+        if codec == "float16":
+            codes = np.empty(vectors.shape, dtype=np.float16)
+            params = None
+        elif codec == "int8":
+            scales = np.zeros(dim, dtype=np.float32)
+            for start in range(0, len(vectors), ENCODE_BATCH_SIZE):
+                block = normalize_rows(np.asarray(vectors[start:start + ENCODE_BATCH_SIZE], dtype=np.float32))
+                scales = np.maximum(scales, np.abs(block).max(axis=0, initial=0) / 127)
+            codes = np.empty(vectors.shape, dtype=np.int8)
+            params = np.where(scales > 0, scales, 1).astype(np.float32)
+        elif codec == "pq":
+            n_subspaces = n_subspaces or max(1, dim // 8)
+            if dim % n_subspaces:
+                raise ValueError(f"{dim} dimensions do not split into {n_subspaces} equal subspaces")
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(len(vectors), size=min(len(vectors), PQ_TRAIN_SIZE), replace=False))
+            train = normalize_rows(np.asarray(vectors[sample], dtype=np.float32)).reshape(len(sample), n_subspaces, -1)
+            n_centroids = min(PQ_CENTROIDS, len(sample))
+            params = np.stack([kmeans(train[:, j], n_centroids, 15, rng) for j in range(n_subspaces)]).astype(np.float32)
+            codes = np.empty((len(vectors), n_subspaces), dtype=np.uint8)
+        else:
+            raise ValueError(f"Unknown codec {codec!r}; expected one of {', '.join(CODECS)}")
+
+        quantized = cls(codec, codes, params, vectors)
+        for start in range(0, len(vectors), ENCODE_BATCH_SIZE):
+            block = normalize_rows(np.asarray(vectors[start:start + ENCODE_BATCH_SIZE], dtype=np.float32))
+            codes[start:start + len(block)] = quantized._encode_block(block)
+        return quantized
+
+    def _encode_block(self, block):
+        if self.codec == "float16":
+            return block.astype(np.float16)
+        if self.codec == "int8":
+            return np.clip(np.rint(block / self.params), -127, 127).astype(np.int8)
+        sub = block.reshape(len(block), len(self.params), -1)
+        half_norms = 0.5 * np.einsum("scw,scw->sc", self.params, self.params)
+        codes = np.empty(sub.shape[:2], dtype=np.uint8)
+        for j, centroids in enumerate(self.params):
+            # nearest centroid by euclidean distance
+            codes[:, j] = np.argmax(sub[:, j] @ centroids.T - half_norms[j], axis=1)
+        return codes
+
+    def scores(self, query):
+        """First-pass cosine estimate of every row against the unit-length ``query``."""
+        query = np.asarray(query, dtype=np.float32)
+        out = np.empty(len(self.codes), dtype=np.float32)
+        if self.codec == "pq":
+            # asymmetric distance: one lookup table of partial dot products per subspace
+            tables = np.einsum("scw,sw->sc", self.params, query.reshape(len(self.params), -1))
+            subspaces = np.arange(len(self.params))
+        elif self.codec == "int8":
+            query = query * self.params
+        for start in range(0, len(self.codes), SCORE_BATCH_SIZE):
+            block = np.asarray(self.codes[start:start + SCORE_BATCH_SIZE])
+            if self.codec == "pq":
+                out[start:start + len(block)] = tables[subspaces, block].sum(axis=1)
+            else:
+                out[start:start + len(block)] = block.astype(np.float32) @ query
+        return out
+
+    def search(self, query, k: int, rescore: int = RESCORE_FACTOR):
+        """Top ``k`` ``(rows, scores)`` by cosine: a shortlist from the codes, rescored exactly."""
+        norm = np.linalg.norm(query)
+        query = (np.asarray(query, dtype=np.float32) / norm) if norm else np.asarray(query, dtype=np.float32)
+        rows, approximate = top_k(np.arange(len(self.codes)), self.scores(query), max(k, 0) * rescore)
+        if self.full is None or not len(rows):
+            return top_k(rows, approximate, k)
+        rows = np.sort(rows)
+        exact = normalize_rows(np.asarray(self.full[rows], dtype=np.float32)) @ query
+        return top_k(rows, exact, k)
+
+    def save(self, path: str, fingerprint: dict) -> None:
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "codes.npy"), self.codes)
+        if self.params is not None:
+            np.save(os.path.join(tmp_path, "params.npy"), self.params)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(fingerprint, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, codec: str, full=None) -> "QuantizedVectors":
+        params_path = os.path.join(path, "params.npy")
+        params = np.load(params_path) if os.path.exists(params_path) else None
+        return cls(codec, np.load(os.path.join(path, "codes.npy"), mmap_mode="r"), params, full)
+
+    @classmethod
+    def open(
+        cls, source: str, name: str, codec: str, n_subspaces: int | None = None, rebuild: bool = False, cache_dir: str = QUANTIZED_DIR,
+    ) -> "QuantizedVectors":
+        """The ``codec`` codes of the embeddings in ``source``, saved as ``cache_dir/name-codec`` and rebuilt when the file changed."""
+        path = os.path.join(cache_dir, f"{name}-{codec}")
+        stat = os.stat(source)
+        fingerprint = {"version": QUANTIZED_VERSION, "source": os.path.abspath(source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        full = load_vectors(source)
+        meta_path = os.path.join(path, "meta.json")
+        if not rebuild and os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if {key: meta.get(key) for key in fingerprint} == fingerprint and n_subspaces in (None, meta.get("n_subspaces")):
+                return cls.load(path, codec, full)
+        quantized = cls.encode(full, codec, n_subspaces)
+        quantized.save(path, {**fingerprint, "n_subspaces": quantized.codes.shape[1] if codec == "pq" else None})
+        return quantized
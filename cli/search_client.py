@@ -0,0 +1,27 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+# the CLIs send their queries to this server when it is set (or given with --server)
+SERVER_ENV = "SEARCH_SERVER"
+
+
+def default_server() -> str | None:
+    return os.environ.get(SERVER_ENV) or None
+
+
+def remote(server: str, endpoint: str, timeout: float | None = None, **params):
+    """Call ``endpoint`` on the search server at ``server`` (e.g. http://127.0.0.1:8765) and return its result."""
+    url = f"{server.rstrip('/')}/{endpoint}"
+    if endpoint == "health":
+        request = urllib.request.Request(url)
+    else:
+        request = urllib.request.Request(url, data=json.dumps(params).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)["result"]
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"Search server error: {json.load(e).get('error', e.reason)}") from None
+    except urllib.error.URLError as e:
+        raise ConnectionError(f"No search server at {server}: {e.reason}") from None
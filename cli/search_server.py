@@ -0,0 +1,205 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from catalog import MovieCatalog
+from helpers import InvertedIndex, load_stop_words
+from hybrid_search import RAG_MODES, HybridSearch, weighted_search_results
+from semantic_search import ChunkedSemanticSearch, SemanticSearch
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+STOP_WORDS_PATH = "data/stopwords.txt"
+
+
+class SearchService():
+    """The catalog, keyword index, embeddings and models the search CLIs use, loaded once.
+
+    Every public method answers one CLI command with JSON-serializable
+    results and may be called from several threads at once: the shared
+    structures are only read after loading, and the caches they fill lazily
+    are locked (see QueryEmbeddingCache and SemanticSearch._open_lock).
+    """
+
+    # the methods a client may call, by endpoint
+    ENDPOINTS = ("bm25search", "search", "search_chunked", "weighted_search", "rrf_search", "text_search", "image_search", "rag")
+
+    def __init__(self, backend: str = "torch", threads: int | None = None) -> None:
+        self.documents = MovieCatalog.open()
+        # catalog rows by title: the RAG prompts quote every movie titled like a result
+        self._title_rows = {}
+        for row, movie in enumerate(self.documents):
+            self._title_rows.setdefault(movie["title"], []).append(row)
+        self.stop_words = load_stop_words(STOP_WORDS_PATH)
+        self.index = InvertedIndex()
+        if InvertedIndex.exists():
+            self.index.load()
+        else:
+            self.index.build(stop_words=self.stop_words)
+            self.index.save()
+
+        self.semantic = SemanticSearch(backend=backend, threads=threads)
+        self.semantic.load_or_create_embeddings(self.documents)
+        self.chunked = ChunkedSemanticSearch(backend=backend, threads=threads)
+        self.chunked.load_or_create_embeddings(self.documents)
+        # one query encoder and one query cache for both searches
+        self.chunked.query_model = self.semantic.query_model
+        self.chunked.query_cache = self.semantic.query_cache
+        self.backend = backend
+        self.threads = threads
+        self._multimodal = None
+        self._lock = threading.Lock()
+
+        # run one query down each path, so the first request does not pay for lazy setup
+        self.search_chunked("warm up", 1)
+        self.search("warm up", 1)
+
+    def hybrid(self, nprobe: int | None = None) -> HybridSearch:
+        # cheap: the index and chunk search are shared, only the options are per request
+        return HybridSearch(self.documents, nprobe=nprobe, backend=self.backend, threads=self.threads, index=self.index, semantic_search=self.chunked)
+
+    @property
+    def multimodal(self):
+        # CLIP and the catalog's text embeddings are only loaded for the first multimodal request
+        with self._lock:
+            if self._multimodal is None:
+                from multimodal_search import MultimodalSearch
+                multimodal = MultimodalSearch(documents=self.documents)
+                multimodal.text_embeddings
+                self._multimodal = multimodal
+        return self._multimodal
+
+    def bm25search(self, query: str, limit: int = 5, exhaustive: bool = False, proximity: float = 0.0):
+        results = self.index.bm25_search(query, limit, stop_words=self.stop_words, prune=not exhaustive, proximity=proximity)
+        return [{"id": doc_id, "title": self.index.docmap.get(doc_id, {}).get("title", "Unknown Title"), "score": score} for doc_id, score in results]
+
+    def search(self, query: str, limit: int = 5, nprobe: int | None = None, quantized: str | None = None):
+        return self.semantic.search(query, limit, nprobe=nprobe, quantized=quantized)
+
+    def search_chunked(self, query: str, limit: int = 5, nprobe: int | None = None, quantized: str | None = None):
+        return self.chunked.search_chunks(query, limit, nprobe=nprobe, quantized=quantized)
+
+    def weighted_search(self, query: str, alpha: float = 0.5, limit: int = 5, nprobe: int | None = None, normalization: str = "minmax"):
+        return weighted_search_results(self.hybrid(nprobe), query, alpha, limit, normalization)
+
+    def rrf_search(self, query: str, k: int = 60, limit: int = 5, enhance: str | None = None, rerank_method: str | None = None, nprobe: int | None = None):
+        return self.hybrid(nprobe).rrf_search(query, k, limit, enhance, rerank_method=rerank_method)
+
+    def text_search(self, query: str, limit: int = 5):
+        return {"query": query, "results": self.multimodal.search_with_text(query, limit=limit)}
+
+    def image_search(self, image: str, limit: int = 5):
+        return {"image_path": image, "results": self.multimodal.search_with_image(image, limit=limit)}
+
+    def rag(self, mode: str, query: str, limit: int = 5):
+        """The generated answer of an augmented_generation_cli command over the RRF top ``limit``."""
+        generate, _ = RAG_MODES[mode]
+        results = self.hybrid().rrf_search(query=query, k=60, limit=limit)[:limit]
+        # the movies the generator would pick out of the whole catalog, in catalog order
+        rows = sorted(row for title in {result["title"] for result in results} for row in self._title_rows.get(title, []))
+        docs = [self.documents[row] for row in rows]
+        return {"results": results, "answer": generate(query, docs, results).text.strip()}
+
+
+def _to_json(value):
+    # numpy scalars and arrays in the results
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class SearchServer(ThreadingHTTPServer):
+    """Serve a SearchService over HTTP: POST /<endpoint> with the keyword arguments as a JSON object.
+
+    Replies are ``{"result": ...}``, or ``{"error": ...}`` with status 400
+    (bad request) or 500. GET /health reports the requests served so far.
+    POST /reload loads everything again, e.g. after the keyword index or
+    the catalog changed, and swaps it in once ready.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, service_factory) -> None:
+        super().__init__(address, _Handler)
+        self.service_factory = service_factory
+        self.service = service_factory()
+        self.started = time.time()
+        self.requests = 0
+        self.seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._stats_lock:
+            self.requests += 1
+            self.seconds += seconds
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: SearchServer
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body, default=_to_json).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        server = self.server
+        self._reply(200, {"result": {
+            "uptime": time.time() - server.started,
+            "requests": server.requests,
+            "mean_ms": server.seconds / server.requests * 1000 if server.requests else None,
+        }})
+
+    def do_POST(self) -> None:
+        endpoint = self.path.strip("/")
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except json.JSONDecodeError as e:
+            self._reply(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if endpoint == "reload":
+            self.server.service = self.server.service_factory()
+            self._reply(200, {"result": "reloaded"})
+            return
+        if endpoint not in SearchService.ENDPOINTS:
+            self._reply(404, {"error": f"Unknown endpoint {endpoint!r}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            result = getattr(self.server.service, endpoint)(**params)
+        except (TypeError, ValueError, KeyError, FileNotFoundError) as e:
+            self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        elapsed = time.perf_counter() - start
+        self.server.record(elapsed)
+        self._reply(200, {"result": result})
+        print(f"{endpoint} {params.get('query', params.get('image', ''))!r} {elapsed * 1000:.1f}ms", flush=True)
+
+    def log_message(self, format, *args) -> None:
+        # one line per search is printed by do_POST instead
+        pass
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, backend: str = "torch", threads: int | None = None) -> None:
+    start = time.perf_counter()
+    server = SearchServer((host, port), lambda: SearchService(backend=backend, threads=threads))
+    print(f"Loaded in {time.perf_counter() - start:.1f}s; serving on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
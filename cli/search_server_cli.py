@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import argparse
+from inference import BACKENDS
+from search_client import SERVER_ENV, default_server, remote
+from search_server import DEFAULT_HOST, DEFAULT_PORT, serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search Server CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    # serve parser
+    serve_parser = subparsers.add_parser("serve", help=f"Load the indexes and models once and answer queries over HTTP (point the CLIs at it with {SERVER_ENV} or --server)")
+    serve_parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    serve_parser.add_argument("--backend", choices=BACKENDS, default="torch", help="Query encoder and cross-encoder inference: float32 torch or dynamically quantized int8")
+    serve_parser.add_argument("--threads", type=int, help="Torch threads used for inference (default: torch's own choice)")
+
+    # client parsers
+    server_url = default_server() or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+    health_parser = subparsers.add_parser("health", help="Show how many queries a running server has answered and how fast")
+    health_parser.add_argument("--server", type=str, default=server_url, help="Server URL")
+    reload_parser = subparsers.add_parser("reload", help="Make a running server load the indexes and embeddings again, e.g. after rebuilding them")
+    reload_parser.add_argument("--server", type=str, default=server_url, help="Server URL")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "serve":
+            serve(args.host, args.port, backend=args.backend, threads=args.threads)
+        case "health":
+            health = remote(args.server, "health")
+            mean = f"{health['mean_ms']:.1f}ms" if health["mean_ms"] is not None else "-"
+            print(f"Up {health['uptime']:.0f}s, {health['requests']} queries answered, mean {mean}")
+        case "reload":
+            remote(args.server, "reload")
+            print(f"Reloaded {args.server}")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,249 @@
 
-from sentence_transformers import SentenceTransformer
-from torch import embedding
 import numpy as np
-import os, json, re
+import os, re, threading, time
+from ann_index import IVFIndex, normalize_rows, top_k
+from quantization import RESCORE_FACTOR, QuantizedVectors
+from catalog import MovieCatalog, document_map, iter_batches
+from encoding_pool import EncodingPool
+from inference import cache_name, load_sentence_transformer, set_threads
+from embedding_cache import KEY_DTYPE, EmbeddingCache, QueryEmbeddingCache, load_keys, save_keys, text_keys
+from vector_store import VectorStore, VectorStoreWriter, corpus_hash
+
+# documents encoded per model.encode call when building embeddings from a stream
+EMBED_BATCH_SIZE = 1024
+# texts per model.encode call once sorted by length, so each call pads to similar lengths
+ENCODE_BATCH_SIZE = 64
+# batched searches score as many queries at a time as keep the queries x rows matrix within this many floats
+BATCH_SCORES = 1 << 24
+# the chunk embeddings, with the movie and position of every chunk and the key of its text
+CHUNK_STORE = "cache/chunks.vstore"
+CHUNK_COLUMNS = {"movie_ids": np.int32, "chunk_idx": np.int16, "total_chunks": np.int16, "keys": KEY_DTYPE}
+# chunk caches written before the vector store, still read once to reuse their embeddings
+LEGACY_CHUNK_FILES = ("cache/chunk_embeddings.npy", "cache/chunk_embeddings.keys.npy", "cache/chunk_embeddings.sources.npy", "cache/chunk_metadata.json")
+
+
+class NpyAppender():
+    """Write a 2-D .npy file a block of rows at a time.
+
+    The header is reserved up front and rewritten with the final row count on
+    close, so the whole matrix never has to be held in memory.
+    """
+
+    HEADER_SIZE = 128
+
+    def __init__(self, path: str, dtype=np.float32) -> None:
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.dim = None
+        self._tmp_path = f"{path}.tmp"
+        self._f = open(self._tmp_path, "wb")
+        self._f.write(b"\0" * self.HEADER_SIZE)
+
+    def append(self, rows) -> None:
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if self.dim is None:
+            self.dim = rows.shape[1]
+        elif rows.shape[1] != self.dim:
+            raise ValueError(f"Expected rows of width {self.dim}, got {rows.shape[1]}")
+        self._f.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.rows, self.dim or 0),
+        }).encode("latin1")
+        # magic, version 1.0, little-endian header length, then the dict padded to HEADER_SIZE
+        prefix = b"\x93NUMPY\x01\x00" + (self.HEADER_SIZE - 10).to_bytes(2, "little")
+        self._f.seek(0)
+        self._f.write(prefix + header.ljust(self.HEADER_SIZE - len(prefix) - 1) + b"\n")
+        self._f.close()
+        os.replace(self._tmp_path, self.path)
+
 
 class SemanticSearch():
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
-        self.model = SentenceTransformer(model_name)
+    # embeddings the approximate index is built from, and its name under cache/ann
+    ann_source = "cache/movie_embeddings.npy"
+    ann_name = "documents"
+    # held while the IVF index or quantized codes are opened, so concurrent searches build them once
+    _open_lock = threading.Lock()
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", workers: int = 1, backend: str = "torch", threads: int | None = None) -> None:
+        self.model_name = model_name
+        self._model = None
+        # processes that encode corpus texts when building embeddings
+        self.workers = workers
+        self._encoding_pool = None
+        # how queries are encoded (see inference.BACKENDS); the corpus is always encoded in float32
+        self.backend = backend
+        self.threads = threads
+        self._query_model = None
+        # repeated queries are answered from memory or cache/query_embeddings instead of the model
+        self.query_cache = QueryEmbeddingCache(cache_name(model_name, backend))
         self.embeddings = None
+        # set by index_embeddings(): the norm of every movie embedding
+        self.embedding_norms = None
         self.documents = None
         self.document_map = {}
+        self.ann = None
+        self.quantized = {}
+
+    @property
+    def model(self):
+        # loaded on first encode, so commands that only read caches never import torch
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @model.setter
+    def model(self, model) -> None:
+        self._model = model
+
+    @property
+    def query_model(self):
+        # the float32 backend shares the corpus model; int8 loads its own quantized copy
+        if self._query_model is None:
+            if self.backend == "torch":
+                set_threads(self.threads)
+                self._query_model = self.model
+            else:
+                self._query_model = load_sentence_transformer(self.model_name, self.backend, self.threads)
+        return self._query_model
+
+    @query_model.setter
+    def query_model(self, model) -> None:
+        self._query_model = model
 
     def generate_embedding(self, text):
         if len(text.strip()) == 0:
             raise ValueError("Input text cannot be empty or whitespace.")
         
-        embedding = self.model.encode([text])
-        return embedding[0]
+        return self.query_cache.get(text, lambda text: self.query_model.encode([text])[0])
+
+    def encode_texts(self, texts):
+        """Encode ``texts`` in length-sorted batches of ENCODE_BATCH_SIZE, returned in input order."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        starts = range(0, len(order), ENCODE_BATCH_SIZE)
+        batches = [[texts[i] for i in order[start:start + ENCODE_BATCH_SIZE]] for start in starts]
+        if self.workers > 1:
+            encoded_batches = self.encoding_pool.map(batches)
+        else:
+            encoded_batches = (self.model.encode(batch) for batch in batches)
+        vectors = None
+        for start, encoded in zip(starts, encoded_batches):
+            encoded = np.asarray(encoded, dtype=np.float32)
+            if vectors is None:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            vectors[order[start:start + ENCODE_BATCH_SIZE]] = encoded
+        return vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
+
+    @property
+    def encoding_pool(self) -> EncodingPool:
+        # started on the first batch a build encodes and kept until the build is written
+        if self._encoding_pool is None:
+            self._encoding_pool = EncodingPool(self.model_name, self.workers)
+        return self._encoding_pool
+
+    def close_encoding_pool(self) -> None:
+        if self._encoding_pool is not None:
+            self._encoding_pool.close()
+            self._encoding_pool = None
+
+    def generate_embeddings(self, texts):
+        """Embeddings of many queries as rows, all encoded in one model.encode call."""
+        if any(len(text.strip()) == 0 for text in texts):
+            raise ValueError("Input text cannot be empty or whitespace.")
+        return self.query_cache.get_many(texts, lambda texts: self.query_model.encode(texts))
     
-    def build_embeddings(self, documents):
+    def build_embeddings(self, documents, batch_size: int = EMBED_BATCH_SIZE):
         self.documents = documents
-        for doc in documents:
-            self.document_map[doc['id']] = doc
-        
-        string_rep = []
-        for doc in documents:
-            title = doc.get('title', '')
-            description = doc.get('description', '')
-            combined = f"{title}: {description}"
-            string_rep.append(combined)
-        
-        self.embeddings = self.model.encode(string_rep, show_progress_bar=True)
-
-        with open("cache/movie_embeddings.npy", "wb") as f:
-            np.save(f, self.embeddings)
-        
+        self.document_map = document_map(documents)
+
+        # encode and write one batch at a time so memory is bounded by batch_size;
+        # texts unchanged since the last build keep their embedding
+        cache = EmbeddingCache("cache/movie_embeddings.npy", self.model_name)
+        writer = NpyAppender("cache/movie_embeddings.npy")
+        keys = []
+        for batch in iter_batches(documents, batch_size):
+            vectors, batch_keys = cache.embed(self.encode_texts, [movie_text(doc) for doc in batch])
+            writer.append(vectors)
+            keys.append(batch_keys)
+        writer.close()
+        self.close_encoding_pool()
+        save_keys("cache/movie_embeddings.npy", np.concatenate(keys) if keys else [])
+
+        self.embeddings = np.load("cache/movie_embeddings.npy", mmap_mode="r")
+        self.index_embeddings()
         return self.embeddings
     
     def load_or_create_embeddings(self, documents):
         self.documents = documents
-        for doc in documents:
-            self.document_map[doc['id']] = doc
+        self.document_map = document_map(documents)
 
-        if os.path.exists("cache/movie_embeddings.npy"):
+        # the cache is current when it holds an embedding of exactly these texts
+        keys = load_keys("cache/movie_embeddings.npy")
+        if os.path.exists("cache/movie_embeddings.npy") and keys is not None:
             with open("cache/movie_embeddings.npy", "rb") as f:
                 self.embeddings = np.load(f)
-            if len(self.embeddings) == len(documents):
+            if len(self.embeddings) == len(keys) and np.array_equal(keys, text_keys(self.model_name, map(movie_text, documents))):
+                self.index_embeddings()
                 return self.embeddings
-        else:
-            return self.build_embeddings(documents)
-        
-    def search(self, query, limit):
+        return self.build_embeddings(documents)
+
+    def index_embeddings(self) -> None:
+        """Compute the embedding norms search_batch divides by, once per load or build."""
+        self.embedding_norms = np.linalg.norm(self.embeddings, axis=1)
+
+    def ann_index(self, n_lists: int | None = None, rebuild: bool = False) -> IVFIndex:
+        """The IVF index over the cached embeddings, built on first use and whenever they change."""
+        with self._open_lock:
+            if self.ann is None or n_lists is not None or rebuild:
+                self.ann = IVFIndex.open(self.ann_source, self.ann_name, n_lists=n_lists, rebuild=rebuild)
+            return self.ann
+
+    def quantized_vectors(self, codec: str, n_subspaces: int | None = None, rebuild: bool = False) -> QuantizedVectors:
+        """The ``codec`` codes of the cached embeddings, encoded on first use and whenever they change."""
+        with self._open_lock:
+            if codec not in self.quantized or n_subspaces is not None or rebuild:
+                self.quantized[codec] = QuantizedVectors.open(self.ann_source, self.ann_name, codec, n_subspaces=n_subspaces, rebuild=rebuild)
+            return self.quantized[codec]
+
+    def search(self, query, limit, nprobe: int | None = None, quantized: str | None = None):
+        return self.search_batch([query], limit, nprobe=nprobe, quantized=quantized)[0]
+
+    def search_batch(self, queries, limit, nprobe: int | None = None, quantized: str | None = None):
+        """``search`` for many queries: one encode call, then one matrix product per block of queries."""
         if self.embeddings is None:
             raise ValueError("No embeddings loaded. Call `load_or_create_embeddings` first.")
-        query_embedding = self.generate_embedding(query)
-        # Compute cosine similarity between query and all documents
-        cosine_scores = np.dot(self.embeddings, query_embedding) / (np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_embedding))
-        # Create a list of (similarity_score, document) tuples.
-        scored_documents = [
-            (cosine_scores[i], self.documents[i]) for i in range(len(self.documents))
-        ]
-        # Sort the documents by similarity score in descending order.
-        scored_documents.sort(key=lambda x: x[0], reverse=True)
+        query_embeddings = self.generate_embeddings(queries)
+        if nprobe:
+            # approximate: only score the documents in the nprobe closest IVF cells
+            ranked = [self.ann_index().search(query_embedding, limit, nprobe) for query_embedding in query_embeddings]
+        elif quantized:
+            # scan the compressed codes, then rescore the shortlist at full precision
+            ranked = [self.quantized_vectors(quantized).search(query_embedding, limit) for query_embedding in query_embeddings]
+        else:
+            ranked = []
+            rows = np.arange(len(self.embeddings))
+            for block in query_blocks(query_embeddings, len(rows)):
+                # cosine similarity between every query in the block and all documents
+                cosine_scores = (block @ self.embeddings.T) / (self.embedding_norms * np.linalg.norm(block, axis=1)[:, None])
+                # highest first, earlier documents first on ties (like a stable sort)
+                ranked.extend(top_k(rows, scores, limit) for scores in cosine_scores)
         # Return the top results (up to limit) as a list of dictionaries, each containing: score, title, description
         return [
-            {
-                "score": score,
-                "title": doc.get("title", ""),
-                "description": doc.get("description", "")
-            }
-            for score, doc in scored_documents[:limit]
+            [
+                {
+                    "score": score,
+                    "title": self.documents[i].get("title", ""),
+                    "description": self.documents[i].get("description", "")
+                }
+                for i, score in zip(top.tolist(), top_scores)
+            ]
+            for top, top_scores in ranked
         ]
     
 
@@ -81,108 +255,187 @@ class SemanticSearch():
 
 
 class ChunkedSemanticSearch(SemanticSearch):
-    def __init__(self, model_name = "all-MiniLM-L6-v2") -> None:
-        super().__init__(model_name)
-        self.chunk_embeddings = None
-        self.chunk_metadata = None
+    ann_source = CHUNK_STORE
+    ann_name = "chunks"
 
-    def build_chunk_embeddings(self, documents):
+    def __init__(self, model_name = "all-MiniLM-L6-v2", workers: int = 1, backend: str = "torch", threads: int | None = None) -> None:
+        super().__init__(model_name, workers, backend, threads)
+        self.store = None
+        self.chunk_embeddings = None
+        # set by build_chunk_embeddings: chunks written, texts encoded, chunks reused, and seconds taken
+        self.build_stats = None
+        # set by index_chunks(): the movie of every chunk, and the store's unit-length chunk vectors
+        self.unit_chunk_embeddings = None
+        self.chunk_movie_ids = None
+        self._chunk_movies = None
+        self._chunk_order = None
+        self._movie_starts = None
+
+    def build_chunk_embeddings(self, documents, batch_size: int = EMBED_BATCH_SIZE):
         self.documents = documents
-        self.document_map = {doc['id']: doc for doc in documents}
-
-        chunk_strings = []
-        chunk_metadata = []
-
-        for doc in documents:
-            if not doc.get('description'):
-                continue
-            # use semantic chunking to split the description into 4 sentence chunks with 1-sentence overlap
-            chunks = semantic_chunking(doc['description'], max_chunk_size=4, overlap=1)
-            # add chunks to chunk_strings
-            chunk_strings.extend(chunks)
-            # add metadata for each chunk
-            for i, chunk in enumerate(chunks):
-                chunk_metadata.append({
-                    "movie_idx": doc['id'],
-                    "chunk_idx": i,
-                    "total_chunks": len(chunks),
-                })
-
-        self.chunk_embeddings = self.model.encode(chunk_strings, show_progress_bar=True)
-        self.chunk_metadata = chunk_metadata
-
-        with open("cache/chunk_embeddings.npy", "wb") as f:
-            np.save(f, self.chunk_embeddings)
+        self.document_map = document_map(documents)
+
+        # chunk the catalog lazily and encode batch_size chunks at a time, reusing the
+        # embeddings of chunks whose text has not changed
+        cache = self._previous_chunks()
+        # chunks are stored unit length, so exact search maps them and needs only a matrix product
+        writer = VectorStoreWriter(CHUNK_STORE, self.model_name, chunk_corpus_hash(self.model_name, documents), CHUNK_COLUMNS, normalized=True)
+        start = time.perf_counter()
+        for batch in iter_batches(iter_chunks(documents, max_chunk_size=4, overlap=1), batch_size):
+            vectors, keys = cache.embed(self.encode_texts, [chunk for _, chunk in batch])
+            writer.append(
+                normalize_rows(vectors),
+                keys=keys,
+                movie_ids=[metadata["movie_idx"] for metadata, _ in batch],
+                chunk_idx=[metadata["chunk_idx"] for metadata, _ in batch],
+                total_chunks=[metadata["total_chunks"] for metadata, _ in batch],
+            )
+        self.store = writer.close()
+        self.close_encoding_pool()
+        for path in LEGACY_CHUNK_FILES:
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.chunk_embeddings = self.store.embeddings
+        self.build_stats = {"chunks": len(self.store), "encoded": cache.encoded, "reused": cache.reused, "seconds": time.perf_counter() - start}
+        self.index_chunks()
+        return self.chunk_embeddings
 
-        with open("cache/chunk_metadata.json", "w") as f:
-            json.dump(self.chunk_metadata, f)
+    def _previous_chunks(self) -> EmbeddingCache:
+        # the last build, whatever corpus it came from, so unchanged chunks keep their embedding
+        try:
+            store = VectorStore.load(CHUNK_STORE)
+        except (OSError, ValueError, KeyError):
+            return EmbeddingCache(LEGACY_CHUNK_FILES[0], self.model_name)
+        return EmbeddingCache(None, self.model_name, vectors=store.embeddings, keys=store.columns["keys"])
 
-        return self.chunk_embeddings
-    
     def load_or_create_embeddings(self, documents) -> np.ndarray:
         self.documents = documents
-        self.document_map = {doc['id']: doc for doc in documents}
-
-        if os.path.exists("cache/chunk_embeddings.npy") and os.path.exists("cache/chunk_metadata.json"):
-            with open("cache/chunk_embeddings.npy", "rb") as f:
-                self.chunk_embeddings = np.load(f)
-            with open("cache/chunk_metadata.json", "r") as f:
-                self.chunk_metadata = json.load(f)
-            if len(self.chunk_metadata) == len(self.chunk_embeddings):
-                return self.chunk_embeddings
-        else:
+        self.document_map = document_map(documents)
+
+        # the store is only used when this model built it from exactly these descriptions
+        self.store = VectorStore.open(CHUNK_STORE, self.model_name, chunk_corpus_hash(self.model_name, documents))
+        if self.store is None or not self.store.normalized:
+            # stores written before chunks were normalized are rewritten, reusing every embedding
             return self.build_chunk_embeddings(documents)
+        self.chunk_embeddings = self.store.embeddings
+        self.index_chunks()
+        return self.chunk_embeddings
 
+    def index_chunks(self) -> None:
+        """Group the chunks by movie for search_chunks."""
+        self.unit_chunk_embeddings = self.store.embeddings
+        # number movies in the order their first chunk appears, which is how ties rank
+        movie_ids, first_chunk, chunk_movies = np.unique(
+            np.asarray(self.store.columns["movie_ids"], dtype=np.int64),
+            return_index=True,
+            return_inverse=True,
+        )
+        seen_order = np.argsort(first_chunk, kind="stable")
+        movie_rank = np.empty(len(movie_ids), dtype=np.int64)
+        movie_rank[seen_order] = np.arange(len(movie_ids))
+        chunk_movies = movie_rank[chunk_movies]
+        self.chunk_movie_ids = movie_ids[seen_order]
+        self._chunk_movies = chunk_movies
+
+        # a movie's chunks are normally contiguous already; otherwise gather them together
+        order = np.argsort(chunk_movies, kind="stable")
+        self._chunk_order = None if np.array_equal(order, np.arange(len(order))) else order
+        self._movie_starts = np.searchsorted(chunk_movies[order], np.arange(len(movie_ids)))
+
+
+    def search_chunks(self, query: str, limit: int = 10, nprobe: int | None = None, quantized: str | None = None):
+        return self.search_chunks_batch([query], limit, nprobe=nprobe, quantized=quantized)[0]
+
+    def search_chunks_batch(self, queries, limit: int = 10, nprobe: int | None = None, quantized: str | None = None):
+        """``search_chunks`` for many queries: one encode call, then per block of queries one
+        matrix product against all chunks and a per-movie max over its columns.
+
+        Chunks are compared as stored unit-length float32 vectors rather than
+        by a cosine computed per pair, so a score can differ from that in the
+        last float32 bit and movies whose best chunks score within about 1e-7
+        of each other may swap places. Exact ties rank in catalog order.
+        """
+        results = []
+        for movie_ids, scores in self.rank_chunks_batch(queries, limit, nprobe=nprobe, quantized=quantized):
+            final_output = []
+            for movie_id, score in zip(movie_ids.tolist(), scores):
+                final_output.append({
+                    "id": movie_id,
+                    "title": self.document_map[movie_id]["title"],
+                    "document": self.document_map[movie_id]["description"][:100],
+                    "score": round(score, 4),
+                    "metadata": self.document_map[movie_id].get("metadata", {}) # mot really sure which metadata is expected here?
+                })
+            results.append(final_output)
+        return results
 
-    def search_chunks(self, query: str, limit: int = 10):
-        if self.chunk_embeddings is None or self.chunk_metadata is None:
+    def rank_chunks_batch(self, queries, limit: int = 10, nprobe: int | None = None, quantized: str | None = None):
+        """The ranking ``search_chunks_batch`` returns, as ``(movie ids, scores)`` arrays per query."""
+        if self.chunk_embeddings is None or self.chunk_movie_ids is None:
             raise ValueError("No chunk embeddings loaded. Call `load_or_create_embeddings` first.")
-        
-        query_embedding = self.generate_embedding(query)
-        chunk_scores = []
-        for i, chunk_embedding in enumerate(self.chunk_embeddings):
-            score = cosine_similarity(query_embedding, chunk_embedding)
-            chunk_scores.append({
-                "chunk_idx": i,
-                "movie_idx": self.chunk_metadata[i]["movie_idx"],
-                "score": score,
-            })
-
-        movie_index_scores = {}
-        for chunk_score in chunk_scores:
-            movie_idx = chunk_score["movie_idx"]
-            score = chunk_score["score"]
-            if movie_idx not in movie_index_scores:
-                movie_index_scores[movie_idx] = []
-            movie_index_scores[movie_idx].append(score)
-        
-        # sort the movie scores by score in descending order
-        sorted_movie_scores = sorted(movie_index_scores.items(), key=lambda x: max(x[1]), reverse=True)
-        filtered_movies_by_limit = sorted_movie_scores[:limit]
 
-        final_output = []
-        for movie in filtered_movies_by_limit:
-            movie_id = movie[0]
-            # Skip if movie doesn't exist in document_map (can happen if cache is stale)
-            if movie_id not in self.document_map:
-                continue
-            final_output.append({
-                "id": movie_id,
-                "title": self.document_map[movie_id]["title"],
-                "document": self.document_map[movie_id]["description"][:100],
-                "score": round(max(movie[1]), 4),
-                "metadata": self.document_map[movie_id].get("metadata", {}) # mot really sure which metadata is expected here?
-            })
+        query_embeddings = self.generate_embeddings(queries)
+        ranked = []
+        if nprobe or quantized:
+            for query_embedding in query_embeddings:
+                if nprobe:
+                    # approximate: only movies with a chunk in the nprobe closest IVF cells
+                    rows, chunk_scores = self.ann_index().probe(query_embedding, nprobe)
+                else:
+                    # the best chunks by their compressed codes, all rescored at full precision
+                    rows, chunk_scores = self.quantized_vectors(quantized).search(query_embedding, limit * RESCORE_FACTOR, rescore=1)
+                movie_scores = np.full(len(self.chunk_movie_ids), -np.inf, dtype=chunk_scores.dtype)
+                np.maximum.at(movie_scores, self._chunk_movies[rows], chunk_scores)
+                candidates = np.flatnonzero(movie_scores > -np.inf)
+                ranked.append(top_k(candidates, movie_scores[candidates], limit))
+        else:
+            movies = np.arange(len(self.chunk_movie_ids))
+            for block in query_blocks(query_embeddings, len(self.unit_chunk_embeddings)):
+                # cosine similarity of every chunk with every query in the block at once
+                chunk_scores = normalize_rows(block).astype(self.unit_chunk_embeddings.dtype) @ self.unit_chunk_embeddings.T
+                if self._chunk_order is not None:
+                    chunk_scores = chunk_scores[:, self._chunk_order]
+                movie_scores = np.maximum.reduceat(chunk_scores, self._movie_starts, axis=1) if chunk_scores.shape[1] else chunk_scores
+                # best movies by their best chunk, first-seen order on ties
+                ranked.extend(top_k(movies, scores, limit) for scores in movie_scores)
+
+        results = []
+        for top, top_scores in ranked:
+            movie_ids = self.chunk_movie_ids[top]
+            # Skip movies that don't exist in document_map (can happen if cache is stale)
+            known = np.fromiter((movie_id in self.document_map for movie_id in movie_ids.tolist()), dtype=bool, count=len(movie_ids))
+            results.append((movie_ids[known], top_scores[known]))
+        return results
+
+
+
+
+
+
+
 
-        return final_output
 
 
+def query_blocks(query_embeddings, n_rows: int):
+    """Consecutive groups of queries whose queries x rows score matrix stays within BATCH_SCORES."""
+    size = max(1, BATCH_SCORES // max(n_rows, 1))
+    return (query_embeddings[start:start + size] for start in range(0, len(query_embeddings), size))
 
 
+def movie_text(doc) -> str:
+    """The text a movie is embedded from."""
+    return f"{doc.get('title', '')}: {doc.get('description', '')}"
 
 
+def chunk_source_keys(model_name: str, documents):
+    """One key per movie over what its chunks are built from."""
+    return text_keys(model_name, (f"{doc['id']}\0{doc.get('description') or ''}" for doc in documents))
 
 
+def chunk_corpus_hash(model_name: str, documents) -> str:
+    """The corpus hash a chunk store built from ``documents`` records."""
+    return corpus_hash(chunk_source_keys(model_name, documents))
 
 
 def verify_model():
@@ -198,12 +451,9 @@ def embed_text(text):
     print(f"First 3 dimensions: {embedding[:3]}")
     print(f"Dimensions: {embedding.shape[0]}")
 
-def verify_embeddings():
-    search = SemanticSearch()
-    # load movies.json into a list
-    with open("data/movies.json", "r") as f:
-        data = json.load(f)
-    documents = data["movies"]
+def verify_embeddings(workers: int = 1):
+    search = SemanticSearch(workers=workers)
+    documents = MovieCatalog.open()
     embeddings = search.load_or_create_embeddings(documents)
     print(f"Number of docs:   {len(documents)}")
     print(f"Embeddings shape: {embeddings.shape[0]} vectors in {embeddings.shape[1]} dimensions")
@@ -239,7 +489,18 @@ def chunk_text(text, chunk_size=200, overlap=0):
     
     return chunks
 
-def semantic_chunking(text, max_chunk_size=4, overlap=0):
+def iter_chunks(documents, max_chunk_size=4, overlap=0):
+    """``(metadata, chunk)`` for every chunk of every described movie, produced lazily and silently."""
+    for doc in documents:
+        if not doc.get('description'):
+            continue
+        chunks = semantic_chunks(doc['description'], max_chunk_size=max_chunk_size, overlap=overlap)
+        for i, chunk in enumerate(chunks):
+            yield {"movie_idx": doc['id'], "chunk_idx": i, "total_chunks": len(chunks)}, chunk
+
+
+def semantic_chunks(text, max_chunk_size=4, overlap=0):
+    """Split ``text`` into chunks of up to ``max_chunk_size`` sentences sharing ``overlap`` sentences."""
     text = text.strip()
     if not text:
         return []
@@ -267,8 +528,14 @@ def semantic_chunking(text, max_chunk_size=4, overlap=0):
         chunks.append(chunk)
         i += max_chunk_size - overlap
 
-    print(f"Semantically chunking {len(text)} characters")
+    return chunks
+
+
+def semantic_chunking(text, max_chunk_size=4, overlap=0):
+    chunks = semantic_chunks(text, max_chunk_size=max_chunk_size, overlap=overlap)
+
+    print(f"Semantically chunking {len(text.strip())} characters")
     for i, chunk in enumerate(chunks):
         print(f"{i + 1}. {chunk}")
 
-    return chunks
\ No newline at end of file
+    return chunks
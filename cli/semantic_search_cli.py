@@ -3,11 +3,16 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
+import resource
+from catalog import MovieCatalog
+from inference import BACKENDS
+from quantization import CODECS
+from search_client import SERVER_ENV, default_server, remote
 from semantic_search import SemanticSearch, verify_model, embed_text, verify_embeddings, embed_query_text, chunk_text, semantic_chunking, ChunkedSemanticSearch
 
 def main():
     parser = argparse.ArgumentParser(description="Semantic Search CLI")
+    parser.add_argument("--server", type=str, default=default_server(), help=f"Send queries to a running search_server_cli.py server at this URL (default: ${SERVER_ENV})")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # verify model parser
@@ -19,6 +24,7 @@ def main():
     
     # verify_embeddings parser
     verify_embed_parser = subparsers.add_parser("verify_embeddings", help="Verify that embeddings can be generated and loaded correctly")
+    verify_embed_parser.add_argument("-w", "--workers", type=int, default=1, help="Processes encoding the movies when the cache is built")
 
     # embedquery parser
     embed_query_parser = subparsers.add_parser("embedquery", help="Generate embedding for a search query")
@@ -28,6 +34,10 @@ def main():
     search_parser = subparsers.add_parser("search", help="Search for movies using semantic search")
     search_parser.add_argument("query", type=str, help="Search query")
     search_parser.add_argument("--limit", type=int, default=5, help="Number of results to return")
+    search_parser.add_argument("--nprobe", type=int, help="Search the approximate IVF index, scanning this many inverted lists")
+    search_parser.add_argument("--quantized", choices=CODECS, help="Scan compressed embeddings, rescoring the shortlist at full precision")
+    search_parser.add_argument("--backend", choices=BACKENDS, default="torch", help="Query encoder inference: float32 torch or dynamically quantized int8")
+    search_parser.add_argument("--threads", type=int, help="Torch threads used to encode the query (default: torch's own choice)")
 
     # chunking parser
     chunk_parser = subparsers.add_parser("chunk", help="Test text chunking functionality")
@@ -42,15 +52,36 @@ def main():
     semantic_chunk_parser.add_argument("--overlap", type=int, default=0, help="Number of sentences to overlap between chunks")
 
     # embed_chunks parser
-    subparsers.add_parser("embed_chunks", help="Test embedding of text chunks")
+    embed_chunks_parser = subparsers.add_parser("embed_chunks", help="Test embedding of text chunks")
+    embed_chunks_parser.add_argument("--rebuild", action="store_true", help="Rebuild even when the cache is current (unchanged chunks are still reused)")
+    embed_chunks_parser.add_argument("-w", "--workers", type=int, default=1, help="Processes encoding the chunks")
     # embed_chunks_parser.add_argument("text", type=str, help="Text to chunk and embed")
     # embed_chunks_parser.add_argument("--max-chunk-size", type=int, default=4, help="Maximum number of sentences per chunk")
     # embed_chunks_parser.add_argument("--overlap", type=int, default=0, help="Number of sentences to overlap between chunks")
     
     # search_chunked parser
-    search_chunked_parser = subparsers.add_parser("search_chunked", help="Test searching with chunked embeddings")
+    search_chunked_parser = subparsers.add_parser(
+        "search_chunked", help="Test searching with chunked embeddings",
+        description="Rank movies by their best-matching chunk. Chunks are scored as stored unit-length float32 vectors, "
+        "so movies scoring within about 1e-7 of each other may order differently than a per-pair cosine would.",
+    )
     search_chunked_parser.add_argument("query", type=str, help="Search query")
     search_chunked_parser.add_argument("--limit", type=int, default=5, help="Number of results to return")
+    search_chunked_parser.add_argument("--nprobe", type=int, help="Search the approximate IVF index, scanning this many inverted lists")
+    search_chunked_parser.add_argument("--quantized", choices=CODECS, help="Scan compressed embeddings, rescoring the shortlist at full precision")
+    search_chunked_parser.add_argument("--backend", choices=BACKENDS, default="torch", help="Query encoder inference: float32 torch or dynamically quantized int8")
+    search_chunked_parser.add_argument("--threads", type=int, help="Torch threads used to encode the query (default: torch's own choice)")
+
+    # build_ann parser
+    build_ann_parser = subparsers.add_parser("build_ann", help="Build the approximate nearest neighbour (IVF) index over the cached embeddings")
+    build_ann_parser.add_argument("--chunks", action="store_true", help="Index the chunk embeddings instead of the movie embeddings")
+    build_ann_parser.add_argument("--lists", type=int, help="Number of inverted lists (default: square root of the number of embeddings)")
+
+    # quantize parser
+    quantize_parser = subparsers.add_parser("quantize", help="Encode the cached embeddings as compressed codes for --quantized search")
+    quantize_parser.add_argument("codec", choices=CODECS, help="float16, int8 (one byte per dimension) or pq (product quantization)")
+    quantize_parser.add_argument("--chunks", action="store_true", help="Encode the chunk embeddings instead of the movie embeddings")
+    quantize_parser.add_argument("--subspaces", type=int, help="pq only: number of one-byte codes per vector (default: dimensions / 8)")
 
 
 
@@ -63,16 +94,18 @@ def main():
         case "embed_text":
             embed_text(args.text)
         case "verify_embeddings":
-            verify_embeddings()
+            verify_embeddings(args.workers)
         case "embedquery":
             embed_query_text(args.query)
         case "search":
-            search = SemanticSearch()
-            with open("data/movies.json", "r") as f:
-                data = json.load(f)
-            documents = data["movies"]
-            search.load_or_create_embeddings(documents)
-            results = search.search(args.query, args.limit)
+            if args.server:
+                # the server encodes with the backend it was started with
+                results = remote(args.server, "search", query=args.query, limit=args.limit, nprobe=args.nprobe, quantized=args.quantized)
+            else:
+                search = SemanticSearch(backend=args.backend, threads=args.threads)
+                documents = MovieCatalog.open()
+                search.load_or_create_embeddings(documents)
+                results = search.search(args.query, args.limit, nprobe=args.nprobe, quantized=args.quantized)
             for i, result in enumerate(results):
                 score, title, description = result["score"], result["title"], result["description"]
                 print(f"{i}. {title} (score: {score:.4f})\n{description}\n")
@@ -82,22 +115,40 @@ def main():
             semantic_chunking(args.text, max_chunk_size=args.max_chunk_size, overlap=args.overlap)
         case "embed_chunks":
             # load the moovie documents
-            with open("data/movies.json", "r") as f:
-                data = json.load(f)
-            documents = data["movies"]
-            chunked_search = ChunkedSemanticSearch()
-            embeddings = chunked_search.load_or_create_embeddings(documents)
+            documents = MovieCatalog.open()
+            chunked_search = ChunkedSemanticSearch(workers=args.workers)
+            if args.rebuild:
+                embeddings = chunked_search.build_chunk_embeddings(documents)
+            else:
+                embeddings = chunked_search.load_or_create_embeddings(documents)
             print(f"Generated {len(embeddings)} chunked embeddings")
+            stats = chunked_search.build_stats
+            if stats is not None:
+                # ru_maxrss is in kilobytes on Linux
+                peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                print(f"Built in {stats['seconds']:.1f}s: {stats['chunks'] / max(stats['seconds'], 1e-9):.0f} chunks/s, {stats['encoded']} encoded, {stats['reused']} reused, peak RSS {peak_mb:.0f} MB")
         case "search_chunked":
-            chunked_search = ChunkedSemanticSearch()
-            with open("data/movies.json", "r") as f:
-                data = json.load(f)
-            documents = data["movies"]
-            chunked_search.load_or_create_embeddings(documents)
-            results = chunked_search.search_chunks(args.query, args.limit)
+            if args.server:
+                results = remote(args.server, "search_chunked", query=args.query, limit=args.limit, nprobe=args.nprobe, quantized=args.quantized)
+            else:
+                chunked_search = ChunkedSemanticSearch(backend=args.backend, threads=args.threads)
+                documents = MovieCatalog.open()
+                chunked_search.load_or_create_embeddings(documents)
+                results = chunked_search.search_chunks(args.query, args.limit, nprobe=args.nprobe, quantized=args.quantized)
             for i, result in enumerate(results):
                 score, title, description = result["score"], result["title"], result["document"]
                 print(f"{i}. {title} (score: {score:.4f})\n{description}\n")
+        case "build_ann":
+            search = ChunkedSemanticSearch() if args.chunks else SemanticSearch()
+            search.load_or_create_embeddings(MovieCatalog.open())
+            index = search.ann_index(n_lists=args.lists, rebuild=True)
+            print(f"Indexed {len(index)} embeddings in {index.n_lists} inverted lists")
+        case "quantize":
+            search = ChunkedSemanticSearch() if args.chunks else SemanticSearch()
+            search.load_or_create_embeddings(MovieCatalog.open())
+            quantized = search.quantized_vectors(args.codec, n_subspaces=args.subspaces, rebuild=True)
+            full_bytes = len(quantized) * quantized.full.shape[1] * 4
+            print(f"Encoded {len(quantized)} embeddings as {args.codec}: {quantized.nbytes / 1e6:.2f} MB, {full_bytes / quantized.nbytes:.1f}x smaller than float32")
         case _:
             parser.print_help()
 
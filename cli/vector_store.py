@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# magic and format version, then the header length as 4 little-endian bytes
+STORE_MAGIC = b"\x93VSTORE"
+STORE_VERSION = 1
+# bytes reserved for the prefix and JSON header; the embedding matrix starts right after
+HEADER_SIZE = 4096
+# every array starts on a multiple of this many bytes
+ALIGN = 64
+
+
+def corpus_hash(keys) -> str:
+    """Hex digest identifying a corpus by the keys of its documents."""
+    return hashlib.sha1(np.ascontiguousarray(keys).tobytes()).hexdigest()
+
+
+def load_vectors(path: str):
+    """The memory-mapped embedding matrix of a .npy file or a vector store."""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    return VectorStore.load(path).embeddings
+
+
+def _mapped(path: str, offset: int, dtype, shape):
+    # np.memmap cannot map zero bytes
+    if not np.prod(shape):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+class VectorStore():
+    """An embedding matrix and per-row columns in one versioned binary file.
+
+    The file starts with STORE_MAGIC, a version byte and a JSON header
+    (model, dim, dtype, rows, corpus hash, and the offset, dtype and shape of
+    every array) padded to HEADER_SIZE. The embeddings follow, then each
+    column, aligned to ALIGN bytes. Loading reads only the header: the
+    arrays are read-only memory maps of the file.
+    """
+
+    def __init__(self, path: str, header: dict, embeddings, columns: dict) -> None:
+        self.path = path
+        self.header = header
+        self.embeddings = embeddings
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def model_name(self) -> str:
+        return self.header["model"]
+
+    @property
+    def corpus_hash(self) -> str:
+        return self.header["corpus_hash"]
+
+    @property
+    def normalized(self) -> bool:
+        """Whether the writer was told the rows are unit length (stores from before the flag are not)."""
+        return self.header.get("normalized", False)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorStore":
+        """Map the store at ``path``; ValueError if it is not one, is another version or is truncated."""
+        with open(path, "rb") as f:
+            prefix = f.read(len(STORE_MAGIC) + 5)
+            if prefix[:len(STORE_MAGIC)] != STORE_MAGIC or len(prefix) < len(STORE_MAGIC) + 5:
+                raise ValueError(f"{path} is not a vector store")
+            version = prefix[len(STORE_MAGIC)]
+            if version != STORE_VERSION:
+                raise ValueError(f"{path} is vector store version {version}, expected {STORE_VERSION}")
+            header = json.loads(f.read(int.from_bytes(prefix[-4:], "little")))
+        size = os.path.getsize(path)
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            if spec["offset"] + dtype.itemsize * int(np.prod(shape)) > size:
+                raise ValueError(f"{path} is truncated")
+            arrays[name] = _mapped(path, spec["offset"], dtype, shape)
+        return cls(path, header, arrays.pop("embeddings"), arrays)
+
+    @classmethod
+    def open(cls, path: str, model_name: str, corpus_hash: str) -> "VectorStore | None":
+        """The store at ``path`` if it was built by ``model_name`` from the corpus ``corpus_hash``, else None."""
+        if not os.path.exists(path):
+            return None
+        try:
+            store = cls.load(path)
+        except (ValueError, KeyError):
+            return None
+        if store.model_name != model_name or store.corpus_hash != corpus_hash:
+            return None
+        return store
+
+
+class VectorStoreWriter():
+    """Write a vector store a block of rows at a time.
+
+    Embeddings are streamed to a temporary file after the reserved header.
+    The columns, a few bytes per row, are kept until ``close`` appends them,
+    fills in the header and renames the file into place, so a store is
+    either complete or absent.
+    """
+
+    def __init__(self, path: str, model_name: str, corpus_hash: str, columns: dict, dtype=np.float32, normalized: bool = False) -> None:
+        self.path = path
+        self.model_name = model_name
+        self.corpus_hash = corpus_hash
+        # recorded in the header: the caller appends unit-length rows
+        self.normalized = normalized
+        self.dtype = np.dtype(dtype)
+        self.columns = {name: np.dtype(column_dtype) for name, column_dtype in columns.items()}
+        self.rows = 0
+        self.dim = None
+        self._blocks = {name: [] for name in self.columns}
+        self._tmp_path = f"{path}.tmp"
+        self._f = open(self._tmp_path, "wb")
+        self._f.write(b"\0" * HEADER_SIZE)
+
+    def append(self, rows, **columns) -> None:
+        """Add ``rows`` of embeddings with one value per row for every column."""
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if self.dim is None:
+            self.dim = rows.shape[1]
+        elif rows.shape[1] != self.dim:
+            raise ValueError(f"Expected rows of width {self.dim}, got {rows.shape[1]}")
+        for name, dtype in self.columns.items():
+            values = np.asarray(columns[name])
+            if len(values) != len(rows):
+                raise ValueError(f"Expected {len(rows)} {name}, got {len(values)}")
+            if dtype.kind in "iu" and len(values) and (values.min() < np.iinfo(dtype).min or values.max() > np.iinfo(dtype).max):
+                raise ValueError(f"{name} does not fit in {dtype}")
+            self._blocks[name].append(values.astype(dtype))
+        self._f.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self) -> VectorStore:
+        arrays = {"embeddings": {"offset": HEADER_SIZE, "dtype": self.dtype.str, "shape": [self.rows, self.dim or 0]}}
+        offset = HEADER_SIZE + self.rows * (self.dim or 0) * self.dtype.itemsize
+        for name, dtype in self.columns.items():
+            values = np.concatenate(self._blocks[name]) if self._blocks[name] else np.empty(0, dtype=dtype)
+            padding = -offset % ALIGN
+            self._f.write(b"\0" * padding)
+            offset += padding
+            arrays[name] = {"offset": offset, "dtype": dtype.str, "shape": [len(values)]}
+            self._f.write(values.tobytes())
+            offset += values.nbytes
+
+        header = json.dumps({
+            "model": self.model_name,
+            "dim": self.dim or 0,
+            "dtype": self.dtype.str,
+            "rows": self.rows,
+            "corpus_hash": self.corpus_hash,
+            "normalized": self.normalized,
+            "arrays": arrays,
+        }).encode()
+        prefix = STORE_MAGIC + bytes([STORE_VERSION]) + len(header).to_bytes(4, "little")
+        if len(prefix) + len(header) > HEADER_SIZE:
+            raise ValueError(f"Vector store header is {len(header)} bytes, more than fits in {HEADER_SIZE}")
+        self._f.seek(0)
+        self._f.write(prefix + header)
+        self._f.close()
+        os.replace(self._tmp_path, self.path)
+        return VectorStore.load(self.path)